@@ -1,11 +1,13 @@
 def get_values(*names):
     import json
-    _all_values = json.loads("""{"sample_count":8,"labware_pcr_plate":"nest_96_wellplate_100ul_pcr_full_skirt","labware_reservoir":"nest_12_reservoir_15ml","labware_tube_strip":"opentrons_96_aluminumblock_generic_pcr_strip_200ul","clearance_reservoir":2,"clearance_sample_plate":1,"clearance_bead_pellet":2,"clearance_strip_tubes":2,"flow_rate_beads":60,"delay_beads":1,"engage_offset":0,"engage_time":5,"dry_time":5}""")
+    _all_values = json.loads("""{"sample_count":8,"labware_pcr_plate":"nest_96_wellplate_100ul_pcr_full_skirt","labware_reservoir":"nest_12_reservoir_15ml","labware_tube_strip":"opentrons_96_aluminumblock_generic_pcr_strip_200ul","clearance_reservoir":2,"clearance_sample_plate":1,"clearance_bead_pellet":2,"clearance_strip_tubes":2,"flow_rate_beads":60,"delay_beads":1,"engage_offset":0,"engage_time":5,"dry_time":5,"tip_track":false,"trace_path":""}""")
     return [_all_values[n] for n in names]
 
 
 import math
-from opentrons.protocol_api.labware import OutOfTipsError
+from protocol_helpers import (
+    LiquidClasses, LiquidLevels, ModuleTasks, TipLedger, Tracer,
+    pause_attention, pick_up_or_refill, slow_tip_withdrawal)
 
 metadata = {
     'protocolName': '''NEBNext Ultra II Directional RNA Library Prep Kit
@@ -22,13 +24,18 @@ def run(ctx):
     [sample_count, labware_pcr_plate,
      labware_reservoir, labware_tube_strip, clearance_reservoir,
      clearance_sample_plate, clearance_bead_pellet, clearance_strip_tubes,
-     flow_rate_beads, delay_beads, engage_offset, engage_time, dry_time
+     flow_rate_beads, delay_beads, engage_offset, engage_time, dry_time,
+     tip_track, trace_path
      ] = get_values(  # noqa: F821
       'sample_count', 'labware_pcr_plate',
       'labware_reservoir', 'labware_tube_strip', 'clearance_reservoir',
       'clearance_sample_plate', 'clearance_bead_pellet',
       'clearance_strip_tubes', 'flow_rate_beads', 'delay_beads',
-      'engage_offset', 'engage_time', 'dry_time')
+      'engage_offset', 'engage_time', 'dry_time', 'tip_track', 'trace_path')
+
+    # with a trace_path, every pipette and module command is traced
+    tracer = Tracer(ctx, trace_path)
+    ctx = tracer.wrap(ctx, 'ctx')
 
     ctx.set_rail_lights(True)
     if not 1 <= sample_count <= 24:
@@ -45,108 +52,23 @@ def run(ctx):
     p300m = ctx.load_instrument(
         "p300_multi_gen2", 'right', tip_racks=tips300)
 
-    """
-    helper functions
-    """
-
-    def pick_up_or_refill(current_pipette):
-        try:
-            current_pipette.pick_up_tip()
-        except OutOfTipsError:
-            pause_attention(
-             """Please Refill the {} Tip Boxes
-                and Empty the Tip Waste.""".format(current_pipette))
-            current_pipette.reset_tipracks()
-            current_pipette.pick_up_tip()
-
-    def pause_attention(message):
-        ctx.set_rail_lights(False)
-        ctx.delay(seconds=10)
-        ctx.pause(message)
-        ctx.set_rail_lights(True)
-
-    def aspirate_with_delay(current_pipette, volume, source, delay_seconds):
-        current_pipette.aspirate(volume, source)
-        if delay_seconds > 0:
-            ctx.delay(seconds=delay_seconds)
-
-    def dispense_with_delay(current_pipette, volume, dest, delay_seconds):
-        current_pipette.dispense(volume, dest)
-        if delay_seconds > 0:
-            ctx.delay(seconds=delay_seconds)
-
-    def mix_with_delay(current_pipette, volume, location, delay_seconds):
-        current_pipette.aspirate(volume, location)
-        if delay_seconds > 0:
-            ctx.delay(seconds=delay_seconds)
-        current_pipette.dispense(volume, location)
-        if delay_seconds > 0:
-            ctx.delay(seconds=delay_seconds)
-
-    def slow_tip_withdrawal(current_pipette, well_location, to_center=False):
-        if current_pipette.mount == 'right':
-            axis = 'A'
-        else:
-            axis = 'Z'
-        ctx.max_speeds[axis] = 10
-        if to_center is False:
-            current_pipette.move_to(well_location.top())
-        else:
-            current_pipette.move_to(well_location.center())
-        ctx.max_speeds[axis] = None
-
-    def pre_wet(current_pipette, volume, location):
-        for rep in range(2):
-            current_pipette.aspirate(volume, location)
-            current_pipette.dispense(volume, location)
-
-    def set_default_clearances(
-     current_pipette, aspirate_setting, dispense_setting):
-        if 0 < aspirate_setting < 5 and 0 < dispense_setting < 5:
-            current_pipette.well_bottom_clearance.aspirate = aspirate_setting
-            current_pipette.well_bottom_clearance.dispense = dispense_setting
-
-    def restore_default_clearances(current_pipette):
-        current_pipette.well_bottom_clearance.aspirate = 1
-        current_pipette.well_bottom_clearance.dispense = 1
-
-    def viscous_flow_rates(current_pipette):
-        current_pipette.flow_rate.aspirate = flow_rate_beads
-        current_pipette.flow_rate.dispense = flow_rate_beads
-        current_pipette.flow_rate.blow_out = flow_rate_beads
-
-    def etoh_flow_rates(current_pipette):
-        if (current_pipette.name == 'p300_multi_gen2' or
-           current_pipette.name == 'p300_single_gen2'):
-            current_pipette.flow_rate.aspirate = 92.86
-            current_pipette.flow_rate.dispense = 92.86
-            current_pipette.flow_rate.blow_out = 300
-
-    def default_flow_rates(current_pipette):
-        if (current_pipette.name == 'p300_multi_gen2' or
-           current_pipette.name == 'p300_single_gen2'):
-            current_pipette.flow_rate.aspirate = 92.86
-            current_pipette.flow_rate.dispense = 92.86
-            current_pipette.flow_rate.blow_out = 92.86
-        elif (current_pipette.name == 'p20_multi_gen2' or
-              current_pipette.name == 'p20_single_gen2'):
-            current_pipette.flow_rate.aspirate = 7.56
-            current_pipette.flow_rate.dispense = 7.56
-            current_pipette.flow_rate.blow_out = 7.56
-
-    def reuse_tips(current_pipette, which_tips):
-        current_pipette.reset_tipracks()
-        current_pipette.starting_tip = named_tips[which_tips]
-
-    named_tips = {}
-
-    def name_the_tips(tip_box, name_list, well_list):
-        for name, well in zip(
-         name_list, well_list):
-            named_tips[name] = tip_box[well]
+    # record each tip picked up so a rerun can resume at the next tip
+    ledger = TipLedger(ctx, persistent=tip_track)
+
+    # the beads settle while the pipettes carry on with work that does
+    # not touch the mag plate; the first command that does waits for
+    # the rest of the settling time
+    modules = ModuleTasks(ctx)
+    p20m = modules.guard(p20m)
+    p300m = modules.guard(p300m)
+
+    # flow rates, delays and tip withdrawal for each liquid, set only for
+    # the steps that pipette it
+    liquids = LiquidClasses(ctx)
+    liquids.tune('beads', p300=flow_rate_beads, delay=delay_beads)
 
     ctx.delay(seconds=10)
-    pause_attention("""
+    pause_attention(ctx, """
     Set up for RNA Isolation, Fragmentation, Priming:
 
     RNA sample plate in deck slot 7 (50 ul total RNA)
@@ -166,6 +88,10 @@ def run(ctx):
     col 3 - Tris buffer
     col 4 - RNA binding buffer
     col 10,11,12 - waste
+
+    fill each column with the volume the fill sheet lists
+    (python -m protocol_tools.fill_sheet), which leaves liquid
+    below the lowest point it is aspirated from
     """)
     reagent_reservoir = ctx.load_labware(
      labware_reservoir, '1', 'Reagent Reservoir')
@@ -200,6 +126,13 @@ def run(ctx):
     sample_plate = elution_plate = ctx.load_labware(
      labware_pcr_plate, '7', 'RNA Sample Plate')
 
+    # buffers are aspirated just below their surface, which is worked out
+    # from the volume each step takes out of the reservoir
+    levels = LiquidLevels(clearance=clearance_reservoir)
+    levels.fill(wash_buffer, 3 * 150 * 8 * num_cols)
+    levels.fill(tris_buffer, 50 * 8 * num_cols)
+    levels.fill(rna_binding_buffer, 50 * 8 * num_cols)
+
     ctx.comment("""
     add beads to RNA and mix
     wait, engage magnet, wait
@@ -209,20 +142,18 @@ def run(ctx):
     wait for liquid to finish moving after aspiration and dispense
     withdraw tip slowly from liquid
     """)
-    viscous_flow_rates(p300m)
-    for column in sample_plate.columns()[:num_cols]:
-        p300m.pick_up_tip()
-        p300m.mix(3, 100, oligo_dt_beads.bottom(clearance_reservoir), rate=2)
-        aspirate_with_delay(p300m, 50, oligo_dt_beads.bottom(
-         clearance_reservoir), delay_beads)
-        slow_tip_withdrawal(p300m, oligo_dt_beads)
-        dispense_with_delay(p300m, 50, column[0].bottom(
-         clearance_sample_plate), delay_beads)
-        p300m.mix(6, 50, column[0].bottom(3), rate=2)
-        p300m.drop_tip()
-    default_flow_rates(p300m)
+    with liquids.use(p300m, 'beads') as viscous:
+        for column in sample_plate.columns()[:num_cols]:
+            pick_up_or_refill(ctx, p300m, ledger)
+            p300m.mix(
+             3, 100, oligo_dt_beads.bottom(clearance_reservoir), rate=2)
+            viscous.aspirate(50, oligo_dt_beads.bottom(clearance_reservoir))
+            viscous.withdraw(oligo_dt_beads)
+            viscous.dispense(50, column[0].bottom(clearance_sample_plate))
+            p300m.mix(6, 50, column[0].bottom(3), rate=2)
+            p300m.drop_tip()
 
-    pause_attention("""
+    pause_attention(ctx, """
         pausing for off-deck thermocycler steps
 
         denaturation and binding:
@@ -247,18 +178,17 @@ def run(ctx):
         remove sup
         disengage magnets
         """)
-    viscous_flow_rates(p300m)
-    for column in mag_plate.columns()[:num_cols]:
-        p300m.pick_up_tip()
-        p300m.mix(6, 50, column[0].bottom(3), rate=2)
-        slow_tip_withdrawal(p300m, column[0])
-        p300m.drop_tip()
-    default_flow_rates(p300m)
+    with liquids.use(p300m, 'beads') as viscous:
+        for column in mag_plate.columns()[:num_cols]:
+            pick_up_or_refill(ctx, p300m, ledger)
+            p300m.mix(6, 50, column[0].bottom(3), rate=2)
+            viscous.withdraw(column[0])
+            p300m.drop_tip()
     ctx.delay(minutes=5)
     mag.engage(offset=engage_offset)
-    ctx.delay(minutes=engage_time)
+    modules.start_settling(mag, minutes=engage_time)
     for column in mag_plate.columns()[:num_cols]:
-        p300m.pick_up_tip()
+        pick_up_or_refill(ctx, p300m, ledger)
         p300m.aspirate(100, column[0].bottom(clearance_bead_pellet))
         p300m.air_gap(15)
         p300m.dispense(115, waste_1.top())
@@ -267,18 +197,17 @@ def run(ctx):
     mag.disengage()
     for rep in range(2):
         for column in mag_plate.columns()[:num_cols]:
-            pick_up_or_refill(p300m)
-            p300m.aspirate(150, wash_buffer.bottom(clearance_reservoir))
+            pick_up_or_refill(ctx, p300m, ledger)
+            p300m.aspirate(150, levels.draw(p300m, 150, wash_buffer))
             p300m.dispense(150, column[0].bottom(clearance_sample_plate))
-            viscous_flow_rates(p300m)
-            p300m.mix(10, 75, column[0].bottom(3), rate=2)
-            slow_tip_withdrawal(p300m, column[0])
-            default_flow_rates(p300m)
+            with liquids.use(p300m, 'beads') as viscous:
+                p300m.mix(10, 75, column[0].bottom(3), rate=2)
+                viscous.withdraw(column[0])
             p300m.drop_tip()
         mag.engage(offset=engage_offset)
-        ctx.delay(minutes=engage_time)
+        modules.start_settling(mag, minutes=engage_time)
         for column in mag_plate.columns()[:num_cols]:
-            pick_up_or_refill(p300m)
+            pick_up_or_refill(ctx, p300m, ledger)
             if rep == 0:
                 wst = waste_1
             else:
@@ -295,16 +224,15 @@ def run(ctx):
         mix
         """)
     for column in mag_plate.columns()[:num_cols]:
-        pick_up_or_refill(p300m)
-        p300m.aspirate(50, tris_buffer.bottom(clearance_reservoir))
+        pick_up_or_refill(ctx, p300m, ledger)
+        p300m.aspirate(50, levels.draw(p300m, 50, tris_buffer))
         p300m.dispense(50, column[0].bottom(clearance_sample_plate))
-        viscous_flow_rates(p300m)
-        p300m.mix(10, 25, column[0].bottom(2), rate=2)
-        slow_tip_withdrawal(p300m, column[0])
-        default_flow_rates(p300m)
+        with liquids.use(p300m, 'beads') as viscous:
+            p300m.mix(10, 25, column[0].bottom(2), rate=2)
+            viscous.withdraw(column[0])
         p300m.drop_tip()
 
-    pause_attention("""
+    pause_attention(ctx, """
         pausing for off-deck thermocycler steps
 
         2 min 80 C
@@ -322,19 +250,18 @@ def run(ctx):
         disengage magnets
         """)
     for column in mag_plate.columns()[:num_cols]:
-        pick_up_or_refill(p300m)
-        p300m.aspirate(50, rna_binding_buffer.bottom(clearance_reservoir))
+        pick_up_or_refill(ctx, p300m, ledger)
+        p300m.aspirate(50, levels.draw(p300m, 50, rna_binding_buffer))
         p300m.dispense(50, column[0].bottom(clearance_sample_plate))
-        viscous_flow_rates(p300m)
-        p300m.mix(10, 25, column[0].bottom(2), rate=2)
-        slow_tip_withdrawal(p300m, column[0])
-        default_flow_rates(p300m)
+        with liquids.use(p300m, 'beads') as viscous:
+            p300m.mix(10, 25, column[0].bottom(2), rate=2)
+            viscous.withdraw(column[0])
         p300m.drop_tip()
     ctx.delay(minutes=5)
     mag.engage(offset=engage_offset)
-    ctx.delay(minutes=engage_time)
+    modules.start_settling(mag, minutes=engage_time)
     for column in mag_plate.columns()[:num_cols]:
-        pick_up_or_refill(p300m)
+        pick_up_or_refill(ctx, p300m, ledger)
         p300m.aspirate(100, column[0].bottom(clearance_bead_pellet))
         p300m.air_gap(15)
         p300m.dispense(115, waste_2.top())
@@ -346,34 +273,33 @@ def run(ctx):
         mix
         """)
     for column in mag_plate.columns()[:num_cols]:
-        pick_up_or_refill(p300m)
-        p300m.aspirate(150, wash_buffer.bottom(clearance_reservoir))
+        pick_up_or_refill(ctx, p300m, ledger)
+        p300m.aspirate(150, levels.draw(p300m, 150, wash_buffer))
         p300m.dispense(150, column[0].bottom(clearance_sample_plate))
-        viscous_flow_rates(p300m)
-        p300m.mix(10, 75, column[0].bottom(3), rate=2)
-        slow_tip_withdrawal(p300m, column[0])
-        default_flow_rates(p300m)
+        with liquids.use(p300m, 'beads') as viscous:
+            p300m.mix(10, 75, column[0].bottom(3), rate=2)
+            viscous.withdraw(column[0])
         p300m.drop_tip()
     ctx.comment("""
         engage magnets
         remove sup
         """)
     mag.engage(offset=engage_offset)
-    ctx.delay(minutes=engage_time)
+    modules.start_settling(mag, minutes=engage_time)
     for column in mag_plate.columns()[:num_cols]:
-        pick_up_or_refill(p300m)
+        pick_up_or_refill(ctx, p300m, ledger)
         p300m.aspirate(150, column[0].bottom(clearance_bead_pellet))
         p300m.air_gap(15)
         p300m.dispense(165, waste_3.top())
         p300m.air_gap(15)
         p300m.drop_tip()
     mag.disengage()
-    pause_attention("""
+    pause_attention(ctx, """
         Remove and spin the plate.
         Then return it to the magnetic module. Resume.""")
     mag.engage(offset=engage_offset)
     ctx.delay(minutes=1)
-    pause_attention("""
+    pause_attention(ctx, """
         Manually remove traces of supernatant with a 10 ul tip. Resume.""")
     mag.disengage()
     ctx.comment("""
@@ -381,15 +307,15 @@ def run(ctx):
         mix
         """)
     for column in mag_plate.columns()[:num_cols]:
-        p20m.pick_up_tip()
+        pick_up_or_refill(ctx, p20m, ledger)
         p20m.aspirate(
          11.5, fs_rxn_bf_random_primers[0].bottom(clearance_strip_tubes))
         p20m.dispense(11.5, column[0].bottom(clearance_sample_plate))
         p20m.mix(10, 5, column[0].bottom(1), rate=2)
-        slow_tip_withdrawal(p20m, column[0])
+        slow_tip_withdrawal(ctx, p20m, column[0])
         p20m.drop_tip()
 
-    pause_attention("""
+    pause_attention(ctx, """
         pausing for off-deck thermocycler steps
 
         15 min 94 C
@@ -408,14 +334,15 @@ def run(ctx):
         transfer 10 ul sup to elution plate
         """)
     mag.engage(offset=engage_offset)
-    ctx.delay(minutes=2)
-    p20m.transfer(
-     10, [column[0].bottom(
-      clearance_bead_pellet) for column in mag_plate.columns()[
-       :num_cols]], [column[0].bottom(
-        clearance_sample_plate) for column in elution_plate.columns()[
-        :num_cols]], new_tip='always')
-    pause_attention("""
+    modules.start_settling(mag, minutes=2)
+    for column, elution_column in zip(
+     mag_plate.columns()[:num_cols], elution_plate.columns()[:num_cols]):
+        pick_up_or_refill(ctx, p20m, ledger)
+        p20m.transfer(
+         10, column[0].bottom(clearance_bead_pellet),
+         elution_column[0].bottom(clearance_sample_plate), new_tip='never')
+        p20m.drop_tip()
+    pause_attention(ctx, """
         put elution plate on ice
         proceed with first strand cDNA synthesis
 
@@ -423,3 +350,4 @@ def run(ctx):
         RNA isolation, fragmentation and priming
         are complete
         """)
+    tracer.close()
@@ -1,12 +1,14 @@
 def get_values(*names):
     import json
-    _all_values = json.loads("""{"sample_count":24,"labware_pcr_plate":"nest_96_wellplate_100ul_pcr_full_skirt","labware_reservoir":"nest_12_reservoir_15ml","labware_tube_strip":"opentrons_96_aluminumblock_generic_pcr_strip_200ul","clearance_sample_plate":1,"clearance_reservoir":2,"clearance_strip_tubes":2,"clearance_bead_pellet":2,"delay_beads":1,"flow_rate_beads":60,"engage_time":5,"engage_offset":0,"dry_time":5,"x_offset_bead_pellet":1.5}""")
+    _all_values = json.loads("""{"sample_count":24,"labware_pcr_plate":"nest_96_wellplate_100ul_pcr_full_skirt","labware_reservoir":"nest_12_reservoir_15ml","labware_tube_strip":"opentrons_96_aluminumblock_generic_pcr_strip_200ul","clearance_sample_plate":1,"clearance_reservoir":2,"clearance_strip_tubes":2,"clearance_bead_pellet":2,"delay_beads":1,"flow_rate_beads":60,"engage_time":5,"engage_offset":0,"dry_time":5,"x_offset_bead_pellet":1.5,"tip_track":false,"trace_path":""}""")
     return [_all_values[n] for n in names]
 
 
 import math
-from opentrons import types
-from opentrons.protocol_api.labware import OutOfTipsError
+from protocol_helpers import (
+    LiquidClasses, LiquidLevels, ModuleTasks, SplitLayout, TipLedger,
+    TipPlanner, Tracer, WellTable, create_chunks, gather, pause_attention,
+    pick_up_or_refill, pre_wet, slow_tip_withdrawal, spread_reagent)
 
 metadata = {
     'protocolName': '''NEBNext Ultra II Directional RNA Library Prep Kit
@@ -24,139 +26,58 @@ def run(ctx):
      labware_reservoir, labware_tube_strip, clearance_sample_plate,
      clearance_reservoir, clearance_strip_tubes, clearance_bead_pellet,
      delay_beads, flow_rate_beads, engage_time, engage_offset, dry_time,
-     x_offset_bead_pellet
+     x_offset_bead_pellet, tip_track, trace_path
      ] = get_values(  # noqa: F821
       'sample_count', 'labware_pcr_plate',
       'labware_reservoir', 'labware_tube_strip', 'clearance_sample_plate',
       'clearance_reservoir', 'clearance_strip_tubes', 'clearance_bead_pellet',
       'delay_beads', 'flow_rate_beads', 'engage_time', 'engage_offset',
-      'dry_time', 'x_offset_bead_pellet')
+      'dry_time', 'x_offset_bead_pellet', 'tip_track', 'trace_path')
+
+    # with a trace_path, every pipette and module command is traced
+    tracer = Tracer(ctx, trace_path)
+    ctx = tracer.wrap(ctx, 'ctx')
 
     ctx.set_rail_lights(True)
-    if not 1 <= sample_count <= 24:
-        raise Exception('Invalid number of samples (must be 1-24).')
+    # the bead column of the reservoir holds enough for 88 samples
+    if not 1 <= sample_count <= 88:
+        raise Exception('Invalid number of samples (must be 1-88).')
 
     # tips, p20 multi gen2, p300 multi gen2
+    # extra racks go in the slots the split plate leaves free (slot 10
+    # holds it with more than 48 samples), so fewer refills are needed
+    slots20 = [2, 5] if sample_count > 48 else [2, 5, 10]
     tips20 = [ctx.load_labware(
-     "opentrons_96_filtertiprack_20ul", str(slot)) for slot in [2, 5]]
+     "opentrons_96_filtertiprack_20ul", str(slot)) for slot in slots20]
     p20m = ctx.load_instrument(
         "p20_multi_gen2", 'left', tip_racks=tips20)
     tips300 = [ctx.load_labware(
-     "opentrons_96_filtertiprack_200ul", str(slot)) for slot in [6, 9]]
+     "opentrons_96_filtertiprack_200ul", str(slot)) for slot in [6, 9, 11]]
     p300m = ctx.load_instrument(
         "p300_multi_gen2", 'right', tip_racks=tips300)
 
-    """
-    helper functions
-    """
-
-    def create_chunks(list_name, n):
-        for i in range(0, len(list_name), n):
-            yield list_name[i:i+n]
-
-    def pick_up_or_refill(current_pipette):
-        try:
-            current_pipette.pick_up_tip()
-        except OutOfTipsError:
-            pause_attention(
-             """Please Refill the {} Tip Boxes
-             and Empty the Tip Waste""".format(current_pipette))
-            current_pipette.reset_tipracks()
-            current_pipette.pick_up_tip()
-
-    def pause_attention(message):
-        ctx.set_rail_lights(False)
-        ctx.delay(seconds=10)
-        ctx.pause(message)
-        ctx.set_rail_lights(True)
-
-    def aspirate_with_delay(current_pipette, volume, source, delay_seconds):
-        current_pipette.aspirate(volume, source)
-        if delay_seconds > 0:
-            ctx.delay(seconds=delay_seconds)
-
-    def dispense_with_delay(current_pipette, volume, dest, delay_seconds):
-        current_pipette.dispense(volume, dest)
-        if delay_seconds > 0:
-            ctx.delay(seconds=delay_seconds)
-
-    def mix_with_delay(current_pipette, volume, location, delay_seconds):
-        current_pipette.aspirate(volume, location)
-        if delay_seconds > 0:
-            ctx.delay(seconds=delay_seconds)
-        current_pipette.dispense(volume, location)
-        if delay_seconds > 0:
-            ctx.delay(seconds=delay_seconds)
-
-    def slow_tip_withdrawal(current_pipette, well_location, to_center=False):
-        if current_pipette.mount == 'right':
-            axis = 'A'
-        else:
-            axis = 'Z'
-        ctx.max_speeds[axis] = 10
-        if to_center is False:
-            current_pipette.move_to(well_location.top())
-        else:
-            current_pipette.move_to(well_location.center())
-        ctx.max_speeds[axis] = None
-
-    def pre_wet(current_pipette, volume, location):
-        for rep in range(2):
-            current_pipette.aspirate(volume, location)
-            current_pipette.dispense(volume, location)
-
-    def set_default_clearances(
-     current_pipette, aspirate_setting, dispense_setting):
-        if 0 < aspirate_setting < 5 and 0 < dispense_setting < 5:
-            current_pipette.well_bottom_clearance.aspirate = aspirate_setting
-            current_pipette.well_bottom_clearance.dispense = dispense_setting
-
-    def restore_default_clearances(current_pipette):
-        current_pipette.well_bottom_clearance.aspirate = 1
-        current_pipette.well_bottom_clearance.dispense = 1
-
-    def viscous_flow_rates(current_pipette):
-        current_pipette.flow_rate.aspirate = flow_rate_beads
-        current_pipette.flow_rate.dispense = flow_rate_beads
-        current_pipette.flow_rate.blow_out = flow_rate_beads
-
-    def etoh_flow_rates(current_pipette):
-        if (current_pipette.name == 'p300_multi_gen2' or
-           current_pipette.name == 'p300_single_gen2'):
-            current_pipette.flow_rate.aspirate = 92.86
-            current_pipette.flow_rate.dispense = 92.86
-            current_pipette.flow_rate.blow_out = 300
-
-    def default_flow_rates(current_pipette):
-        if (current_pipette.name == 'p300_multi_gen2' or
-           current_pipette.name == 'p300_single_gen2'):
-            current_pipette.flow_rate.aspirate = 92.86
-            current_pipette.flow_rate.dispense = 92.86
-            current_pipette.flow_rate.blow_out = 92.86
-        elif (current_pipette.name == 'p20_multi_gen2' or
-              current_pipette.name == 'p20_single_gen2'):
-            current_pipette.flow_rate.aspirate = 7.56
-            current_pipette.flow_rate.dispense = 7.56
-            current_pipette.flow_rate.blow_out = 7.56
-
-    def reuse_tips(current_pipette, which_tips):
-        current_pipette.reset_tipracks()
-        current_pipette.starting_tip = named_tips[which_tips]
-
-    named_tips = {}
-
-    def name_the_tips(tip_box, name_list, well_list):
-        for name, well in zip(
-         name_list, well_list):
-            named_tips[name] = tip_box[well]
+    # record each tip picked up so a rerun can resume at the next tip
+    ledger = TipLedger(ctx, persistent=tip_track)
+
+    # the beads settle while the pipettes carry on with work that does
+    # not touch the mag plate; the first command that does waits for
+    # the rest of the settling time
+    modules = ModuleTasks(ctx)
+    p20m = modules.guard(p20m)
+    p300m = modules.guard(p300m)
+
+    # flow rates, delays and tip withdrawal for each liquid, set only for
+    # the steps that pipette it
+    liquids = LiquidClasses(ctx)
+    liquids.tune('beads', p300=flow_rate_beads, delay=delay_beads)
 
     ctx.delay(seconds=10)
-    pause_attention("""
+    pause_attention(ctx, """
     Set up for first and second strand cDNA synthesis:
 
     RNA plate (from part 1) in pre-chilled aluminum block on deck slot 7
     (10 ul fragmented and primed RNA with
-    up to 24 samples arranged in columns of 8)
+    up to 88 samples arranged in columns of 8)
 
     Reagents in strip tubes on 4 degree temp module:
     column 1 - strand specificity reagent
@@ -164,25 +85,46 @@ def run(ctx):
     column 3 - second strand reaction buffer w dUTP mix
     column 4 - second strand synthesis enzyme mix
     column 5 - nuclease-free water
+    (with more than 24 samples, also in column 6, with more than 48
+    in column 7 and with more than 72 in column 8)
 
-    p20 tips in slots 2 and 5
-    p300 tips in slots 6 and 9
+    p20 tips in slots 2 and 5 (and 10 with up to 48 samples)
+    p300 tips in slots 6, 9 and 11
     """)
 
     ctx.comment("""
     reagent reservoir in deck slot 1:
     col 1 - beads
-    col 2 - freshly prepared 80 percent ethanol
+    col 2 - freshly prepared 80 percent ethanol (both washes while
+    they fit in it, up to 32 samples in a 15 ml reservoir; otherwise
+    the first wash)
+    col 3 - freshly prepared 80 percent ethanol (second wash, with more
+    than 32 samples in a 15 ml reservoir)
     col 4 - 0.1x TE
     col 10 - waste
     col 11 - waste
     col 12 - waste
+
+    with more than 48 samples, for the split plate's run on the magnet:
+    col 5 - freshly prepared 80 percent ethanol (first wash)
+    col 6 - freshly prepared 80 percent ethanol (second wash)
+    col 7 - waste
+    col 8 - waste
+    col 9 - waste
+
+    fill each column with the volume the fill sheet lists
+    (python -m protocol_tools.fill_sheet), which leaves liquid
+    below the lowest point it is aspirated from
     """)
     reagent_reservoir = ctx.load_labware(
      labware_reservoir, '1', 'Reagent Reservoir')
-    [beads, etoh, te, waste_1, waste_2, waste_3] = [
-     reagent_reservoir.wells_by_name()[
-      well] for well in ['A1', 'A2', 'A4', 'A10', 'A11', 'A12']]
+    [beads, te] = [
+     reagent_reservoir.wells_by_name()[well] for well in ['A1', 'A4']]
+    # ethanol for the two washes and waste for the supernatant and the two
+    # washes, for each run on the magnet
+    run_wells = [[reagent_reservoir.wells_by_name()[well] for well in wells]
+                 for wells in [['A2', 'A3', 'A10', 'A11', 'A12'],
+                               ['A5', 'A6', 'A7', 'A8', 'A9']]]
 
     ctx.comment("""
     mag plate on magnetic module
@@ -190,6 +132,9 @@ def run(ctx):
     mag = ctx.load_module('magnetic module gen2', '4')
     mag.disengage()
     mag_plate = mag.load_labware(labware_pcr_plate, 'Mag Plate')
+    # bead pellet side and offset locations for each column
+    mag_table = WellTable(
+     mag_plate, clearance_bead_pellet, x_offset_bead_pellet)
 
     ctx.comment("""
     reagent block for tube strips on 4 degree temperature module
@@ -204,10 +149,19 @@ def run(ctx):
     on pre-chilled aluminum block
     containing 10 ul fragmented and primed RNA
     samples arranged in columns of 8
-    up to 24 samples total
+    up to 88 samples total
     {} samples in this run
     """.format(str(sample_count)))
     num_cols = math.ceil(sample_count / 8)
+    # a strip tube holds enough water for 3 sample columns
+    water_strips = spread_reagent([water] + [
+     reagent_block.columns_by_name()[name] for name in ['6', '7', '8']],
+     48, num_cols, 170)
+
+    # buffers are aspirated just below their surface, which is worked out
+    # from the volume each step takes out of the reservoir
+    levels = LiquidLevels(clearance=clearance_reservoir)
+    levels.fill(te, 26.5 * 8 * 2 * num_cols)
     sample_plate = ctx.load_labware(
      "opentrons_96_aluminumblock_nest_wellplate_100ul", '7',
      'RNA Sample Plate on Chilled Aluminum Block')
@@ -217,22 +171,37 @@ def run(ctx):
     """)
     elution_plate = ctx.load_labware(labware_pcr_plate, '8', 'Elution Plate')
 
+    # with more than 48 samples, the second halves of the samples go on a
+    # split plate in deck slot 10, cleaned up in a second run on the magnet
+    layout = SplitLayout(num_cols)
+    split_plate = ctx.load_labware(
+     labware_pcr_plate, '10', 'Split Plate') if layout.split_plate else None
+
+    # in the bead clean up, tips are parked back in their racks and used
+    # again in the same sample column
+    tips = TipPlanner(ctx, ledger)
+
     ctx.comment("""
     First strand cDNA synthesis:
     add strand specificity reagent
     add first strand synthesis enzyme mix
     mix
     """)
-    p20m.transfer(
-     8, ss_rgnt[0].bottom(clearance_strip_tubes), [column[0].bottom(
-      clearance_sample_plate) for column in sample_plate.columns()[
-      :num_cols]], new_tip='always')
-    p20m.transfer(
-     2, fs_enz[0].bottom(clearance_strip_tubes), [column[0].bottom(
-      clearance_sample_plate) for column in sample_plate.columns()[
-      :num_cols]], mix_after=(10, 10), new_tip='always')
-
-    pause_attention("""
+    for column in sample_plate.columns()[:num_cols]:
+        pick_up_or_refill(ctx, p20m, ledger)
+        p20m.transfer(
+         8, ss_rgnt[0].bottom(clearance_strip_tubes),
+         column[0].bottom(clearance_sample_plate), new_tip='never')
+        p20m.drop_tip()
+    for column in sample_plate.columns()[:num_cols]:
+        pick_up_or_refill(ctx, p20m, ledger)
+        p20m.transfer(
+         2, fs_enz[0].bottom(clearance_strip_tubes),
+         column[0].bottom(clearance_sample_plate), mix_after=(10, 10),
+         new_tip='never')
+        p20m.drop_tip()
+
+    pause_attention(ctx, """
         pausing for off-deck thermocycler steps
 
         10 min 25 C
@@ -242,7 +211,12 @@ def run(ctx):
 
         immediately place plate in pre-chilled aluminum block
         and return to deck slot 7
+        with more than 48 samples, replenish the p20 tip boxes
         """)
+    if layout.split_plate:
+        # cDNA synthesis takes more p20 tips than two boxes hold
+        p20m.reset_tipracks()
+        ledger.reset(p20m.tip_racks)
 
     ctx.comment("""
     Second strand cDNA synthesis:
@@ -251,22 +225,29 @@ def run(ctx):
     add nuclease-free water
     mix
     """)
-    p20m.transfer(
-     8, ss_rxn_bf[0].bottom(clearance_strip_tubes), [column[0].bottom(
-      clearance_sample_plate) for column in sample_plate.columns()[
-      :num_cols]], new_tip='always')
-    p20m.transfer(
-     4, ss_enz[0].bottom(clearance_strip_tubes), [column[0].bottom(
-      clearance_sample_plate) for column in sample_plate.columns()[
-      :num_cols]], new_tip='always')
+    for column in sample_plate.columns()[:num_cols]:
+        pick_up_or_refill(ctx, p20m, ledger)
+        p20m.transfer(
+         8, ss_rxn_bf[0].bottom(clearance_strip_tubes),
+         column[0].bottom(clearance_sample_plate), new_tip='never')
+        p20m.drop_tip()
+    for column in sample_plate.columns()[:num_cols]:
+        pick_up_or_refill(ctx, p20m, ledger)
+        p20m.transfer(
+         4, ss_enz[0].bottom(clearance_strip_tubes),
+         column[0].bottom(clearance_sample_plate), new_tip='never')
+        p20m.drop_tip()
     for index, chunk in enumerate(
      create_chunks(sample_plate.columns()[:num_cols], 3)):
-        p300m.transfer(
-         48, water[0].bottom(clearance_strip_tubes), [column[0].bottom(
-          clearance_sample_plate) for column in chunk], mix_after=(
-          10, 40), new_tip='always')
+        for column in chunk:
+            pick_up_or_refill(ctx, p300m, ledger)
+            p300m.transfer(
+             48, water_strips[3 * index][0].bottom(clearance_strip_tubes),
+             column[0].bottom(clearance_sample_plate), mix_after=(10, 40),
+             new_tip='never')
+            p300m.drop_tip()
 
-    pause_attention("""
+    pause_attention(ctx, """
         pausing for off-deck thermocycler step
 
         1 hour 16 C
@@ -277,23 +258,30 @@ def run(ctx):
         return the sample plate to the magnetic module
         replenish tip boxes
         empty tip waste
-        add reagents to reservoir in deck slot 1:
-        col 1 - beads
-        col 2 - freshly prepared 80 percent ethanol
-        col 4 - 0.1x TE
+        (the clean up no longer stops between the ethanol washes to
+        refill the p300 tips and empty the tip waste; it asks again
+        only if the tips run out)
+        add reagents to reservoir in deck slot 1 (see above)
         place elution plate in deck slot 8
+        with more than 48 samples, place an empty PCR plate
+        (the split plate) in deck slot 10
         resume
         """)
     p300m.reset_tipracks()
+    ledger.reset(p300m.tip_racks)
     p20m.reset_tipracks()
+    ledger.reset(p20m.tip_racks)
     ctx.comment("""
     bead clean up of double-stranded cDNA
     move half the cDNA volume to a second well
     """)
-    p300m.transfer(40, [column[0].bottom(
-     clearance_sample_plate) for column in mag_plate.columns()[:num_cols]], [
-     column[0].bottom(clearance_sample_plate) for column in mag_plate.columns(
-     )[6:num_cols+6]], new_tip='always')
+    halves = layout.halves(mag_plate, split_plate)
+    for column, split_column in halves:
+        pick_up_or_refill(ctx, p300m, ledger)
+        p300m.transfer(
+         40, column[0].bottom(clearance_sample_plate),
+         split_column[0].bottom(clearance_sample_plate), new_tip='never')
+        p300m.drop_tip()
 
     ctx.comment("""
     add beads and mix, wait
@@ -303,176 +291,148 @@ def run(ctx):
     wait for liquid to finish moving after aspiration and dispense
     withdraw tip slowly from liquid
     """)
-    viscous_flow_rates(p300m)
-    for column in mag_plate.columns()[
-     :num_cols]+mag_plate.columns()[6:num_cols+6]:
-        p300m.pick_up_tip()
-        p300m.mix(3, 100, beads.bottom(clearance_reservoir), rate=2)
-        aspirate_with_delay(p300m, 72, beads.bottom(
-         clearance_reservoir), delay_beads)
-        slow_tip_withdrawal(p300m, beads)
-        dispense_with_delay(p300m, 72, column[0].bottom(
-         clearance_sample_plate), delay_beads)
-        p300m.mix(10, 55, column[0].bottom(2), rate=2)
-        slow_tip_withdrawal(p300m, column[0])
-        p300m.drop_tip()
-    default_flow_rates(p300m)
+    # the split plate's beads incubate off the magnet while the mag plate is
+    # cleaned up
+    with liquids.use(p300m, 'beads') as viscous:
+        for column in layout.sample_columns(mag_plate, split_plate):
+            tips.pick_up(p300m, [beads, column])
+            p300m.mix(3, 100, beads.bottom(clearance_reservoir), rate=2)
+            viscous.aspirate(72, beads.bottom(clearance_reservoir))
+            viscous.withdraw(beads)
+            viscous.dispense(72, column[0].bottom(clearance_sample_plate))
+            p300m.mix(10, 55, column[0].bottom(2), rate=2)
+            viscous.withdraw(column[0])
+            tips.park(p300m)
     ctx.delay(minutes=5)
-    pause_attention("""
+    pause_attention(ctx, """
     spin and return the plate
+    (with more than 48 samples, spin the split plate too and return it
+    to deck slot 10)
     resume
     """)
-    mag.engage(offset=engage_offset)
-    ctx.delay(minutes=engage_time)
-    ctx.comment("""
-    remove sup
-
-    add 80 percent ethanol
-    remove sup
-    repeat
-
-    liquid handling method for ethanol:
-    prewet tips
-    15 ul air gap
-    dispense from top
-    repeated delayed blowout
-    increased blow out flow rate
-    """)
-    for column in mag_plate.columns()[
-     :num_cols]+mag_plate.columns()[6:num_cols+6]:
-        pick_up_or_refill(p300m)
-        if mag_plate.columns().index(column) % 2 != 1:
-            # offset to left to avoid beads (odd col numbers)
-            f = -1
-        else:
-            # offset to right to avoid beads (even col numbers)
-            f = 1
-        p300m.move_to(column[0].top())
-        ctx.max_speeds['Z'] = 10
-        p300m.move_to(column[0].bottom(4))
-        p300m.aspirate(62, column[0].bottom(4), rate=0.33)
-        p300m.aspirate(50, column[0].bottom(
-         clearance_bead_pellet).move(types.Point(
-          x=f*x_offset_bead_pellet, y=0, z=0)), rate=0.33)
-        p300m.move_to(column[0].top())
-        ctx.max_speeds['Z'] = None
-        p300m.air_gap(15)
-        p300m.dispense(127, waste_1.top())
-        p300m.air_gap(15)
-        p300m.drop_tip()
-    etoh_flow_rates(p300m)
-    for repeat in range(2):
-        pick_up_or_refill(p300m)
-        for column in mag_plate.columns()[
-         :num_cols]+mag_plate.columns()[6:num_cols+6]:
-            pre_wet(p300m, 100, etoh.bottom(clearance_reservoir))
-            p300m.aspirate(100, etoh.bottom(clearance_reservoir))
-            p300m.air_gap(15)
-            p300m.dispense(115, column[0].top())
-            for rep in range(3):
-                if rep > 0:
-                    p300m.aspirate(100, column[0].top())
-                ctx.delay(seconds=1)
-                p300m.blow_out(column[0].top())
-        p300m.drop_tip()
-        if repeat == 0:
-            wst = waste_2
-            pause_attention(
-             """Please Refill the p300 Tip Boxes
-             and Empty the Tip Waste""")
-            p300m.reset_tipracks()
-        else:
-            wst = waste_3
-        for column in mag_plate.columns()[
-         :num_cols]+mag_plate.columns()[6:num_cols+6]:
-            pick_up_or_refill(p300m)
-            if mag_plate.columns().index(column) % 2 != 1:
-                # offset to left to avoid beads (odd col numbers)
-                f = -1
-            else:
-                # offset to right to avoid beads (even col numbers)
-                f = 1
+    for run in layout.runs(mag_plate):
+        if run.number > 1:
+            pause_attention(ctx, """
+            swap the plates on the magnetic module:
+            remove the mag plate (its eluates are in the elution plate),
+            spin the split plate and place it on the magnetic module
+            resume
+            """)
+            tips.moved(split_plate, mag_plate)
+        etoh_washes = run_wells[run.number - 1][:2]
+        if (2 * 100 * 8 * len(run.columns) +
+                levels.dead_volume(etoh_washes[0]) <=
+                etoh_washes[0].max_volume):
+            # both washes come from the first ethanol column while they
+            # fit in it, as they always have
+            etoh_washes = etoh_washes[:1] * 2
+        [waste_1, waste_2, waste_3] = run_wells[run.number - 1][2:]
+        for etoh in etoh_washes:
+            levels.fill(etoh, 100 * 8 * len(run.columns))
+        tips.fill(etoh_washes, 'ethanol')
+        mag.engage(offset=engage_offset)
+        modules.start_settling(mag, minutes=engage_time)
+        ctx.comment("""
+        remove sup
+
+        add 80 percent ethanol
+        remove sup
+        repeat
+
+        liquid handling method for ethanol:
+        prewet tips
+        15 ul air gap
+        dispense from top
+        repeated delayed blowout
+        increased blow out flow rate
+        """)
+        for column in run.columns:
+            tips.pick_up(p300m, [column])
             p300m.move_to(column[0].top())
             ctx.max_speeds['Z'] = 10
             p300m.move_to(column[0].bottom(4))
-            p300m.aspirate(50, column[0].bottom(4), rate=0.33)
-            p300m.aspirate(50, column[0].bottom(
-             clearance_bead_pellet).move(types.Point(
-              x=f*x_offset_bead_pellet, y=0, z=0)), rate=0.33)
+            p300m.aspirate(62, column[0].bottom(4), rate=0.33)
+            p300m.aspirate(50, mag_table.beside_pellet(column), rate=0.33)
             p300m.move_to(column[0].top())
             ctx.max_speeds['Z'] = None
             p300m.air_gap(15)
-            p300m.dispense(115, wst.top())
-            for rep in range(3):
-                if rep > 0:
-                    p300m.aspirate(100, wst.top())
-                ctx.delay(seconds=1)
-                p300m.blow_out(wst.top())
+            p300m.dispense(127, waste_1.top())
             p300m.air_gap(15)
-            p300m.drop_tip()
-    default_flow_rates(p300m)
-    mag.disengage()
-    pause_attention("""
-    remove plate, spin, return the plate to the magnetic module
-    resume
-    """)
-    mag.engage()
-    ctx.delay(minutes=1)
-    pause_attention("""
-    remove residual ethanol manually with a 10 ul tip
-    resume
-    """)
-    ctx.comment("""
-    air dry beads
-    """)
-    ctx.delay(minutes=dry_time)
-    mag.disengage()
-    ctx.comment("""
-    add TE and mix
-    """)
-    for column in mag_plate.columns()[
-     :num_cols]+mag_plate.columns()[6:num_cols+6]:
-        pick_up_or_refill(p300m)
-        # offset to right to target beads (odd col numbers)
-        if mag_plate.columns().index(column) % 2 != 1:
-            f = 1
-        # offset to left to target beads (even col numbers)
-        else:
-            f = -1
-        p300m.transfer(26.5, te.bottom(clearance_reservoir), column[0].bottom(
-         clearance_sample_plate).move(types.Point(
-          x=f*x_offset_bead_pellet, y=0, z=0)), mix_after=(10, 15),
-          new_tip='never')
-        slow_tip_withdrawal(p300m, column[0])
-        p300m.drop_tip()
-    pause_attention("""
-    spin and return the plate
-    resume
-    """)
-    ctx.delay(minutes=2)
-    mag.engage()
-    ctx.delay(minutes=engage_time)
-    ctx.comment("""
-    combine eluates and transfer to elution plate
-    """)
-    for index, column in enumerate(mag_plate.columns()[:num_cols]):
-        pick_up_or_refill(p300m)
-        # offset to left to avoid beads (odd col numbers)
-        if mag_plate.columns().index(column) % 2 != 1:
-            f = -1
-        # offset to right to avoid beads (even col numbers)
-        else:
-            f = 1
-        p300m.move_to(column[0].top())
-        p300m.move_to(column[0].bottom(4))
-        p300m.aspirate(25, column[0].bottom(
-         clearance_bead_pellet).move(types.Point(
-          x=f*x_offset_bead_pellet, y=0, z=0)), rate=0.33)
-        p300m.move_to(mag_plate.columns()[index+6][0].top())
-        p300m.move_to(mag_plate.columns()[index+6][0].bottom(4))
-        p300m.aspirate(25, mag_plate.columns()[index+6][0].bottom(
-         clearance_bead_pellet).move(types.Point(
-          x=f*x_offset_bead_pellet, y=0, z=0)), rate=0.33)
-        p300m.dispense(
-         50, elution_plate.columns()[index][0].bottom(clearance_sample_plate))
-        p300m.drop_tip()
+            tips.park(p300m)
+        with liquids.use(p300m, 'ethanol') as ethanol:
+            for repeat in range(2):
+                tips.pick_up(p300m, [etoh_washes[repeat]])
+                for column in run.columns:
+                    source = levels.draw(p300m, 100, etoh_washes[repeat])
+                    pre_wet(p300m, 100, source)
+                    p300m.aspirate(100, source)
+                    p300m.air_gap(15)
+                    p300m.dispense(115, column[0].top())
+                    ethanol.blow_out(column[0].top())
+                tips.park(p300m)
+                tips.add(run.columns, 'ethanol')
+                wst = waste_2 if repeat == 0 else waste_3
+                for column in run.columns:
+                    tips.pick_up(p300m, [column])
+                    p300m.move_to(column[0].top())
+                    ctx.max_speeds['Z'] = 10
+                    p300m.move_to(column[0].bottom(4))
+                    # about 30 ul/s at the ethanol flow rates, to keep off
+                    # the pellet
+                    p300m.aspirate(50, column[0].bottom(4), rate=0.33)
+                    p300m.aspirate(
+                     50, mag_table.beside_pellet(column), rate=0.33)
+                    p300m.move_to(column[0].top())
+                    ctx.max_speeds['Z'] = None
+                    p300m.air_gap(15)
+                    p300m.dispense(115, wst.top())
+                    ethanol.blow_out(wst.top())
+                    p300m.air_gap(15)
+                    tips.park(p300m)
+        mag.disengage()
+        pause_attention(ctx, """
+        remove plate, spin, return the plate to the magnetic module
+        resume
+        """)
+        mag.engage()
+        ctx.delay(minutes=1)
+        pause_attention(ctx, """
+        remove residual ethanol manually with a 10 ul tip
+        resume
+        """)
+        ctx.comment("""
+        air dry beads
+        """)
+        ctx.delay(minutes=dry_time)
+        mag.disengage()
+        ctx.comment("""
+        add TE and mix
+        """)
+        for column in run.columns:
+            tips.pick_up(p300m, [te, column])
+            # offset to target the bead pellet
+            p300m.transfer(26.5, levels.draw(p300m, 26.5, te),
+             mag_table.over_pellet(column, clearance_sample_plate),
+             mix_after=(10, 15), new_tip='never')
+            slow_tip_withdrawal(ctx, p300m, column[0])
+            tips.park(p300m)
+        pause_attention(ctx, """
+        spin and return the plate
+        resume
+        """)
+        ctx.delay(minutes=2)
+        mag.engage()
+        modules.start_settling(mag, minutes=engage_time)
+        ctx.comment("""
+        combine eluates and transfer to elution plate
+        """)
+        for index, columns in run.samples:
+            eluate = elution_plate.columns()[index]
+            tips.pick_up(p300m, columns + [eluate])
+            gather(p300m, 25, [
+             (column[0], mag_table.beside_pellet(column))
+             for column in columns], eluate[0],
+             clearance=clearance_sample_plate, air_gap=15, rate=0.33,
+             approach=4)
+            tips.drop(p300m)
+    tracer.close()
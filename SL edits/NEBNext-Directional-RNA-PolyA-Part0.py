@@ -8,10 +8,8 @@ metadata = {
 #
 
 from opentrons.types import Point
-import json
-import os
 import math
-from opentrons import types
+from protocol_helpers import TipTracker, Tracer, resuspend_pellet
 
 def run(ctx):
 
@@ -34,6 +32,11 @@ def run(ctx):
     num_cols = int(sample_count/8)
     m300_mount = 'left'
     park_tips = True
+    trace_path = ''  # e.g. '/data/B/trace.jsonl' to trace the run
+
+    # with a trace_path, every pipette and module command is traced
+    tracer = Tracer(ctx, trace_path)
+    ctx = tracer.wrap(ctx, 'ctx')
 
     # Load labware
     labware_96_plate = 'nest_96_wellplate_100ul_pcr_full_skirt'
@@ -79,74 +82,9 @@ def run(ctx):
 
     #Tip tracking and helper functions
     tip_track = False  # Track tips on pipette
-    tip_log = {val: {} for val in ctx.loaded_instruments.values()}
-
-    folder_path = '/data/B'
-    tip_file_path = folder_path + '/tip_log.json'
-    if tip_track and not ctx.is_simulating():
-        if os.path.isfile(tip_file_path):
-            with open(tip_file_path) as json_file:
-                data = json.load(json_file)
-                for pip in tip_log:
-                    if pip.name in data:
-                        tip_log[pip]['count'] = data[pip.name]
-                    else:
-                        tip_log[pip]['count'] = 0
-        else:
-            for pip in tip_log:
-                tip_log[pip]['count'] = 0
-    else:
-        for pip in tip_log:
-            tip_log[pip]['count'] = 0
-
-    for pip in tip_log:
-        if pip.type == 'multi':
-            tip_log[pip]['tips'] = [tip for rack in pip.tip_racks
-                                    for tip in rack.rows()[0]]
-        else:
-            tip_log[pip]['tips'] = [tip for rack in pip.tip_racks
-                                    for tip in rack.wells()]
-        tip_log[pip]['max'] = len(tip_log[pip]['tips'])
-
-    def _pick_up(pip, loc=None):
-        if tip_log[pip]['count'] == tip_log[pip]['max'] and not loc:
-            ctx.set_rail_lights(False)
-            ctx.pause('Replace ' + str(pip.max_volume) + 'µl tipracks before \
-    resuming.')
-            ctx.set_rail_lights(True)
-            pip.reset_tipracks()
-            tip_log[pip]['count'] = 0
-        if loc:
-            pip.pick_up_tip(loc)
-        else:
-            pip.pick_up_tip(tip_log[pip]['tips'][tip_log[pip]['count']])
-            tip_log[pip]['count'] += 1
-
-    switch = True
-    drop_count = 0
     # number of tips trash will accommodate before prompting user to empty
-    drop_threshold = 193  # Was 120
-
-    def _drop(pip):
-        nonlocal switch
-        nonlocal drop_count
-        side = 30 if switch else -18
-        drop_loc = ctx.loaded_labwares[12].wells()[0].top().move(
-            Point(x=side))
-        pip.drop_tip(drop_loc)
-        switch = not switch
-        if pip.type == 'multi':
-            drop_count += 8
-        else:
-            drop_count += 1
-        if drop_count >= drop_threshold:
-            # Setup for flashing lights notification to empty trash
-            m300.home()
-            ctx.set_rail_lights(False)
-            ctx.pause('Please empty tips from waste before resuming.')
-            ctx.set_rail_lights(True)
-            ctx.home()  # home before continuing with protocol
-            drop_count = 0
+    tips = TipTracker(ctx, drop_threshold=193, tip_track=tip_track,
+                      rail_lights=True)  # Was 120
 
 
     # Waste Tracking
@@ -179,7 +117,7 @@ def run(ctx):
         m300.flow_rate.aspirate = 30
         num_trans = math.ceil(vol / 200)
         vol_per_trans = vol / num_trans
-        m300.pick_up_tip()
+        tips.pick_up(m300)
         for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
             side = -1 if i % 2 == 0 else 1
             loc = m.bottom(0.5).move(Point(x=side * 2))
@@ -197,51 +135,6 @@ def run(ctx):
         m300.drop_tip() #TODO: check if drop tip can be here
         m300.flow_rate.aspirate = 150
 
-    def resuspend_pellet(well, pip, mvol, reps=5):
-        """
-        'resuspend_pellet' will forcefully dispense liquid over the
-        pellet after the magdeck engage in order to more thoroughly resuspend
-        the pellet.param well: The current well that the resuspension will
-        occur in. param pip: The pipet that is currently attached/ being used.
-        param mvol: The volume that is transferred before the mixing steps.
-        param reps: The number of mix repetitions that should occur. Note~
-        During each mix rep, there are 2 cycles of aspirating from center,
-        dispensing at the top and 2 cycles of aspirating from center,
-        dispensing at the bottom (5 mixes total)
-        """
-
-        rightLeft = int(str(well).split(' ')[0][1:]) % 2
-        """
-        'rightLeft' will determine which value to use in the list of 'top' and
-        'bottom' (below), based on the column of the 'well' used.
-        In the case that an Even column is used, the first value of 'top' and
-        'bottom' will be used, otherwise,
-        the second value of each will be used.
-        """
-        center = well.bottom().move(types.Point(x=0, y=0, z=0.5))
-        top = [
-            well.bottom().move(types.Point(x=-3.8, y=3.8, z=10)),
-            well.bottom().move(types.Point(x=3.8, y=3.8, z=10))
-        ]
-        bottom = [
-            well.bottom().move(types.Point(x=-3.8, y=-3.8, z=10)),
-            well.bottom().move(types.Point(x=3.8, y=-3.8, z=10))
-        ]
-
-        pip.flow_rate.dispense = 500
-        pip.flow_rate.aspirate = 150
-
-        mix_vol = 0.9 * mvol
-
-        pip.move_to(center)
-        for _ in range(reps):
-            for _ in range(2):
-                pip.aspirate(mix_vol, center)
-                pip.dispense(mix_vol, top[rightLeft])
-            for _ in range(2):
-                pip.aspirate(mix_vol, center)
-                pip.dispense(mix_vol, bottom[rightLeft])
-
     def add_beads(vol, source, park=False):
         total_vol = vol*num_cols
         m300.distribute(vol, source, magplate.columns()[0:num_cols], disposal_volume=5, mix_before=(6,0.9*total_vol))
@@ -271,7 +164,7 @@ def run(ctx):
         num_trans = math.ceil(vol / 200)
         vol_per_trans = vol / num_trans
         for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300)
+            tips.pick_up(m300)
             # side = 1 if i % 2 == 0 else -1
             # loc = m.bottom(0.5).move(Point(x=side*2))
             src = source[i // (12 // len(source))]
@@ -284,13 +177,13 @@ def run(ctx):
                     m300.air_gap(20)
             if resuspend:
                 # m300.mix(mix_reps, 150, loc)
-                resuspend_pellet(m, m300, 180)
+                resuspend_pellet(m, m300, 180, center_z=0.5, corner_z=10)
             m300.blow_out(m.top())
             m300.air_gap(20)
             if park:
                 m300.drop_tip(spot)
             else:
-                _drop(m300)
+                tips.drop(m300)
 
         if discard_supernatant:
             if magdeck.status == 'disengaged':
@@ -316,8 +209,4 @@ def run(ctx):
     tc.set_lid_temperature(75)
     tc.set_block_temperature(65, hold_time_minutes=5, block_max_volume=50)
     tc.set_block_temperature(4)
-
-
-
-
-
+    tracer.close()
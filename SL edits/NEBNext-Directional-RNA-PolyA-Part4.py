@@ -1,12 +1,14 @@
 def get_values(*names):
     import json
-    _all_values = json.loads("""{"sample_count":24,"labware_pcr_plate":"nest_96_wellplate_100ul_pcr_full_skirt","labware_reservoir":"nest_12_reservoir_15ml","labware_tube_strip":"opentrons_96_aluminumblock_generic_pcr_strip_200ul","clearance_sample_plate":1,"clearance_reservoir":2,"clearance_strip_tubes":2,"clearance_bead_pellet":2,"delay_beads":1,"flow_rate_beads":60,"engage_time":5,"engage_offset":0,"dry_time":5,"x_offset_bead_pellet":1.5}""")
+    _all_values = json.loads("""{"sample_count":24,"labware_pcr_plate":"nest_96_wellplate_100ul_pcr_full_skirt","labware_reservoir":"nest_12_reservoir_15ml","labware_tube_strip":"opentrons_96_aluminumblock_generic_pcr_strip_200ul","clearance_sample_plate":1,"clearance_reservoir":2,"clearance_strip_tubes":2,"clearance_bead_pellet":2,"delay_beads":1,"flow_rate_beads":60,"engage_time":5,"engage_offset":0,"dry_time":5,"x_offset_bead_pellet":1.5,"tip_track":false,"resume":false,"trace_path":""}""")
     return [_all_values[n] for n in names]
 
 
 import math
-from opentrons import types
-from opentrons.protocol_api.labware import OutOfTipsError
+from protocol_helpers import (
+    Checkpoint, LiquidClasses, LiquidLevels, ModuleTasks, TipLedger, Tracer,
+    WellTable, pause_attention, pick_up_or_refill, pre_wet,
+    slow_tip_withdrawal)
 
 metadata = {
     'protocolName': '''NEBNext Ultra II Directional RNA Library Prep Kit
@@ -24,13 +26,17 @@ def run(ctx):
      labware_reservoir, labware_tube_strip, clearance_sample_plate,
      clearance_reservoir, clearance_strip_tubes, clearance_bead_pellet,
      delay_beads, flow_rate_beads, engage_time, engage_offset, dry_time,
-     x_offset_bead_pellet
+     x_offset_bead_pellet, tip_track, resume, trace_path
      ] = get_values(  # noqa: F821
       'sample_count', 'labware_pcr_plate',
       'labware_reservoir', 'labware_tube_strip', 'clearance_sample_plate',
       'clearance_reservoir', 'clearance_strip_tubes', 'clearance_bead_pellet',
       'delay_beads', 'flow_rate_beads', 'engage_time', 'engage_offset',
-      'dry_time', 'x_offset_bead_pellet')
+      'dry_time', 'x_offset_bead_pellet', 'tip_track', 'resume', 'trace_path')
+
+    # with a trace_path, every pipette and module command is traced
+    tracer = Tracer(ctx, trace_path)
+    ctx = tracer.wrap(ctx, 'ctx')
 
     ctx.set_rail_lights(True)
     if not 1 <= sample_count <= 24:
@@ -46,112 +52,32 @@ def run(ctx):
     p300m = ctx.load_instrument(
         "p300_multi_gen2", 'right', tip_racks=tips300)
 
-    """
-    helper functions
-    """
-
-    def create_chunks(list_name, n):
-        for i in range(0, len(list_name), n):
-            yield list_name[i:i+n]
-
-    def pick_up_or_refill(current_pipette):
-        try:
-            current_pipette.pick_up_tip()
-        except OutOfTipsError:
-            pause_attention(
-             """Please Refill the {} Tip Boxes
-             and Empty the Tip Waste""".format(current_pipette))
-            current_pipette.reset_tipracks()
-            current_pipette.pick_up_tip()
-
-    def pause_attention(message):
-        ctx.set_rail_lights(False)
-        ctx.delay(seconds=10)
-        ctx.pause(message)
-        ctx.set_rail_lights(True)
-
-    def aspirate_with_delay(current_pipette, volume, source, delay_seconds):
-        current_pipette.aspirate(volume, source)
-        if delay_seconds > 0:
-            ctx.delay(seconds=delay_seconds)
-
-    def dispense_with_delay(current_pipette, volume, dest, delay_seconds):
-        current_pipette.dispense(volume, dest)
-        if delay_seconds > 0:
-            ctx.delay(seconds=delay_seconds)
-
-    def mix_with_delay(current_pipette, volume, location, delay_seconds):
-        current_pipette.aspirate(volume, location)
-        if delay_seconds > 0:
-            ctx.delay(seconds=delay_seconds)
-        current_pipette.dispense(volume, location)
-        if delay_seconds > 0:
-            ctx.delay(seconds=delay_seconds)
-
-    def slow_tip_withdrawal(current_pipette, well_location, to_center=False):
-        if current_pipette.mount == 'right':
-            axis = 'A'
-        else:
-            axis = 'Z'
-        ctx.max_speeds[axis] = 10
-        if to_center is False:
-            current_pipette.move_to(well_location.top())
-        else:
-            current_pipette.move_to(well_location.center())
-        ctx.max_speeds[axis] = None
-
-    def pre_wet(current_pipette, volume, location):
-        for rep in range(2):
-            current_pipette.aspirate(volume, location)
-            current_pipette.dispense(volume, location)
-
-    def set_default_clearances(
-     current_pipette, aspirate_setting, dispense_setting):
-        if 0 < aspirate_setting < 5 and 0 < dispense_setting < 5:
-            current_pipette.well_bottom_clearance.aspirate = aspirate_setting
-            current_pipette.well_bottom_clearance.dispense = dispense_setting
-
-    def restore_default_clearances(current_pipette):
-        current_pipette.well_bottom_clearance.aspirate = 1
-        current_pipette.well_bottom_clearance.dispense = 1
-
-    def viscous_flow_rates(current_pipette):
-        current_pipette.flow_rate.aspirate = flow_rate_beads
-        current_pipette.flow_rate.dispense = flow_rate_beads
-        current_pipette.flow_rate.blow_out = flow_rate_beads
-
-    def etoh_flow_rates(current_pipette):
-        if (current_pipette.name == 'p300_multi_gen2' or
-           current_pipette.name == 'p300_single_gen2'):
-            current_pipette.flow_rate.aspirate = 92.86
-            current_pipette.flow_rate.dispense = 92.86
-            current_pipette.flow_rate.blow_out = 300
-
-    def default_flow_rates(current_pipette):
-        if (current_pipette.name == 'p300_multi_gen2' or
-           current_pipette.name == 'p300_single_gen2'):
-            current_pipette.flow_rate.aspirate = 92.86
-            current_pipette.flow_rate.dispense = 92.86
-            current_pipette.flow_rate.blow_out = 92.86
-        elif (current_pipette.name == 'p20_multi_gen2' or
-              current_pipette.name == 'p20_single_gen2'):
-            current_pipette.flow_rate.aspirate = 7.56
-            current_pipette.flow_rate.dispense = 7.56
-            current_pipette.flow_rate.blow_out = 7.56
-
-    def reuse_tips(current_pipette, which_tips):
-        current_pipette.reset_tipracks()
-        current_pipette.starting_tip = named_tips[which_tips]
-
-    named_tips = {}
-
-    def name_the_tips(tip_box, name_list, well_list):
-        for name, well in zip(
-         name_list, well_list):
-            named_tips[name] = tip_box[well]
+    # record each tip picked up so a rerun can resume at the next tip
+    ledger = TipLedger(ctx, persistent=tip_track)
+
+    # with resume, an interrupted run restarts at the first unfinished
+    # column; operator pauses and delays of finished steps are skipped
+    checkpoint = Checkpoint(
+     ctx, '/data/B/nebnext_part4_checkpoint.json', resume=resume,
+     ledger=ledger)
+    pause = checkpoint.live(pause_attention)
+    delay = checkpoint.live(ctx.delay)
+
+    # the beads settle while the pipettes carry on with work that does
+    # not touch the mag plate; the first command that does waits for
+    # the rest of the settling time
+    modules = ModuleTasks(ctx, delay=delay)
+    p20m = modules.guard(p20m)
+    p300m = modules.guard(p300m)
+
+    # flow rates, delays and tip withdrawal for each liquid, set only for
+    # the steps that pipette it
+    liquids = LiquidClasses(ctx)
+    for liquid in ('beads', 'master mix'):
+        liquids.tune(liquid, p300=flow_rate_beads, delay=delay_beads)
 
     ctx.delay(seconds=10)
-    pause_attention("""
+    pause_attention(ctx, """
     Set up for PCR Enrichment and Bead Clean Up:
 
     sample plate (from part 3) on deck slot 7
@@ -172,6 +98,10 @@ def run(ctx):
     col 10 - waste
     col 11 - waste
     col 12 - waste
+
+    fill each column with the volume the fill sheet lists
+    (python -m protocol_tools.fill_sheet), which leaves liquid
+    below the lowest point it is aspirated from
     """)
     reagent_reservoir = ctx.load_labware(
      labware_reservoir, '1', 'Reagent Reservoir')
@@ -185,6 +115,9 @@ def run(ctx):
     mag = ctx.load_module('magnetic module gen2', '4')
     mag.disengage()
     mag_plate = mag.load_labware(labware_pcr_plate, 'Mag Plate')
+    # bead pellet side and offset locations for each column
+    mag_table = WellTable(
+     mag_plate, clearance_bead_pellet, x_offset_bead_pellet)
 
     ctx.comment("""
     reagent block for tube strips on 4 degree temperature module
@@ -202,6 +135,14 @@ def run(ctx):
     {} samples in this run
     """.format(str(sample_count)))
     num_cols = math.ceil(sample_count / 8)
+
+    # buffers are aspirated just below their surface, which is worked out
+    # from the volume each step takes out of the reservoir (a resumed run
+    # cannot know it and aspirates at the bottom)
+    levels = LiquidLevels(
+     clearance=clearance_reservoir, track=not checkpoint.resuming)
+    levels.fill(etoh, 2 * 150 * 8 * num_cols)
+    levels.fill(te, 23 * 8 * num_cols)
     sample_plate = ctx.load_labware(
      labware_pcr_plate, '7', 'cDNA Sample Plate')
 
@@ -219,51 +160,50 @@ def run(ctx):
     wait for liquid to finish moving after aspiration and dispense
     withdraw tip slowly from liquid
     """)
-    viscous_flow_rates(p300m)
-    for column in sample_plate.columns()[:num_cols]:
-        p300m.pick_up_tip()
-        aspirate_with_delay(p300m, 25, q5_mm[0].bottom(
-         clearance_strip_tubes), delay_beads)
-        slow_tip_withdrawal(p300m, q5_mm[0])
-        dispense_with_delay(p300m, 25, column[0].bottom(
-         clearance_sample_plate), delay_beads)
-        for repeat in range(10):
-            mix_with_delay(p300m, 20, column[0].bottom(
-             clearance_sample_plate), delay_beads)
-        slow_tip_withdrawal(p300m, column[0])
-        p300m.drop_tip()
-    default_flow_rates(p300m)
+    with liquids.use(p300m, 'master mix') as master_mix:
+        for column in checkpoint.columns(
+         'add q5 master mix', sample_plate.columns()[:num_cols]):
+            pick_up_or_refill(ctx, p300m, ledger)
+            master_mix.aspirate(25, q5_mm[0].bottom(clearance_strip_tubes))
+            master_mix.withdraw(q5_mm[0])
+            master_mix.dispense(25, column[0].bottom(clearance_sample_plate))
+            master_mix.mix(10, 20, column[0].bottom(clearance_sample_plate))
+            master_mix.withdraw(column[0])
+            p300m.drop_tip()
 
-    pause_attention("""
-        pausing for off-deck steps
+    for _ in checkpoint.step('refill tips'):
+        pause_attention(ctx, """
+            pausing for off-deck steps
 
-        add 10 uL primer from selected primer plate cols, mix
+            add 10 uL primer from selected primer plate cols, mix
 
-        spin the plate
-        then, on thermocycler-
+            spin the plate
+            then, on thermocycler-
 
-        30 sec 98 C
+            30 sec 98 C
 
-        8-16 cycles:
-        10 sec 98 C
-        75 sec 65 C
+            8-16 cycles:
+            10 sec 98 C
+            75 sec 65 C
 
-        5 min 65 C
-        hold 4 C
+            5 min 65 C
+            hold 4 C
 
-        return the plate to the magnetic module for bead clean up
+            return the plate to the magnetic module for bead clean up
 
-        set up for bead clean up:
-        replenish the tip boxes
-        add reagents to reservoir in deck slot 1:
-        col 1 - beads
-        col 2 - freshly prepared 80 percent ethanol
-        col 4 - 0.1x TE
-        place elution plate in deck slot 8
-        resume
-        """)
-    p300m.reset_tipracks()
-    p20m.reset_tipracks()
+            set up for bead clean up:
+            replenish the tip boxes
+            add reagents to reservoir in deck slot 1:
+            col 1 - beads
+            col 2 - freshly prepared 80 percent ethanol
+            col 4 - 0.1x TE
+            place elution plate in deck slot 8
+            resume
+            """)
+        p300m.reset_tipracks()
+        ledger.reset(p300m.tip_racks)
+        p20m.reset_tipracks()
+        ledger.reset(p20m.tip_racks)
 
     ctx.comment("""
     bead clean up:
@@ -275,26 +215,24 @@ def run(ctx):
     wait for liquid to finish moving after aspiration and dispense
     withdraw tip slowly from liquid
     """)
-    viscous_flow_rates(p300m)
-    for column in mag_plate.columns()[:num_cols]:
-        p300m.pick_up_tip()
-        p300m.mix(3, 100, beads.bottom(clearance_reservoir), rate=2)
-        aspirate_with_delay(p300m, 45, beads.bottom(
-         clearance_reservoir), delay_beads)
-        slow_tip_withdrawal(p300m, beads)
-        dispense_with_delay(p300m, 45, column[0].bottom(
-         clearance_sample_plate), delay_beads)
-        p300m.mix(6, 50, column[0].bottom(3), rate=2)
-        slow_tip_withdrawal(p300m, column[0])
-        p300m.drop_tip()
-    default_flow_rates(p300m)
-    ctx.delay(minutes=5)
-    pause_attention("""
+    with liquids.use(p300m, 'beads') as viscous:
+        for column in checkpoint.columns(
+         'add beads', mag_plate.columns()[:num_cols]):
+            pick_up_or_refill(ctx, p300m, ledger)
+            p300m.mix(3, 100, beads.bottom(clearance_reservoir), rate=2)
+            viscous.aspirate(45, beads.bottom(clearance_reservoir))
+            viscous.withdraw(beads)
+            viscous.dispense(45, column[0].bottom(clearance_sample_plate))
+            p300m.mix(6, 50, column[0].bottom(3), rate=2)
+            viscous.withdraw(column[0])
+            p300m.drop_tip()
+    delay(minutes=5)
+    pause(ctx, """
     spin and return the plate
     resume
     """)
     mag.engage(offset=engage_offset)
-    ctx.delay(minutes=engage_time)
+    modules.start_settling(mag, minutes=engage_time)
     ctx.comment("""
     remove sup
 
@@ -309,18 +247,11 @@ def run(ctx):
     repeated delayed blowout
     increased blow out flow rate
     """)
-    for index, column in enumerate(mag_plate.columns()[:num_cols]):
-        pick_up_or_refill(p300m)
-        if index % 2 != 1:
-            # offset to left for odd col no to avoid bead pellet
-            aspirate_location = column[0].bottom(
-             clearance_bead_pellet).move(
-             types.Point(x=-1*x_offset_bead_pellet, y=0, z=0))
-        else:
-            # offset to right for even col no to avoid bead pellet
-            aspirate_location = column[0].bottom(
-             clearance_bead_pellet).move(
-             types.Point(x=x_offset_bead_pellet, y=0, z=0))
+    for index, column in checkpoint.columns(
+     'remove supernatant', enumerate(mag_plate.columns()[:num_cols])):
+        pick_up_or_refill(ctx, p300m, ledger)
+        # offset to avoid the bead pellet
+        aspirate_location = mag_table.beside_pellet(column)
         p300m.move_to(column[0].top())
         ctx.max_speeds['Z'] = 10
         p300m.move_to(column[0].bottom(4))
@@ -332,114 +263,85 @@ def run(ctx):
         p300m.dispense(120, waste_1.top())
         p300m.air_gap(15)
         p300m.drop_tip()
-    etoh_flow_rates(p300m)
-    for repeat in range(2):
-        pick_up_or_refill(p300m)
-        for column in mag_plate.columns()[:num_cols]:
-            pre_wet(p300m, 150, etoh.bottom(clearance_reservoir))
-            p300m.aspirate(150, etoh.bottom(clearance_reservoir))
-            p300m.air_gap(15)
-            p300m.dispense(165, column[0].top())
-            for rep in range(3):
-                if rep > 0:
-                    p300m.aspirate(150, column[0].top())
-                ctx.delay(seconds=1)
-                p300m.blow_out(column[0].top())
-        p300m.drop_tip()
-        if repeat == 0:
-            wst = waste_2
-            pause_attention(
-             """Please Refill the p300 Tip Boxes
-             and Empty the Tip Waste""")
-            p300m.reset_tipracks()
-        else:
-            wst = waste_3
-        for index, column in enumerate(mag_plate.columns()[:num_cols]):
-            pick_up_or_refill(p300m)
-            if index % 2 != 1:
-                # offset to left for odd col no to avoid bead pellet
-                aspirate_location = column[0].bottom(
-                 clearance_bead_pellet).move(
-                 types.Point(x=-1*x_offset_bead_pellet, y=0, z=0))
-            else:
-                # offset to right for even col no to avoid bead pellet
-                aspirate_location = column[0].bottom(
-                 clearance_bead_pellet).move(
-                 types.Point(x=x_offset_bead_pellet, y=0, z=0))
-            p300m.move_to(column[0].top())
-            ctx.max_speeds['Z'] = 10
-            p300m.move_to(column[0].bottom(4))
-            p300m.aspirate(100, column[0].bottom(4), rate=0.33)
-            p300m.aspirate(50, aspirate_location, rate=0.33)
-            p300m.move_to(column[0].top())
-            ctx.max_speeds['Z'] = None
-            p300m.air_gap(20)
-            p300m.dispense(170, wst.top())
-            for rep in range(3):
-                if rep > 0:
-                    p300m.aspirate(150, wst.top())
-                ctx.delay(seconds=1)
-                p300m.blow_out(wst.top())
-            p300m.air_gap(15)
-            p300m.drop_tip()
-    default_flow_rates(p300m)
+    with liquids.use(p300m, 'ethanol') as ethanol:
+        for repeat in range(2):
+            for _ in checkpoint.step('add ethanol'):
+                pick_up_or_refill(ctx, p300m, ledger)
+                for column in mag_plate.columns()[:num_cols]:
+                    source = levels.draw(p300m, 150, etoh)
+                    pre_wet(p300m, 150, source)
+                    p300m.aspirate(150, source)
+                    p300m.air_gap(15)
+                    p300m.dispense(165, column[0].top())
+                    ethanol.blow_out(column[0].top(), air=150)
+                p300m.drop_tip()
+            wst = waste_2 if repeat == 0 else waste_3
+            for index, column in checkpoint.columns(
+             'remove ethanol', enumerate(mag_plate.columns()[:num_cols])):
+                pick_up_or_refill(ctx, p300m, ledger)
+                # offset to avoid the bead pellet
+                aspirate_location = mag_table.beside_pellet(column)
+                p300m.move_to(column[0].top())
+                ctx.max_speeds['Z'] = 10
+                p300m.move_to(column[0].bottom(4))
+                # about 30 ul/s at the ethanol flow rates, to keep off the
+                # pellet
+                p300m.aspirate(100, column[0].bottom(4), rate=0.33)
+                p300m.aspirate(50, aspirate_location, rate=0.33)
+                p300m.move_to(column[0].top())
+                ctx.max_speeds['Z'] = None
+                p300m.air_gap(20)
+                p300m.dispense(170, wst.top())
+                ethanol.blow_out(wst.top(), air=150)
+                p300m.air_gap(15)
+                p300m.drop_tip()
     mag.disengage()
-    pause_attention("""
+    pause(ctx, """
     remove plate, spin, return the plate to the magnetic module
     resume
     """)
     mag.engage(offset=engage_offset)
-    ctx.delay(minutes=1)
-    pause_attention("""
+    delay(minutes=1)
+    pause(ctx, """
     manually remove last traces of ethanol with 10 ul tip
     resume
     """)
     ctx.comment("""
     air dry beads
     """)
-    ctx.delay(minutes=dry_time)
+    delay(minutes=dry_time)
     mag.disengage()
     ctx.comment("""
     add TE and mix
     """)
-    for index, column in enumerate(mag_plate.columns()[:num_cols]):
-        pick_up_or_refill(p300m)
-        # offset to right to target beads (odd col numbers)
-        if index % 2 != 1:
-            f = 1
-        # offset to left to target beads (even col numbers)
-        else:
-            f = -1
+    for index, column in checkpoint.columns(
+     'add te', enumerate(mag_plate.columns()[:num_cols])):
+        pick_up_or_refill(ctx, p300m, ledger)
+        # offset to target the bead pellet
         p300m.transfer(
-         23, te.bottom(clearance_reservoir), column[0].bottom(
-          clearance_sample_plate).move(types.Point(
-           x=f*x_offset_bead_pellet, y=0, z=0)
-           ), mix_after=(10, 15), new_tip='never')
-        slow_tip_withdrawal(p300m, column[0])
+         23, levels.draw(p300m, 23, te),
+         mag_table.over_pellet(column, clearance_sample_plate),
+         mix_after=(10, 15), new_tip='never')
+        slow_tip_withdrawal(ctx, p300m, column[0])
         p300m.drop_tip()
-    pause_attention("""
+    pause(ctx, """
     spin and return the plate
     resume
     """)
-    ctx.delay(minutes=2)
+    delay(minutes=2)
     mag.engage(offset=engage_offset)
-    ctx.delay(minutes=engage_time)
+    modules.start_settling(mag, minutes=engage_time)
     ctx.comment("""
     transfer to elution plate
     """)
-    for index, column in enumerate(mag_plate.columns()[:num_cols]):
-        pick_up_or_refill(p20m)
-        # offset to left to avoid beads (odd col numbers)
-        if index % 2 != 1:
-            f = -1
-        # offset to right to avoid beads (even col numbers)
-        else:
-            f = 1
+    for index, column in checkpoint.columns(
+     'transfer eluates', enumerate(mag_plate.columns()[:num_cols])):
+        pick_up_or_refill(ctx, p20m, ledger)
         p20m.move_to(column[0].top())
         p20m.move_to(column[0].bottom(4))
-        p20m.aspirate(20, column[0].bottom(
-         clearance_bead_pellet).move(types.Point(
-          x=f*x_offset_bead_pellet, y=0, z=0)), rate=0.33)
+        p20m.aspirate(20, mag_table.beside_pellet(column), rate=0.33)
         p20m.dispense(
          20, elution_plate.columns()[index][0].bottom(clearance_sample_plate))
         p20m.drop_tip()
+    checkpoint.finish()
+    tracer.close()
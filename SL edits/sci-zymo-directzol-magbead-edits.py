@@ -14,16 +14,17 @@
 def get_values(*names):
     import json
     _all_values = json.loads("""{"num_samples":8,"deepwell_type":"usascientific_96_wellplate_2.4ml_deep",
-    "res_type":"nest_12_reservoir_15ml","starting_vol":200,"elution_vol":50,"park_tips":true,
-    "mag_gen":"magnetic module gen2","m300_mount":"left"}""")
+    "res_type":"nest_12_reservoir_15ml","starting_vol":200,"elution_vol":50,
+    "park_tips":true,"resume":false,
+    "mag_gen":"magnetic module gen2","m300_mount":"left","trace_path":""}""")
     return [_all_values[n] for n in names]
 
 
 from opentrons.types import Point
-import json
-import os
 import math
-from opentrons import types
+from protocol_helpers import (
+    Checkpoint, IncubationTimer, ModuleTasks, TipTracker, Tracer,
+    resuspend_pellet)
 
 
 metadata = {
@@ -39,9 +40,15 @@ def run(ctx):
     ctx.set_rail_lights(True)
 
     [num_samples, deepwell_type, res_type, starting_vol,
-     elution_vol, park_tips, mag_gen, m300_mount] = get_values(  # noqa: F821
+     elution_vol, park_tips, resume, mag_gen, m300_mount,
+     trace_path] = get_values(  # noqa: F821
         'num_samples', 'deepwell_type', 'res_type', 'starting_vol',
-        'elution_vol', 'park_tips', 'mag_gen', 'm300_mount')
+        'elution_vol', 'park_tips', 'resume', 'mag_gen', 'm300_mount',
+        'trace_path')
+
+    # with a trace_path, every pipette and module command is traced
+    tracer = Tracer(ctx, trace_path)
+    ctx = tracer.wrap(ctx, 'ctx')
 
     if num_samples % 8 != 0:
         raise Exception("Enter a sample number wholly divisible by 8")
@@ -90,8 +97,6 @@ def run(ctx):
     m300 = ctx.load_instrument(
         'p300_multi_gen2', m300_mount, tip_racks=tips300)
 
-    tip_log = {val: {} for val in ctx.loaded_instruments.values()}
-
     """
     Here is where you can define the locations of your reagents.
     """
@@ -125,75 +130,27 @@ def run(ctx):
     m300.flow_rate.blow_out = 300
     tip_track = False #Track tips on pipette
 
-    folder_path = '/data/B'
-    tip_file_path = folder_path + '/tip_log.json'
-    if tip_track and not ctx.is_simulating():
-        if os.path.isfile(tip_file_path):
-            with open(tip_file_path) as json_file:
-                data = json.load(json_file)
-                for pip in tip_log:
-                    if pip.name in data:
-                        tip_log[pip]['count'] = data[pip.name]
-                    else:
-                        tip_log[pip]['count'] = 0
-        else:
-            for pip in tip_log:
-                tip_log[pip]['count'] = 0
-    else:
-        for pip in tip_log:
-            tip_log[pip]['count'] = 0
-
-    for pip in tip_log:
-        if pip.type == 'multi':
-            tip_log[pip]['tips'] = [tip for rack in pip.tip_racks
-                                    for tip in rack.rows()[0]]
-        else:
-            tip_log[pip]['tips'] = [tip for rack in pip.tip_racks
-                                    for tip in rack.wells()]
-        tip_log[pip]['max'] = len(tip_log[pip]['tips'])
-
-    def _pick_up(pip, loc=None):
-        if tip_log[pip]['count'] == tip_log[pip]['max'] and not loc:
-            ctx.set_rail_lights(False)
-            ctx.pause('Replace ' + str(pip.max_volume) + 'µl tipracks before \
-resuming.')
-            ctx.set_rail_lights(True)
-            pip.reset_tipracks()
-            tip_log[pip]['count'] = 0
-        if loc:
-            pip.pick_up_tip(loc)
-        else:
-            pip.pick_up_tip(tip_log[pip]['tips'][tip_log[pip]['count']])
-            tip_log[pip]['count'] += 1
-
-    switch = True
-    drop_count = 0
     # number of tips trash will accommodate before prompting user to empty
-    drop_threshold = 193 #Was 120
-
-    def _drop(pip):
-        nonlocal switch
-        nonlocal drop_count
-        side = 30 if switch else -18
-        drop_loc = ctx.loaded_labwares[12].wells()[0].top().move(
-            Point(x=side))
-        pip.drop_tip(drop_loc)
-        switch = not switch
-        if pip.type == 'multi':
-            drop_count += 8
-        else:
-            drop_count += 1
-        if drop_count >= drop_threshold:
-            # Setup for flashing lights notification to empty trash
-            m300.home()
-            ctx.set_rail_lights(False)
-            ctx.pause('Please empty tips from waste before resuming.')
-            ctx.set_rail_lights(True)
-            ctx.home()  # home before continuing with protocol
-            drop_count = 0
-
-    waste_vol = 0
+    tips = TipTracker(ctx, drop_threshold=193, tip_track=tip_track,
+                      rail_lights=True)  # Was 120
+
+    # with resume, an interrupted run restarts at the first unfinished
+    # column; operator pauses and delays of finished steps are skipped
+    checkpoint = Checkpoint(ctx, '/data/B/zymo_checkpoint.json',
+                            resume=resume, ledger=tips.ledger)
+    tips.drop_count = checkpoint.state.get('drop_count', 0)
+    pause = checkpoint.live(ctx.pause)
+    delay = checkpoint.live(ctx.delay)
+
+    # the beads settle while the pipette picks up its next tips; it waits
+    # for them before it first touches the plate on the magnetic module
+    modules = ModuleTasks(ctx, delay=delay)
+    m300 = modules.guard(m300)
+
+    waste_vol = checkpoint.state.get('waste_vol', 0)
     waste_threshold = 185000
+    checkpoint.watch(lambda: {'drop_count': tips.drop_count,
+                              'waste_vol': waste_vol})
 
     def remove_supernatant(vol, park=False):
         """
@@ -222,11 +179,13 @@ resuming.')
         m300.flow_rate.aspirate = 30
         num_trans = math.ceil(vol/200)
         vol_per_trans = vol/num_trans
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
+        for i, (m, spot) in checkpoint.columns(
+                'remove supernatant',
+                enumerate(zip(mag_samples_m, parking_spots))):
             if park:
-                _pick_up(m300, spot)
+                tips.pick_up(m300, spot)
             else:
-                _pick_up(m300)
+                tips.pick_up(m300)
             side = -1 if i % 2 == 0 else 1
             loc = m.bottom(0.5).move(Point(x=side*2))
             for _ in range(num_trans):
@@ -239,54 +198,9 @@ resuming.')
                               air_gap=20)
                 m300.blow_out(waste)
                 m300.air_gap(20)
-            _drop(m300)
+            tips.drop(m300)
         m300.flow_rate.aspirate = 150
 
-    def resuspend_pellet(well, pip, mvol, reps=5):
-        """
-        'resuspend_pellet' will forcefully dispense liquid over the
-        pellet after the magdeck engage in order to more thoroughly resuspend
-        the pellet.param well: The current well that the resuspension will
-        occur in. param pip: The pipet that is currently attached/ being used.
-        param mvol: The volume that is transferred before the mixing steps.
-        param reps: The number of mix repetitions that should occur. Note~
-        During each mix rep, there are 2 cycles of aspirating from center,
-        dispensing at the top and 2 cycles of aspirating from center,
-        dispensing at the bottom (5 mixes total)
-        """
-
-        rightLeft = int(str(well).split(' ')[0][1:]) % 2
-        """
-        'rightLeft' will determine which value to use in the list of 'top' and
-        'bottom' (below), based on the column of the 'well' used.
-        In the case that an Even column is used, the first value of 'top' and
-        'bottom' will be used, otherwise,
-        the second value of each will be used.
-        """
-        center = well.bottom().move(types.Point(x=0, y=0, z=0.5))
-        top = [
-            well.bottom().move(types.Point(x=-3.8, y=3.8, z=10)),
-            well.bottom().move(types.Point(x=3.8, y=3.8, z=10))
-        ]
-        bottom = [
-            well.bottom().move(types.Point(x=-3.8, y=-3.8, z=10)),
-            well.bottom().move(types.Point(x=3.8, y=-3.8, z=10))
-        ]
-
-        pip.flow_rate.dispense = 500
-        pip.flow_rate.aspirate = 150
-
-        mix_vol = 0.9 * mvol
-
-        pip.move_to(center)
-        for _ in range(reps):
-            for _ in range(2):
-                pip.aspirate(mix_vol, center)
-                pip.dispense(mix_vol, top[rightLeft])
-            for _ in range(2):
-                pip.aspirate(mix_vol, center)
-                pip.dispense(mix_vol, bottom[rightLeft])
-
     def bind(vol, park=True):
         """
         `bind` will perform magnetic bead binding on each sample in the
@@ -303,8 +217,9 @@ resuming.')
                                plate.
         """
         latest_chan = -1
-        for i, (well, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300)
+        for i, (well, spot) in checkpoint.columns(
+                'bind', enumerate(zip(mag_samples_m, parking_spots))):
+            tips.pick_up(m300)
             num_trans = math.ceil(vol/200)
             vol_per_trans = vol/num_trans
             asp_per_chan = (0.95*res1.wells()[0].max_volume)//(vol_per_trans*8)
@@ -332,13 +247,15 @@ resuming.')
             if park:
                 m300.drop_tip(spot)
             else:
-                _drop(m300)
+                tips.drop(m300)
         ctx.set_rail_lights(False)
-        ctx.pause('mix for 10 minutes off-deck in a heatershaker')
+        pause('mix for 10 minutes off-deck in a heatershaker')
         ctx.set_rail_lights(True)
         magdeck.engage(height=MAG_HEIGHT)
-        ctx.delay(minutes=settling_time, msg='Incubating on MagDeck for \
-' + str(settling_time) + ' minutes.')
+        modules.start_settling(
+            magdeck, minutes=settling_time,
+            msg='Incubating on MagDeck for ' + str(settling_time) +
+            ' minutes.')
 
         # remove initial supernatant
         remove_supernatant(vol+starting_vol, park=park)
@@ -367,8 +284,9 @@ resuming.')
 
         num_trans = math.ceil(vol/200)
         vol_per_trans = vol/num_trans
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300)
+        for i, (m, spot) in checkpoint.columns(
+                'wash', enumerate(zip(mag_samples_m, parking_spots))):
+            tips.pick_up(m300)
             # side = 1 if i % 2 == 0 else -1
             # loc = m.bottom(0.5).move(Point(x=side*2))
             if two_res:
@@ -384,19 +302,21 @@ resuming.')
                     m300.air_gap(20)
             if resuspend:
                 # m300.mix(mix_reps, 150, loc)
-                resuspend_pellet(m, m300, 180)
+                resuspend_pellet(m, m300, 180, center_z=0.5, corner_z=10)
             m300.blow_out(m.top())
             m300.air_gap(20)
             if park:
                 m300.drop_tip(spot)
             else:
-                _drop(m300)
+                tips.drop(m300)
 
         if magdeck.status == 'disengaged':
             magdeck.engage(height=MAG_HEIGHT)
 
-        ctx.delay(minutes=settling_time, msg='Incubating on MagDeck for \
-' + str(settling_time) + ' minutes.')
+        modules.start_settling(
+            magdeck, minutes=settling_time,
+            msg='Incubating on MagDeck for ' + str(settling_time) +
+            ' minutes.')
 
         remove_supernatant(vol, park=park)
 
@@ -405,10 +325,14 @@ resuming.')
         if resuspend and magdeck.status == 'engaged':
             magdeck.disengage()
 
+        # each column incubates for 10 minutes from its reagent addition,
+        # mixed halfway through and at the end
+        incubation = IncubationTimer(ctx, 10, 2, delay=delay)
         num_trans = math.ceil(vol/200)
         vol_per_trans = vol/num_trans
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300)
+        for i, (m, spot) in checkpoint.columns(
+                'dnase', enumerate(zip(mag_samples_m, parking_spots))):
+            tips.pick_up(m300)
             # side = 1 if i % 2 == 0 else -1
             # loc = m.bottom(0.5).move(Point(x=side*2))
             if two_res:
@@ -422,34 +346,34 @@ resuming.')
                               new_tip='never')
                 if n < num_trans - 1:  # only air_gap if going back to source
                     m300.air_gap(20)
+            incubation.start(m)
             if resuspend:
                 # m300.mix(mix_reps, 30, loc)
-                resuspend_pellet(m, m300, 50)
+                resuspend_pellet(m, m300, 50, center_z=0.5, corner_z=10)
             m300.mix(mix_reps, 30)
             m300.blow_out(m.top())
             m300.air_gap(20)
             if park:
                 m300.drop_tip(spot)
             else:
-                _drop(m300)
+                tips.drop(m300)
 
-        #Incubate 10 min, mix 3 times
-        delay_sec = float(300 - (num_samples / 8) * 25)
-        ctx.delay(seconds=delay_sec)
-
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300, spot)
+        for i, (m, spot) in checkpoint.columns(
+                'dnase mix', enumerate(zip(mag_samples_m, parking_spots))):
+            tips.pick_up(m300, spot)
+            incubation.wait(m, 1)
             m300.mix(mix_reps, 0.9*vol, m.bottom(0.5))
             m300.blow_out(m.top(-2))
             m300.drop_tip(spot)
 
-        ctx.delay(seconds = delay_sec)
-
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300, spot)
+        for i, (m, spot) in checkpoint.columns(
+                'dnase final mix',
+                enumerate(zip(mag_samples_m, parking_spots))):
+            tips.pick_up(m300, spot)
+            incubation.wait(m, 2)
             m300.mix(mix_reps, 0.9*vol, m.bottom(0.5))
             m300.blow_out(m.top(-2))
-            _drop(m300)
+            tips.drop(m300)
 
 
     def stop_reaction(vol, source, mix_reps=6, park=True, resuspend=True):
@@ -457,10 +381,14 @@ resuming.')
         if resuspend and magdeck.status == 'engaged':
             magdeck.disengage()
 
+        # each column incubates for 10 minutes from its reagent addition,
+        # mixed halfway through and at the end
+        incubation = IncubationTimer(ctx, 10, 2, delay=delay)
         num_trans = math.ceil(vol/200)
         vol_per_trans = vol/num_trans
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300)
+        for i, (m, spot) in checkpoint.columns(
+                'stop reaction', enumerate(zip(mag_samples_m, parking_spots))):
+            tips.pick_up(m300)
             # side = 1 if i % 2 == 0 else -1
             # loc = m.bottom(0.5).move(Point(x=side*2))
             if two_res:
@@ -474,35 +402,36 @@ resuming.')
                               new_tip='never')
                 if n < num_trans - 1:  # only air_gap if going back to source
                     m300.air_gap(20)
+            incubation.start(m)
             if resuspend:
                 # m300.mix(mix_reps, 50, loc)
-                resuspend_pellet(m, m300, 180)
+                resuspend_pellet(m, m300, 180, center_z=0.5, corner_z=10)
             m300.blow_out(m.top())
             m300.air_gap(20)
             if park:
                 m300.drop_tip(spot)
             else:
-                _drop(m300)
+                tips.drop(m300)
 
-        #Incubate 10 min, mix 3 times
         if 0.9*vol < 200:
             mix_vol = 0.9*vol
         else:
             mix_vol = 100
 
-        delay_sec = float(300 - (num_samples / 8) * 25)
-        ctx.delay(seconds=delay_sec)
-
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300, spot)
+        for i, (m, spot) in checkpoint.columns(
+                'stop reaction mix',
+                enumerate(zip(mag_samples_m, parking_spots))):
+            tips.pick_up(m300, spot)
+            incubation.wait(m, 1)
             m300.mix(mix_reps, mix_vol, m.bottom(0.5))
             m300.blow_out(m.top(-2))
             m300.drop_tip(spot)
 
-        ctx.delay(seconds=delay_sec)
-
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300, spot)
+        for i, (m, spot) in checkpoint.columns(
+                'stop reaction final mix',
+                enumerate(zip(mag_samples_m, parking_spots))):
+            tips.pick_up(m300, spot)
+            incubation.wait(m, 2)
             m300.mix(mix_reps, mix_vol, m.bottom(0.5))
             m300.blow_out(m.top(-2))
             m300.drop_tip(spot)
@@ -510,7 +439,10 @@ resuming.')
         if magdeck.status == 'disengaged':
             magdeck.engage(height=MAG_HEIGHT)
 
-        ctx.delay(minutes=settling_time, msg='Incubating on MagDeck for ' + str(settling_time) + ' minutes.')
+        modules.start_settling(
+            magdeck, minutes=settling_time,
+            msg='Incubating on MagDeck for ' + str(settling_time) +
+            ' minutes.')
 
         remove_supernatant(vol+50, park=park)
 
@@ -530,32 +462,37 @@ resuming.')
         # resuspend beads in elution
         if magdeck.status == 'enagaged':
             magdeck.disengage()
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300)
+        for i, (m, spot) in checkpoint.columns(
+                'elute', enumerate(zip(mag_samples_m, parking_spots))):
+            tips.pick_up(m300)
             side = 1 if i % 2 == 0 else -1
             loc = m.bottom(0.5).move(Point(x=side*2))
             m300.aspirate(vol, elution_solution)
             m300.move_to(m.center())
             m300.dispense(vol, loc)
             # m300.mix(mix_reps, 0.8*vol, loc)
-            resuspend_pellet(m, m300, 50)
+            resuspend_pellet(m, m300, 50, center_z=0.5, corner_z=10)
             m300.blow_out(m.bottom(5))
             m300.air_gap(20)
             if park:
                 m300.drop_tip(spot)
             else:
-                _drop(m300)
+                tips.drop(m300)
 
         magdeck.engage(height=MAG_HEIGHT)
-        ctx.delay(minutes=settling_time, msg='Incubating on MagDeck for \
-' + str(settling_time) + ' minutes.')
-
-        for i, (m, e, spot) in enumerate(
-                zip(mag_samples_m, elution_samples_m, parking_spots)):
+        modules.start_settling(
+            magdeck, minutes=settling_time,
+            msg='Incubating on MagDeck for ' + str(settling_time) +
+            ' minutes.')
+
+        for i, (m, e, spot) in checkpoint.columns(
+                'transfer eluate',
+                enumerate(zip(mag_samples_m, elution_samples_m,
+                              parking_spots))):
             if park:
-                _pick_up(m300, spot)
+                tips.pick_up(m300, spot)
             else:
-                _pick_up(m300)
+                tips.pick_up(m300)
             side = -1 if i % 2 == 0 else 1
             loc = m.bottom(0.5).move(Point(x=side*2))
             m300.transfer(vol, loc, e.bottom(5), air_gap=20, new_tip='never')
@@ -582,17 +519,9 @@ resuming.')
     ctx.comment('\n\n\n')
     stop_reaction(500, stopreaction, park=park_tips)
     ctx.comment('\n\n\n')
-    ctx.delay(minutes=5, msg="dry beads for 10 minute (5 min + tc set temperature)")
+    delay(minutes=5,
+          msg="dry beads for 10 minute (5 min + tc set temperature)")
     tc.set_block_temperature(4) #TODO: PortNotOpenError [line 586]: Attempting to use a port that is not open
     elute(elution_vol, park=park_tips)
-
-    # track final used tip
-    if tip_track and not ctx.is_simulating():
-        if not os.path.isdir(folder_path):
-            os.mkdir(folder_path)
-        data = {pip.name: tip_log[pip]['count'] for pip in tip_log}
-        with open(tip_file_path, 'w') as outfile:
-            json.dump(data, outfile)
-
-
-
+    checkpoint.finish()
+    tracer.close()
@@ -0,0 +1,38 @@
+"""
+Helpers shared by the protocols in this repository.
+
+Protocols import what they need from this package:
+
+    from protocol_helpers import pause_attention, pick_up_or_refill
+
+The OT-2 only accepts a single protocol file, so before uploading, run
+
+    python -m protocol_tools.bundle
+
+which writes each protocol to dist/ with the helpers it uses inlined in
+place of the import. Modules in this package must therefore only import
+the standard library, `opentrons` and each other, and every top-level name
+must be unique across the package.
+"""
+
+from protocol_helpers.batches import (
+    MagRun, SampleMap, SplitLayout, spread_reagent)
+from protocol_helpers.checkpoint import Checkpoint
+from protocol_helpers.common import (
+    create_chunks, pause_attention, protocol_clock)
+from protocol_helpers.geometry import WellTable
+from protocol_helpers.incubation import IncubationTimer
+from protocol_helpers.levels import LiquidLevels
+from protocol_helpers.liquid_classes import LiquidClass, LiquidClasses
+from protocol_helpers.liquid_handling import (
+    aspirate_with_delay, default_flow_rates, dispense_with_delay,
+    etoh_flow_rates, gather, mix_with_delay, pre_wet,
+    restore_default_clearances, resuspend_pellet, set_default_clearances,
+    slow_tip_withdrawal, viscous_flow_rates)
+from protocol_helpers.modules import (
+    ModuleTasks, SettleTask, TemperatureTask)
+from protocol_helpers.motion import plan_column_order, travel_distance
+from protocol_helpers.tips import (
+    TipLedger, TipPlanner, TipTracker, clear_in_front, pick_up_or_refill,
+    set_pick_up_current)
+from protocol_helpers.trace import Tracer
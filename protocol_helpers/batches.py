@@ -0,0 +1,170 @@
+"""
+Laying out samples over the columns of a plate and more than one run on the
+magnet, and reagents over more than one source.
+"""
+
+# columns of a 96 well plate
+PLATE_COLUMNS = 12
+
+# rows of a 96 well plate, i.e. the channels of a multi-channel pipette
+PLATE_ROWS = 8
+
+
+class SampleMap(object):
+    """
+    `SampleMap` places the samples of a run down the columns of a plate from
+    A1, as the operator loads them, so the last sample column may be only
+    partly filled. A multi-channel pipette picks up one tip per sample in a
+    column (see `pick_up_or_refill`): eight for a full column and fewer for
+    a partial one, which then only takes reagent for the samples it holds
+    and needs no blank wells.
+    :param num_samples (int): The number of samples, up to a plate.
+    """
+
+    def __init__(self, num_samples):
+        if not 1 <= num_samples <= PLATE_COLUMNS * PLATE_ROWS:
+            raise Exception('Invalid number of samples (must be '
+                            '1-{}).'.format(PLATE_COLUMNS * PLATE_ROWS))
+        self.num_samples = num_samples
+        self.num_cols = -(-num_samples // PLATE_ROWS)
+
+    @property
+    def partial(self):
+        """
+        `partial` tells whether the last sample column is only partly
+        filled, i.e. whether the run picks up fewer tips than a
+        multi-channel pipette has channels.
+        """
+        return self.num_samples % PLATE_ROWS != 0
+
+    def tips(self, column):
+        """
+        `tips` returns the number of samples in a sample column, i.e. the
+        tips to pick up for it.
+        :param column (int or list): The sample column's index (counting
+                                     from 0), or a column of a plate laid
+                                     out like the samples.
+        """
+        if not isinstance(column, int):
+            column = int(column[0].well_name[1:]) - 1
+        return max(0, min(PLATE_ROWS, self.num_samples - PLATE_ROWS * column))
+
+    def volume(self, volume, num_cols=None):
+        """
+        `volume` returns the volume a reagent source needs to give `volume`
+        uL to each sample of the first `num_cols` sample columns (by default
+        all of them).
+        """
+        if num_cols is None:
+            num_cols = self.num_cols
+        return volume * sum(self.tips(index) for index in range(num_cols))
+
+
+class MagRun(object):
+    """
+    `MagRun` is one run of a bead clean up on the magnetic module, from
+    engaging the magnet to taking off the eluates.
+    :param number (int): The run's number, counting from 1.
+    :param samples (list): An (index, columns) pair for each sample column
+                           in the run: the sample column's index (its
+                           column in the elution plate) and the mag plate
+                           columns holding its halves during the run.
+    """
+
+    def __init__(self, number, samples):
+        self.number = number
+        self.samples = samples
+
+    @property
+    def columns(self):
+        """
+        `columns` lists every mag plate column of the run, the first
+        halves of the samples before the second halves.
+        """
+        parts = len(self.samples[0][1]) if self.samples else 0
+        return [columns[part] for part in range(parts)
+                for _, columns in self.samples]
+
+
+class SplitLayout(object):
+    """
+    `SplitLayout` lays out the sample columns of a bead clean up that splits
+    each sample over two wells. With up to half a plate of sample columns,
+    the second halves go in the right half of the mag plate and the clean up
+    is a single run on the magnet, as before. With more, the second halves
+    go in the same columns of a second plate, the split plate, which is
+    given its beads with the mag plate and incubates off the magnet while
+    the first run cleans up the mag plate; it then takes the mag plate's
+    place for a second run, and the eluates of each sample are combined in
+    the elution plate.
+    :param num_cols (int): The number of sample columns, up to a plate.
+    """
+
+    def __init__(self, num_cols):
+        if not 1 <= num_cols <= PLATE_COLUMNS:
+            raise Exception('Invalid number of sample columns (must be '
+                            '1-{}).'.format(PLATE_COLUMNS))
+        self.num_cols = num_cols
+        self.split_plate = num_cols > PLATE_COLUMNS // 2
+
+    def halves(self, mag_plate, split_plate=None):
+        """
+        `halves` lists a (column, column) pair for each sample column: the
+        mag plate column holding the sample and the column its second half
+        is moved to, in `split_plate` if the layout needs one.
+        """
+        if self.split_plate:
+            if split_plate is None:
+                raise Exception('{} sample columns need a split '
+                                'plate.'.format(self.num_cols))
+            second = split_plate.columns()
+        else:
+            second = mag_plate.columns()[PLATE_COLUMNS // 2:]
+        return list(zip(mag_plate.columns()[:self.num_cols],
+                        second[:self.num_cols]))
+
+    def sample_columns(self, mag_plate, split_plate=None):
+        """
+        `sample_columns` lists every column holding half a sample, on the
+        mag plate and the split plate, the first halves before the second.
+        """
+        halves = self.halves(mag_plate, split_plate)
+        return ([first for first, _ in halves] +
+                [second for _, second in halves])
+
+    def runs(self, mag_plate):
+        """
+        `runs` lists the `MagRun`s of the clean up. Each run's columns are
+        columns of `mag_plate`: in the second run the split plate sits on the
+        magnetic module in its place.
+        """
+        columns = mag_plate.columns()
+        if not self.split_plate:
+            return [MagRun(1, [
+                (index, [columns[index], columns[index + PLATE_COLUMNS // 2]])
+                for index in range(self.num_cols)])]
+        return [MagRun(number, [(index, [columns[index]])
+                                for index in range(self.num_cols)])
+                for number in (1, 2)]
+
+
+def spread_reagent(sources, volume, num_cols, capacity):
+    """
+    `spread_reagent` returns the source each sample column takes a reagent
+    from, for a reagent spread over several sources (e.g. strip tube
+    columns) because one cannot hold enough for every sample column: each
+    source in turn serves as many sample columns as it holds volume for,
+    so small runs only use the first.
+    :param sources (list): The sources the reagent may be in, in the order
+                           they are used.
+    :param volume (float): The volume each sample column takes from its
+                           source (uL per well).
+    :param num_cols (int): The number of sample columns.
+    :param capacity (float): The volume a source can give (uL per well),
+                             i.e. its capacity less its dead volume.
+    """
+    per_source = max(1, int(capacity // volume))
+    if num_cols > per_source * len(sources):
+        raise Exception('{} sources cannot hold {} ul for each of {} sample '
+                        'columns.'.format(len(sources), volume, num_cols))
+    return [sources[index // per_source] for index in range(num_cols)]
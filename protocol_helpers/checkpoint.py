@@ -0,0 +1,156 @@
+"""
+Checkpoints for restarting a long protocol part way through.
+"""
+
+import json
+import os
+
+
+class Checkpoint(object):
+    """
+    `Checkpoint` records which sample columns each step of a run has
+    finished, so that after a fault the run can be restarted at the first
+    unfinished column instead of from the top. Steps are the column loops
+    of the protocol, wrapped in `columns` (or `step` for work done once),
+    and are told apart by the order they run in. When resuming, steps that
+    finished are skipped, as are the pauses and delays before the step the
+    run stopped in (see `live`); labware and module commands still run.
+    The checkpoint is rewritten atomically after every column, together
+    with the tip ledger and any values registered with `watch`, and deleted
+    by `finish` at the end of the run.
+    :param ctx (ProtocolContext): The protocol context.
+    :param path (str): The checkpoint file.
+    :param resume (boolean): Whether to carry on from the checkpoint in
+                             `path`; otherwise the run starts from the top.
+                             Checkpoints are not used when simulating.
+    :param ledger (TipLedger): The ledger tips are picked up from, restored
+                               from the checkpoint when resuming.
+    """
+
+    def __init__(self, ctx, path, resume=False, ledger=None):
+        self.path = path
+        self.enabled = not ctx.is_simulating()
+        self.ledger = ledger
+        self.state = {}
+        self._watch = None
+        self._stages = []
+        self._saved = []
+        self._resume_at = 0
+        if not (self.enabled and resume and os.path.isfile(path)):
+            return
+        with open(path) as checkpoint_file:
+            saved = json.load(checkpoint_file)
+        self.state = saved['state']
+        self._saved = saved['stages']
+        while (self._resume_at < len(self._saved) and
+               self._saved[self._resume_at]['complete']):
+            self._resume_at += 1
+        if ledger is not None:
+            ledger.restore(saved['tips'])
+
+    @property
+    def resuming(self):
+        """
+        `resuming` is True when the run carries on from a checkpoint.
+        """
+        return bool(self._saved)
+
+    @property
+    def replaying(self):
+        """
+        `replaying` is True until the run reaches the step it stopped in.
+        """
+        return len(self._stages) < self._resume_at
+
+    def live(self, func):
+        """
+        `live` returns `func` wrapped to do nothing while `replaying`, for
+        operator pauses and delays belonging to finished steps.
+        """
+        def live_call(*args, **kwargs):
+            if not self.replaying:
+                return func(*args, **kwargs)
+        return live_call
+
+    def watch(self, func):
+        """
+        `watch` registers `func`, returning a dictionary of values to save
+        with each checkpoint (e.g. trash and liquid waste counts). The
+        values saved last are in `state` when resuming.
+        """
+        self._watch = func
+
+    def columns(self, name, columns):
+        """
+        `columns` starts a new step named `name` and yields the items of
+        `columns` it still has to process, recording each one as finished
+        once the loop body for it has run.
+        :param name (str): The step's name, checked against the checkpoint
+                           when resuming.
+        :param columns (iterable): The columns (or column indices) the step
+                                   processes, in order.
+        """
+        index = len(self._stages)
+        stage = {'name': name, 'done': [], 'complete': False}
+        if index < len(self._saved):
+            saved = self._saved[index]
+            if saved['name'] != name:
+                raise Exception(
+                    'The checkpoint in {} does not match this protocol '
+                    '(step {} is {}, not {}).'.format(
+                        self.path, index + 1, saved['name'], name))
+            if index <= self._resume_at:
+                stage = saved
+        self._stages.append(stage)
+        columns = list(columns)
+        keys = [self._key(column) for column in columns]
+        for key, column in zip(keys, columns):
+            if stage['complete'] or key in stage['done']:
+                continue
+            yield column
+            stage['done'].append(key)
+            self._save()
+        stage['complete'] = True
+        self._save()
+
+    def step(self, name):
+        """
+        `step` starts a new step named `name` that is done once; loop over
+        it (`for _ in checkpoint.step(name):`) to run the step's body only
+        if it has not finished.
+        """
+        return self.columns(name, [name])
+
+    def finish(self):
+        """
+        `finish` removes the checkpoint once the run is complete.
+        """
+        if self.enabled and os.path.isfile(self.path):
+            os.remove(self.path)
+
+    def _key(self, column):
+        if isinstance(column, (str, int)):
+            return column
+        if isinstance(column, tuple):
+            # e.g. (index, (well, spot)) from enumerate
+            return self._key(column[0])
+        well = column[0] if isinstance(column, list) else column
+        return well.well_name
+
+    def _save(self):
+        if not self.enabled:
+            return
+        saved = {
+            'stages': self._stages,
+            'state': self._watch() if self._watch else {},
+            'tips': self.ledger.snapshot() if self.ledger else {}
+        }
+        folder_path = os.path.dirname(self.path)
+        if folder_path and not os.path.isdir(folder_path):
+            os.makedirs(folder_path)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as temp_file:
+            json.dump(saved, temp_file)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, self.path)
@@ -0,0 +1,36 @@
+"""
+General-purpose helpers shared by the protocols.
+"""
+
+import time
+
+
+def create_chunks(list_name, n):
+    """
+    `create_chunks` yields successive slices of `list_name` of length `n`.
+    """
+    for i in range(0, len(list_name), n):
+        yield list_name[i:i+n]
+
+
+def pause_attention(ctx, message):
+    """
+    `pause_attention` turns the rail lights off to draw the operator's
+    attention and pauses the protocol until it is resumed.
+    :param message (str): The message shown in the Opentrons App.
+    """
+    ctx.set_rail_lights(False)
+    ctx.delay(seconds=10)
+    ctx.pause(message)
+    ctx.set_rail_lights(True)
+
+
+def protocol_clock(ctx):
+    """
+    `protocol_clock` returns a function giving the time in seconds: the
+    wall clock on the robot, or the simulated clock of an offline context
+    (see protocol_tools.offline).
+    """
+    if hasattr(ctx, 'clock'):
+        return lambda: ctx.clock
+    return time.monotonic
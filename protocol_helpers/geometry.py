@@ -0,0 +1,123 @@
+"""
+Precomputed well positions for labware the protocols keep returning to.
+"""
+
+from opentrons import types
+
+# the corners `resuspend_pellet` dispenses over, in mm from the well center
+RESUSPEND_CORNER = 3.8
+
+
+class WellTable(object):
+    """
+    `WellTable` works out once, for every column of `labware`, the positions
+    the protocols otherwise rebuild in every loop: which side of the well
+    the bead pellet forms on, the aspirate location beside the pellet and
+    the dispense location over it, and the corners `resuspend_pellet`
+    dispenses over. Lookups by column or well take constant time, in place
+    of `labware.columns().index(column)` or parsing the well's name.
+    On the magnetic module the pellet forms on the right of wells in odd
+    numbered columns and on the left in even numbered ones.
+    :param labware (Labware): The plate, e.g. on the magnetic module.
+    :param clearance (float): Height above the well bottom of the locations
+                              beside and over the pellet.
+    :param x_offset (float): How far those locations are moved sideways
+                             from the center of the well.
+    """
+
+    def __init__(self, labware, clearance=1, x_offset=0):
+        self.labware = labware
+        self.clearance = clearance
+        self.x_offset = x_offset
+        self.columns = labware.columns()
+        self._index = {}
+        for index, column in enumerate(self.columns):
+            for well in column:
+                self._index[well] = index
+        # -1 moves away from the pellet, for odd column numbers
+        self._sides = [-1 if index % 2 == 0 else 1
+                       for index in range(len(self.columns))]
+        self._offsets = {}
+        self._corners = {}
+
+    @classmethod
+    def for_labware(cls, labware):
+        """
+        `for_labware` returns a table for `labware` with the default
+        clearance and offset, made on first use and kept on the labware, so
+        it lasts as long as the labware and no longer.
+        """
+        table = getattr(labware, '_well_table', None)
+        if table is None:
+            table = labware._well_table = cls(labware)
+        return table
+
+    def index(self, column):
+        """
+        `index` returns the position of `column` (or of the column holding
+        a well) in `labware.columns()`.
+        """
+        if isinstance(column, list):
+            column = column[0]
+        return self._index[column]
+
+    def side(self, column):
+        """
+        `side` returns -1 for columns with the pellet on the right and 1
+        for those with the pellet on the left, the direction to move in x
+        to avoid the pellet.
+        """
+        return self._sides[self.index(column)]
+
+    def _offset_row(self, z, direction):
+        key = (z, direction)
+        row = self._offsets.get(key)
+        if row is None:
+            row = self._offsets[key] = [
+                column[0].bottom(z).move(types.Point(
+                 x=direction*side*self.x_offset, y=0, z=0))
+                for column, side in zip(self.columns, self._sides)]
+        return row
+
+    def beside_pellet(self, column, z=None):
+        """
+        `beside_pellet` returns the location `clearance` (or `z`) above the
+        bottom of the column's first well, `x_offset` away from the pellet,
+        for removing liquid without disturbing the beads.
+        """
+        if z is None:
+            z = self.clearance
+        return self._offset_row(z, 1)[self.index(column)]
+
+    def over_pellet(self, column, z=None):
+        """
+        `over_pellet` returns the location `clearance` (or `z`) above the
+        bottom of the column's first well, `x_offset` towards the pellet,
+        for dispensing liquid over the beads.
+        """
+        if z is None:
+            z = self.clearance
+        return self._offset_row(z, -1)[self.index(column)]
+
+    def resuspend_points(self, well, center_z, corner_z):
+        """
+        `resuspend_points` returns the location `center_z` above the bottom
+        of `well` and the back and front corners `corner_z` above it on the
+        pellet's side, see `resuspend_pellet`.
+        """
+        key = (center_z, corner_z)
+        points = self._corners.get(key)
+        if points is None:
+            points = self._corners[key] = {}
+            for other in self.labware.wells():
+                bottom = other.bottom()
+                side = -self._sides[self._index[other]]
+                points[other] = (
+                    bottom.move(types.Point(x=0, y=0, z=center_z)),
+                    bottom.move(types.Point(
+                     x=side*RESUSPEND_CORNER, y=RESUSPEND_CORNER,
+                     z=corner_z)),
+                    bottom.move(types.Point(
+                     x=side*RESUSPEND_CORNER, y=-RESUSPEND_CORNER,
+                     z=corner_z)))
+        return points[well]
@@ -0,0 +1,58 @@
+"""
+Timing incubations that are interrupted by mixing passes over the columns.
+"""
+
+from protocol_helpers.common import protocol_clock
+
+
+class IncubationTimer(object):
+    """
+    `IncubationTimer` times an incubation that starts separately in each
+    column, when its reagent is added, and is mixed in passes over the
+    columns at even intervals after that, the last pass at the end of the
+    incubation. Each pass waits for a column only as long as the column
+    still needs, measured on the clock, so every column incubates for the
+    same time however many columns there are and however long a pass takes.
+    Columns added before a resumed run restarted have no start time and are
+    mixed without waiting.
+    :param ctx (ProtocolContext): The protocol context.
+    :param minutes (float): How long each column incubates.
+    :param passes (int): The number of mixing passes.
+    :param delay (function): Called in place of `ctx.delay` to wait, e.g. a
+                             delay that is skipped when resuming (see
+                             `Checkpoint.live`).
+    """
+
+    def __init__(self, ctx, minutes, passes, delay=None):
+        self.interval = minutes * 60.0 / passes
+        self.passes = passes
+        self._clock = protocol_clock(ctx)
+        self._delay = delay or ctx.delay
+        self._started = {}
+
+    def start(self, column):
+        """
+        `start` starts the incubation of `column` (any key for it, e.g. its
+        first well), just after its reagent was added.
+        """
+        self._started[column] = self._clock()
+
+    def remaining(self, column, mixing_pass):
+        """
+        `remaining` returns the seconds until `column` is due for mixing
+        pass `mixing_pass` (counting from 1), 0 if it is already due.
+        """
+        started = self._started.get(column)
+        if started is None:
+            return 0
+        due = started + mixing_pass * self.interval
+        return max(0, due - self._clock())
+
+    def wait(self, column, mixing_pass):
+        """
+        `wait` waits until `column` is due for mixing pass `mixing_pass`
+        (counting from 1).
+        """
+        remaining = self.remaining(column, mixing_pass)
+        if remaining > 0:
+            self._delay(seconds=remaining)
@@ -0,0 +1,112 @@
+"""
+Keeping track of the liquid in reagent wells, to aspirate near the surface.
+"""
+
+# liquid loaded into each well above the lowest height it is aspirated at,
+# so the tip never draws air (see protocol_tools.fill_sheet), in mm
+DEAD_VOLUME_SUBMERSION = 1.0
+
+
+class LiquidLevels(object):
+    """
+    `LiquidLevels` keeps track of the volume of liquid in reagent wells and
+    returns aspirate locations that follow the liquid surface down, a fixed
+    depth below it, instead of the bottom of the well. The tip travels less
+    in z and carries less liquid out on its outside. The height of the
+    liquid is worked out from the well's capacity and depth, as if the well
+    had straight sides; wells that narrow towards the bottom hold less
+    there, so the real surface is never lower than the one worked out and
+    the tip is if anything deeper than `submersion`. Each well is taken to
+    hold its dead volume on top of what the run draws from it, as the fill
+    sheet of the protocol lists it (see `dead_volume`), so the tip stays in
+    the liquid as it reaches `clearance` at the last aspiration.
+    A multi-channel pipette draws from every tip at once, so its channels
+    all draw from a well that spans a row of the labware (e.g. a column of
+    a 12 well reservoir).
+    :param submersion (float): How far below the liquid surface to
+                               aspirate, in mm.
+    :param clearance (float): The lowest aspirate height above the bottom of
+                              the well, used once the liquid is too shallow
+                              to submerge the tip by `submersion`.
+    :param track (boolean): Whether to follow the liquid surface at all;
+                            otherwise every aspiration is `clearance` above
+                            the bottom, e.g. in a resumed run, which cannot
+                            know how much the interrupted run took out.
+    """
+
+    def __init__(self, submersion=2, clearance=1, track=True):
+        self.submersion = submersion
+        self.clearance = clearance
+        self.track = track
+        self._volumes = {}
+        self._shared = {}
+
+    def fill(self, well, volume):
+        """
+        `fill` adds `volume` uL to the liquid in `well`, e.g. the volume a
+        step will draw from it, to seed the model with the reagents the
+        operator loads. The first fill of a well also adds its dead volume.
+        """
+        if well not in self._volumes:
+            self._volumes[well] = self.dead_volume(well)
+        self._volumes[well] += volume
+
+    def dead_volume(self, well):
+        """
+        `dead_volume` returns the volume (uL) left in `well` at the end of
+        the run: the liquid up to `DEAD_VOLUME_SUBMERSION` above
+        `clearance`, as if the well had straight sides.
+        """
+        depth = well.top().point.z - well.bottom().point.z
+        height = min(self.clearance + DEAD_VOLUME_SUBMERSION, depth)
+        return well.max_volume * height / depth
+
+    def volume(self, well):
+        """
+        `volume` returns the volume (uL) left in `well`.
+        """
+        return self._volumes.get(well, 0)
+
+    def height(self, well, volume=None):
+        """
+        `height` returns the height (mm) of the liquid above the bottom of
+        `well`, holding `volume` uL (by default the volume left in it).
+        """
+        if volume is None:
+            volume = self.volume(well)
+        depth = well.top().point.z - well.bottom().point.z
+        return max(0, volume) * depth / well.max_volume
+
+    def location(self, well, volume=None):
+        """
+        `location` returns the location `submersion` below the surface of
+        the liquid in `well` (see `height`), no lower than `clearance`, for
+        mixing or pre-wetting a tip without drawing any liquid.
+        """
+        if not self.track:
+            return well.bottom(self.clearance)
+        depth = well.top().point.z - well.bottom().point.z
+        z = min(self.height(well, volume) - self.submersion, depth)
+        return well.bottom(max(self.clearance, z))
+
+    def _channels_in(self, pipette, well):
+        labware = well.parent
+        shared = self._shared.get(labware)
+        if shared is None:
+            shared = self._shared[labware] = len(labware.columns()[0]) == 1
+        return getattr(pipette, 'channels', 1) if shared else 1
+
+    def draw(self, pipette, volume, well, num_tips=None):
+        """
+        `draw` takes `volume` uL per channel of `pipette` out of `well` and
+        returns where to aspirate it: `submersion` below the surface the
+        liquid will have afterwards, so the tip stays in the liquid to the
+        end of the aspiration.
+        :param num_tips (int): The tips on a multi-channel pipette, if it
+                               picked up fewer than its channels.
+        """
+        channels = self._channels_in(pipette, well)
+        if num_tips and channels > 1:
+            channels = min(channels, num_tips)
+        self._volumes[well] = self.volume(well) - volume * channels
+        return self.location(well)
@@ -0,0 +1,190 @@
+"""
+Liquid classes: how each kind of liquid the protocols handle is pipetted.
+"""
+
+from protocol_helpers.liquid_handling import slow_tip_withdrawal
+
+
+class LiquidClass(object):
+    """
+    `LiquidClass` is how one kind of liquid is pipetted: the flow rates of
+    each size of pipette, how long to wait for the liquid to catch up after
+    aspirating and dispensing, how fast to withdraw the tip from it and how
+    to blow it out. Flow rates are given for 'p20' and 'p300' pipettes,
+    as a single rate (uL/s) or an (aspirate, dispense, blow out) tuple; a
+    pipette of a size the class leaves out keeps its flow rates.
+    :param name (str): The class's name in `LIQUID_CLASSES`.
+    :param delay (float): Seconds to wait after aspirating and dispensing.
+    :param withdrawal_speed (float): Speed (mm/s) the tip is withdrawn from
+                                     the liquid at, or None for full speed.
+    :param blow_outs (int): Blow outs after dispensing; each after the first
+                            draws `blow_out_air` uL of air back first.
+    :param blow_out_delay (float): Seconds to wait before each blow out.
+    :param blow_out_air (float): See `blow_outs`.
+    """
+
+    def __init__(self, name, p20=None, p300=None, delay=0,
+                 withdrawal_speed=None, blow_outs=1, blow_out_delay=0,
+                 blow_out_air=100):
+        self.name = name
+        self.p20 = p20
+        self.p300 = p300
+        self.delay = delay
+        self.withdrawal_speed = withdrawal_speed
+        self.blow_outs = blow_outs
+        self.blow_out_delay = blow_out_delay
+        self.blow_out_air = blow_out_air
+
+    def but(self, **changes):
+        """
+        `but` returns a copy of the class with some of its settings changed,
+        e.g. `LIQUID_CLASSES['beads'].but(p300=50)`.
+        """
+        settings = dict(self.__dict__)
+        settings.update(changes)
+        return LiquidClass(**settings)
+
+    def flow_rates(self, pipette):
+        """
+        `flow_rates` returns the (aspirate, dispense, blow out) flow rates of
+        `pipette` for this class, or None if it keeps its own.
+        """
+        rates = getattr(self, pipette.name.split('_')[0], None)
+        if rates is None or isinstance(rates, tuple):
+            return rates
+        return (rates, rates, rates)
+
+
+# rates each liquid has been run at in these protocols: beads and master
+# mixes at the NEBNext flow_rate_beads and delay_beads defaults, ethanol at
+# the NEBNext etoh_flow_rates (the Zymo washes tune it to their own
+# rates), aqueous reagents at the rates of the Zymo DNase, stop and elution
+# steps, and TRIzol lysate at the rates of the Zymo binding
+LIQUID_CLASSES = {
+    'aqueous': LiquidClass('aqueous', p20=7.56, p300=(150, 150, 300)),
+    'beads': LiquidClass('beads', p300=60, delay=1, withdrawal_speed=10),
+    'ethanol': LiquidClass('ethanol', p300=(92.86, 92.86, 300), blow_outs=3,
+                           blow_out_delay=1),
+    'lysate': LiquidClass('lysate', p300=(50, 150, 300)),
+    'master mix': LiquidClass('master mix', p300=60, delay=1,
+                              withdrawal_speed=10)
+}
+
+
+class LiquidScope(object):
+    """
+    `LiquidScope` pipettes with one pipette in one liquid class, returned
+    by `LiquidClasses.use`. Used as a context manager, it sets the
+    pipette's flow rates for the class on entering and puts back the ones
+    it had on leaving, so they never carry over into the next step. Its
+    `aspirate`, `dispense`, `mix`, `withdraw` and `blow_out` add the class's
+    delays, withdrawal speed and blow outs to the pipette's own.
+    """
+
+    def __init__(self, classes, pipette, liquid):
+        self.pipette = pipette
+        self.liquid = liquid
+        self._classes = classes
+        self._ctx = classes._ctx
+        self._saved = None
+
+    def __enter__(self):
+        flow_rate = self.pipette.flow_rate
+        self._saved = (flow_rate.aspirate, flow_rate.dispense,
+                       flow_rate.blow_out)
+        rates = self.liquid.flow_rates(self.pipette)
+        if rates is not None:
+            (flow_rate.aspirate, flow_rate.dispense,
+             flow_rate.blow_out) = rates
+        self._classes.in_use.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        flow_rate = self.pipette.flow_rate
+        (flow_rate.aspirate, flow_rate.dispense,
+         flow_rate.blow_out) = self._saved
+        self._classes.in_use.remove(self)
+
+    def _wait(self, seconds):
+        if seconds > 0:
+            self._ctx.delay(seconds=seconds)
+
+    def aspirate(self, volume, location, rate=1.0):
+        self.pipette.aspirate(volume, location, rate=rate)
+        self._wait(self.liquid.delay)
+
+    def dispense(self, volume, location, rate=1.0):
+        self.pipette.dispense(volume, location, rate=rate)
+        self._wait(self.liquid.delay)
+
+    def mix(self, repetitions, volume, location):
+        """
+        `mix` aspirates and dispenses `volume` at `location` `repetitions`
+        times, waiting the class's delay after each.
+        """
+        for repetition in range(repetitions):
+            self.aspirate(volume, location)
+            self.dispense(volume, location)
+
+    def withdraw(self, well, to_center=False):
+        """
+        `withdraw` takes the tip out of the liquid in `well` to its top (or
+        its center) at the class's withdrawal speed.
+        """
+        if self.liquid.withdrawal_speed is None:
+            self.pipette.move_to(well.center() if to_center else well.top())
+        else:
+            slow_tip_withdrawal(self._ctx, self.pipette, well, to_center,
+                                speed=self.liquid.withdrawal_speed)
+
+    def blow_out(self, location, air=None):
+        """
+        `blow_out` blows out at `location` as many times as the class does,
+        drawing back `air` uL (by default the class's `blow_out_air`)
+        between blow outs.
+        """
+        if air is None:
+            air = self.liquid.blow_out_air
+        for rep in range(self.liquid.blow_outs):
+            if rep > 0:
+                self.pipette.aspirate(air, location)
+            self._wait(self.liquid.blow_out_delay)
+            self.pipette.blow_out(location)
+
+
+class LiquidClasses(object):
+    """
+    `LiquidClasses` is the liquid classes a protocol pipettes with:
+    `LIQUID_CLASSES`, with any the protocol tunes (e.g. to its parameters)
+    changed or added. The scopes it pipettes in at the moment are kept in
+    `in_use`, innermost last.
+    :param classes (dict): Maps class names to the `LiquidClass` that
+                           replaces or adds to the class of that name.
+    """
+
+    def __init__(self, ctx, classes=None):
+        self._ctx = ctx
+        self.classes = dict(LIQUID_CLASSES)
+        self.classes.update(classes or {})
+        self.in_use = []
+
+    def __getitem__(self, name):
+        return self.classes[name]
+
+    def tune(self, name, **changes):
+        """
+        `tune` changes some of the settings of the class called `name` for
+        the rest of the protocol (see `LiquidClass.but`).
+        """
+        self.classes[name] = self.classes[name].but(**changes)
+
+    def use(self, pipette, name, **changes):
+        """
+        `use` returns a `LiquidScope` pipetting with `pipette` in the class
+        called `name`, with some of its settings changed for this use only
+        (see `LiquidClass.but`).
+        """
+        liquid = self.classes[name]
+        if changes:
+            liquid = liquid.but(**changes)
+        return LiquidScope(self, pipette, liquid)
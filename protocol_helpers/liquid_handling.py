@@ -0,0 +1,171 @@
+"""
+Liquid handling helpers shared by the protocols.
+"""
+
+from protocol_helpers.geometry import WellTable
+
+
+def aspirate_with_delay(ctx, current_pipette, volume, source, delay_seconds):
+    current_pipette.aspirate(volume, source)
+    if delay_seconds > 0:
+        ctx.delay(seconds=delay_seconds)
+
+
+def dispense_with_delay(ctx, current_pipette, volume, dest, delay_seconds):
+    current_pipette.dispense(volume, dest)
+    if delay_seconds > 0:
+        ctx.delay(seconds=delay_seconds)
+
+
+def mix_with_delay(ctx, current_pipette, volume, location, delay_seconds):
+    current_pipette.aspirate(volume, location)
+    if delay_seconds > 0:
+        ctx.delay(seconds=delay_seconds)
+    current_pipette.dispense(volume, location)
+    if delay_seconds > 0:
+        ctx.delay(seconds=delay_seconds)
+
+
+def slow_tip_withdrawal(ctx, current_pipette, well_location, to_center=False,
+                        speed=10):
+    if current_pipette.mount == 'right':
+        axis = 'A'
+    else:
+        axis = 'Z'
+    ctx.max_speeds[axis] = speed
+    if to_center is False:
+        current_pipette.move_to(well_location.top())
+    else:
+        current_pipette.move_to(well_location.center())
+    ctx.max_speeds[axis] = None
+
+
+def pre_wet(current_pipette, volume, location):
+    for rep in range(2):
+        current_pipette.aspirate(volume, location)
+        current_pipette.dispense(volume, location)
+
+
+def gather(pip, volume, sources, dest, clearance=1, air_gap=0, rate=1.0,
+           approach=None):
+    """
+    `gather` takes `volume` from each of several wells into the tip the
+    pipette holds and dispenses it all into `dest`, e.g. the eluates of the
+    halves of a split sample. Before moving on to the next well, the tip
+    draws an air gap 1 mm above the top of the last one, so what it holds
+    never touches the next well's liquid. The volumes come out of the tip
+    last first: each is dispensed near the bottom of `dest` and the air gap
+    behind it is expelled at its top, above the liquid, so no air is
+    pushed through the eluate.
+    :param volume (float): The volume to take from each well.
+    :param sources (list): A (well, location) pair for each well, the well
+                           and where in it to aspirate (e.g. beside the
+                           pellet).
+    :param dest (Well): The well to dispense into.
+    :param clearance (float): The height above the bottom of `dest` to
+                              dispense at.
+    :param air_gap (float): The air gap between the volumes.
+    :param rate (float): The aspirate rate, as for `aspirate`.
+    :param approach (float): If given, the tip goes down to this height
+                             above the bottom in the middle of each well
+                             before moving to its location, to keep off a
+                             pellet at the side.
+    """
+    total = volume * len(sources) + air_gap * (len(sources) - 1)
+    if total > pip.max_volume:
+        raise Exception('{} ul from {} wells with {} ul air gaps will not fit '
+                        'in a {} ul tip.'.format(volume, len(sources),
+                                                 air_gap, pip.max_volume))
+    for index, (well, location) in enumerate(sources):
+        if index > 0 and air_gap:
+            pip.air_gap(air_gap, height=1)
+        if approach is not None:
+            pip.move_to(well.bottom(approach))
+        pip.aspirate(volume, location, rate=rate)
+    if not air_gap:
+        pip.dispense(total, dest.bottom(clearance))
+        return
+    for index in range(len(sources)):
+        if index > 0:
+            pip.dispense(air_gap, dest.top())
+        pip.dispense(volume, dest.bottom(clearance))
+
+
+def set_default_clearances(
+ current_pipette, aspirate_setting, dispense_setting):
+    if 0 < aspirate_setting < 5 and 0 < dispense_setting < 5:
+        current_pipette.well_bottom_clearance.aspirate = aspirate_setting
+        current_pipette.well_bottom_clearance.dispense = dispense_setting
+
+
+def restore_default_clearances(current_pipette):
+    current_pipette.well_bottom_clearance.aspirate = 1
+    current_pipette.well_bottom_clearance.dispense = 1
+
+
+def viscous_flow_rates(current_pipette, flow_rate_beads):
+    current_pipette.flow_rate.aspirate = flow_rate_beads
+    current_pipette.flow_rate.dispense = flow_rate_beads
+    current_pipette.flow_rate.blow_out = flow_rate_beads
+
+
+def etoh_flow_rates(current_pipette):
+    if (current_pipette.name == 'p300_multi_gen2' or
+       current_pipette.name == 'p300_single_gen2'):
+        current_pipette.flow_rate.aspirate = 92.86
+        current_pipette.flow_rate.dispense = 92.86
+        current_pipette.flow_rate.blow_out = 300
+
+
+def default_flow_rates(current_pipette):
+    if (current_pipette.name == 'p300_multi_gen2' or
+       current_pipette.name == 'p300_single_gen2'):
+        current_pipette.flow_rate.aspirate = 92.86
+        current_pipette.flow_rate.dispense = 92.86
+        current_pipette.flow_rate.blow_out = 92.86
+    elif (current_pipette.name == 'p20_multi_gen2' or
+          current_pipette.name == 'p20_single_gen2'):
+        current_pipette.flow_rate.aspirate = 7.56
+        current_pipette.flow_rate.dispense = 7.56
+        current_pipette.flow_rate.blow_out = 7.56
+
+
+def resuspend_pellet(well, pip, mvol, reps=5, center_z=0.1, corner_z=0.1):
+    """
+    'resuspend_pellet' will forcefully dispense liquid over the
+    pellet after the magdeck engage in order to more thoroughly resuspend
+    the pellet.param well: The current well that the resuspension will
+    occur in. param pip: The pipet that is currently attached/ being used.
+    param mvol: The volume that is transferred before the mixing steps.
+    param reps: The number of mix repetitions that should occur. Note~
+    During each mix rep, there are 2 cycles of aspirating from center,
+    dispensing at the top and 2 cycles of aspirating from center,
+    dispensing at the bottom (5 mixes total)
+    param center_z: Height above the well bottom that mix volume is
+    aspirated from.
+    param corner_z: Height above the well bottom of the corners the mix
+    volume is dispensed over. The corners are on the side of the well
+    the pellet forms on: the right for odd numbered columns and the left
+    for even numbered ones (see `WellTable`).
+    """
+
+    # the center and corner positions are looked up, not rebuilt every call
+    center, top, bottom = WellTable.for_labware(
+        well.parent).resuspend_points(well, center_z, corner_z)
+
+    # the forceful flow rates only last for the resuspension
+    saved = (pip.flow_rate.aspirate, pip.flow_rate.dispense)
+    pip.flow_rate.dispense = 500
+    pip.flow_rate.aspirate = 150
+
+    mix_vol = 0.9 * mvol
+
+    pip.move_to(center)
+    for _ in range(reps):
+        for _ in range(2):
+            pip.aspirate(mix_vol, center)
+            pip.dispense(mix_vol, top)
+        for _ in range(2):
+            pip.aspirate(mix_vol, center)
+            pip.dispense(mix_vol, bottom)
+    pip.flow_rate.aspirate, pip.flow_rate.dispense = saved
@@ -0,0 +1,213 @@
+"""
+Module commands that run while the protocol carries on pipetting.
+"""
+
+from protocol_helpers.common import protocol_clock
+
+# pipette commands that take the locations they touch as arguments
+GUARDED_COMMANDS = frozenset([
+    'aspirate', 'dispense', 'mix', 'blow_out', 'touch_tip', 'move_to',
+    'transfer', 'distribute', 'consolidate'
+])
+
+
+def _labware_in(locations):
+    """
+    `_labware_in` yields the labware of every well or location in
+    `locations`, which may be nested lists (e.g. the columns passed to
+    `transfer`).
+    """
+    for location in locations:
+        if isinstance(location, (list, tuple)):
+            for labware in _labware_in(location):
+                yield labware
+            continue
+        target = getattr(location, 'labware', location)
+        # Location.labware wraps the well or labware it refers to
+        target = getattr(target, 'object', target)
+        if hasattr(target, 'well_name'):
+            target = target.parent
+        # volumes, repetitions and the like are not locations
+        if hasattr(target, 'wells'):
+            yield target
+
+
+class TemperatureTask(object):
+    """
+    `TemperatureTask` is a temperature module ramping to `celsius` in the
+    background, started by `ModuleTasks.start_set_temperature`.
+    """
+
+    def __init__(self, module, celsius):
+        self.module = module
+        self.celsius = celsius
+        self.reason = 'reached {} °C'.format(celsius)
+        self.done = False
+
+    def wait(self):
+        """
+        `wait` waits until the module has reached its target temperature
+        (returning at once if it already has).
+        """
+        if not self.done:
+            self.module.await_temperature(self.celsius)
+            self.done = True
+
+
+class SettleTask(object):
+    """
+    `SettleTask` is the time the beads on an engaged magnetic module take to
+    settle, started by `ModuleTasks.start_settling`. It is a deadline rather
+    than a delay: `wait` only waits for whatever is left of it.
+    """
+
+    def __init__(self, module, seconds, clock, delay, msg=None):
+        self.module = module
+        self.reason = 'has settled the beads'
+        self.done = False
+        self._clock = clock
+        self._delay = delay
+        self._msg = msg
+        self.deadline = clock() + seconds
+
+    def wait(self):
+        """
+        `wait` waits until the settling time is over (returning at once if
+        it already is).
+        """
+        if self.done:
+            return
+        remaining = self.deadline - self._clock()
+        if remaining > 0:
+            self._delay(seconds=remaining, msg=self._msg)
+        self.done = True
+
+
+class _Guarded(object):
+    """
+    `_Guarded` stands in for a pipette, passing every attribute through to
+    it and checking the locations of its commands with `ModuleTasks`.
+    """
+
+    def __init__(self, tasks, pipette):
+        object.__setattr__(self, '_tasks', tasks)
+        object.__setattr__(self, '_pipette', pipette)
+
+    def __getattr__(self, attr):
+        value = getattr(self._pipette, attr)
+        if attr not in GUARDED_COMMANDS or not callable(value):
+            return value
+        tasks = self._tasks
+
+        def guarded(*args, **kwargs):
+            tasks.check(list(args) + list(kwargs.values()))
+            return value(*args, **kwargs)
+        return guarded
+
+    def __setattr__(self, attr, value):
+        setattr(self._pipette, attr, value)
+
+    def __repr__(self):
+        return repr(self._pipette)
+
+    def __str__(self):
+        return str(self._pipette)
+
+
+class ModuleTasks(object):
+    """
+    `ModuleTasks` starts temperature module ramps and magnetic bead settling
+    without waiting for them to finish, so the protocol can carry on
+    pipetting elsewhere on the deck in the meantime, and keeps pipettes off
+    the labware on a module until it is ready. Pipettes wrapped with
+    `guard` wait for the module before their first command that touches
+    its labware (e.g. the first supernatant aspiration after engaging the
+    magnet); with `strict`, they raise an exception instead, to find the
+    commands that would have waited when simulating.
+    Thermocycler commands have no non-blocking form before API 2.27 and
+    still wait for each ramp.
+    :param ctx (ProtocolContext): The protocol context.
+    :param strict (boolean): Whether touching labware on a module that is
+                             not ready is an error.
+    :param delay (function): Called in place of `ctx.delay` to wait for the
+                             rest of a settling time, e.g. a delay that is
+                             skipped when resuming (see `Checkpoint.live`).
+    """
+
+    def __init__(self, ctx, strict=False, delay=None):
+        self.strict = strict
+        self._delay = delay or ctx.delay
+        self._clock = protocol_clock(ctx)
+        self._pending = []
+        self._queued = []
+
+    def start_set_temperature(self, module, celsius):
+        """
+        `start_set_temperature` sets a temperature module's target and
+        returns a `TemperatureTask` to `wait` on, without waiting for the
+        module to get there.
+        """
+        module.start_set_temperature(celsius)
+        return self._start(TemperatureTask(module, celsius))
+
+    def start_settling(self, module, minutes=0, seconds=0, msg=None):
+        """
+        `start_settling` starts the time the beads take to settle on an
+        engaged magnetic module and returns a `SettleTask` to `wait` on,
+        then runs the work queued with `queue` while they settle.
+        """
+        task = self._start(SettleTask(
+            module, minutes * 60 + seconds, self._clock, self._delay, msg))
+        queued, self._queued = self._queued, []
+        for func, args, kwargs in queued:
+            func(*args, **kwargs)
+        return task
+
+    def queue(self, func, *args, **kwargs):
+        """
+        `queue` puts off calling `func(*args, **kwargs)` until the next
+        `start_settling`, to fill the settling time with work that does
+        not need the magnetic module's labware (work that does waits for
+        the beads, see `guard`).
+        """
+        self._queued.append((func, args, kwargs))
+
+    def _start(self, task):
+        self._pending = [pending for pending in self._pending
+                         if pending.module is not task.module] + [task]
+        return task
+
+    def guard(self, pipette):
+        """
+        `guard` returns `pipette` with its commands checked against the
+        ramps and settling times in progress (see `check`).
+        """
+        return _Guarded(self, pipette)
+
+    def check(self, locations):
+        """
+        `check` waits for (or with `strict`, raises an exception for) any
+        ramp or settling time in progress on a module holding the labware
+        of `locations`.
+        """
+        if not any(not task.done for task in self._pending):
+            return
+        for labware in _labware_in(locations):
+            for task in self._pending:
+                if task.done or getattr(
+                        task.module, 'labware', None) is not labware:
+                    continue
+                if self.strict:
+                    raise Exception(
+                        '{} was used before {} {}; wait for the module '
+                        'first.'.format(labware, task.module, task.reason))
+                task.wait()
+        self._pending = [task for task in self._pending if not task.done]
+
+    def wait_all(self):
+        """
+        `wait_all` waits for every ramp and settling time in progress.
+        """
+        for task in self._pending:
+            task.wait()
+        self._pending = []
@@ -0,0 +1,113 @@
+"""
+Planning the order sample columns are visited in.
+"""
+
+import math
+
+
+def _xy(location):
+    point = getattr(location, 'point', None)
+    if point is None:
+        point = location.top().point
+    return point.x, point.y
+
+
+def _distance(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def travel_distance(stops, order, tips=None, start=None):
+    """
+    `travel_distance` returns the XY distance (mm) the gantry covers when
+    the columns are processed in `order`. See `plan_column_order` for the
+    parameters.
+    """
+    total = 0.0
+    position = _xy(start) if start is not None else None
+    for k, column in enumerate(order):
+        path = list(stops[column])
+        if tips:
+            path.insert(0, tips[k])
+        for stop in path:
+            point = _xy(stop)
+            if position is not None:
+                total += _distance(position, point)
+            position = point
+    return total
+
+
+def plan_column_order(stops, tips=None, start=None):
+    """
+    `plan_column_order` returns the order (a list of indices into `stops`)
+    in which to process the sample columns so the gantry travels the
+    shortest XY distance. The current left-to-right order is kept unless
+    another order is strictly shorter. Each column keeps its own stops, so
+    pairings such as a column's parking spot are unaffected.
+    :param stops (List[List[Well|Location]]): For each column, the places
+                                              the pipette visits while
+                                              processing it, in order (e.g.
+                                              source, sample, parking spot).
+    :param tips (List[Well]): The tips that will be picked up, in pick-up
+                              order, when each column takes a new tip; the
+                              k-th column processed gets the k-th tip.
+    :param start (Well|Location): Where the pipette is before the first
+                                  column, if known.
+    """
+    n = len(stops)
+    tips = [_xy(tip) for tip in tips or []][:n]
+    firsts = [_xy(path[0]) for path in stops]
+    lasts = [_xy(path[-1]) for path in stops]
+    origin = _xy(start) if start is not None else None
+
+    # only the legs between columns depend on the order, so the cost of
+    # an order is the sum of those legs
+    if tips:
+        def leg(k, previous, column):
+            end = lasts[previous] if previous is not None else origin
+            to_tip = _distance(end, tips[k]) if end is not None else 0.0
+            return to_tip + _distance(tips[k], firsts[column])
+    else:
+        def leg(k, previous, column):
+            end = lasts[previous] if previous is not None else origin
+            return _distance(end, firsts[column]) if end is not None else 0.0
+
+    def cost(order):
+        return sum(leg(k, order[k - 1] if k else None, column)
+                   for k, column in enumerate(order))
+
+    def improve(order):
+        # reverse or move segments of the order until nothing helps
+        distance = cost(order)
+        improved = True
+        while improved:
+            improved = False
+            for i in range(n - 1):
+                for j in range(i + 1, n):
+                    for candidate in (
+                            order[:i] + order[i:j + 1][::-1] + order[j + 1:],
+                            order[:i] + order[i + 1:j + 1] + [order[i]] +
+                            order[j + 1:]):
+                        d = cost(candidate)
+                        if d < distance - 1e-6:
+                            order, distance, improved = candidate, d, True
+        return order, distance
+
+    def nearest_neighbour(first):
+        order = [first]
+        while len(order) < n:
+            order.append(min(
+                (c for c in range(n) if c not in order),
+                key=lambda c: leg(len(order), order[-1], c)))
+        return order
+
+    current = list(range(n))
+    best, best_distance = current, cost(current)
+    candidates = [current]
+    if n > 1:
+        candidates.append(min(
+            (nearest_neighbour(first) for first in range(n)), key=cost))
+    for candidate in candidates:
+        order, distance = improve(candidate)
+        if distance < best_distance - 1e-6:
+            best, best_distance = order, distance
+    return best
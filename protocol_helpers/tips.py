@@ -0,0 +1,707 @@
+"""
+Tip handling shared by the protocols.
+"""
+
+import json
+import os
+
+from opentrons.types import Point
+from opentrons.protocol_api.labware import OutOfTipsError
+
+from protocol_helpers.common import pause_attention
+
+TIP_LEDGER_PATH = '/data/B/tip_ledger.jsonl'
+
+# rewrite the ledger without superseded entries once it grows past this
+TIP_LEDGER_COMPACT_LINES = 2000
+
+# x offsets (mm) from the centre of the fixed trash that `TipTracker.drop`
+# alternates between, so tips do not pile up in one spot
+TRASH_DROP_OFFSETS = (30, -18)
+
+# how far (mm) below the top of a tip rack the labware in the slot in front
+# of it must stay for a partial pick-up there, whose front channels hang
+# past the rack at the height they press onto the tips
+PARTIAL_PICK_UP_CLEARANCE = 10
+
+# the current (A) a multi-channel pipette presses onto each tip with when
+# it picks up fewer tips than it has channels; the full column current on
+# a few tips presses them on too hard
+PICK_UP_CURRENT_PER_TIP = 0.1
+
+
+def _rack_slot(rack):
+    parent = getattr(rack, 'parent', None)
+    return str(parent if isinstance(parent, (str, int)) else rack.slot)
+
+
+def clear_in_front(ctx, rack):
+    """
+    `clear_in_front` tells whether the slot in front of tip rack `rack` is
+    empty, or holds labware short enough for the channels a partial pick-up
+    leaves hanging past the front of the rack to pass over it (see
+    `PARTIAL_PICK_UP_CLEARANCE`). Nothing is in front of the front row of
+    slots.
+    """
+    front = int(_rack_slot(rack)) - 3
+    if front < 1:
+        return True
+    labware = ctx.loaded_labwares.get(front)
+    if labware is None:
+        return front not in ctx.loaded_modules
+    return (labware.highest_z <=
+            rack.highest_z - PARTIAL_PICK_UP_CLEARANCE)
+
+
+def _hardware_pipette(ctx, pipette):
+    # the robot's hardware controller's settings for `pipette`
+    try:
+        instruments = ctx._hw_manager.hardware._attached_instruments
+        return instruments[pipette._implementation.get_mount()]
+    except (AttributeError, KeyError):
+        raise Exception(
+            'Cannot set the tip pick-up current of {} with this version of '
+            'the robot software, and picking up fewer tips than it has '
+            'channels at the full current can jam them. Fill whole '
+            'columns of samples.'.format(pipette))
+
+
+def set_pick_up_current(ctx, pipette, current):
+    """
+    `set_pick_up_current` sets the current (A) `pipette` presses onto its
+    tips with and returns the one it had. The protocol API has no setting
+    for it, so it goes through the robot's hardware controller; robot
+    software where that cannot be reached raises an exception.
+    """
+    instrument = _hardware_pipette(ctx, pipette)
+    previous = instrument.config.pick_up_current
+    instrument.update_config_item('pick_up_current', current)
+    return previous
+
+
+def _pick_up_at(ctx, pipette, tip, num_tips=None):
+    # fewer tips than channels are pressed on with less current
+    if not num_tips or num_tips >= pipette.channels:
+        pipette.pick_up_tip(tip)
+        return
+    previous = set_pick_up_current(
+        ctx, pipette, PICK_UP_CURRENT_PER_TIP * num_tips)
+    try:
+        pipette.pick_up_tip(tip)
+    finally:
+        set_pick_up_current(ctx, pipette, previous)
+
+
+def _tip_wells(well_name, num_tips):
+    """
+    `_tip_wells` names the wells a pipette with `num_tips` channels takes
+    tips from when picking up at `well_name` (e.g. A1 -> A1 ... H1).
+    """
+    row, column = well_name[0], well_name[1:]
+    return [chr(ord(row) + i) + column for i in range(num_tips)]
+
+
+class TipLedger(object):
+    """
+    `TipLedger` records every tip picked up, by tip rack slot and well, so a
+    run can carry on from the exact next unused tip after a crash or in the
+    next run. Each pick-up is appended to `path` as one JSON line and
+    flushed to disk immediately; a partly written last line (e.g. from a
+    power cut) is ignored when the ledger is read back. Refilling the tip
+    racks is recorded as a reset of their slots. Delete `path` to start
+    over with full tip racks.
+    :param ctx (ProtocolContext): The protocol context.
+    :param path (str): The ledger file.
+    :param persistent (boolean): Whether to read and append to `path`
+                                 (ignored when simulating, where the
+                                 ledger is only kept in memory).
+    :param partial_pick_ups (boolean): Whether a multi-channel pipette picks
+                                       up fewer tips than it has channels
+                                       in this run; its full columns then
+                                       come first from the racks a partial
+                                       pick-up cannot use (see
+                                       `clear_in_front`), instead of in the
+                                       order of its tip racks. Raises an
+                                       exception at once if the pick-up
+                                       current of a loaded multi-channel
+                                       pipette cannot be set (see
+                                       `set_pick_up_current`).
+    """
+
+    def __init__(self, ctx, path=TIP_LEDGER_PATH, persistent=True,
+                 partial_pick_ups=False):
+        self._ctx = ctx
+        self.path = path
+        self.partial_pick_ups = partial_pick_ups
+        if partial_pick_ups:
+            # fail before the run starts rather than at its first partial
+            # column
+            for pipette in ctx.loaded_instruments.values():
+                if pipette.channels > 1:
+                    _hardware_pipette(ctx, pipette)
+        self.persistent = persistent and not ctx.is_simulating()
+        self.used = {}
+        self.refills = {}
+        self.full_columns = []
+        self._file = None
+        if not self.persistent:
+            return
+        lines = []
+        if os.path.isfile(path):
+            with open(path) as ledger_file:
+                lines = ledger_file.read().split('\n')
+            for line in lines[:-1]:
+                try:
+                    self._replay(json.loads(line))
+                except ValueError:
+                    continue
+        folder_path = os.path.dirname(path)
+        if folder_path and not os.path.isdir(folder_path):
+            os.makedirs(folder_path)
+        if len(lines) > TIP_LEDGER_COMPACT_LINES or lines[-1:] not in (
+                [], ['']):
+            # also drops an unfinished last line, which would otherwise
+            # run into the next entry
+            self._compact()
+        self._file = open(path, 'a')
+
+    def _replay(self, entry):
+        slot = entry['slot']
+        if 'reset' in entry:
+            self.used.pop(slot, None)
+            self.refills[slot] = self.refills.get(slot, 0) + 1
+        else:
+            self.used.setdefault(slot, set()).update(
+                _tip_wells(entry['well'], entry.get('tips', 1)))
+
+    def _append(self, entry):
+        self._replay(entry)
+        if self._file is None:
+            return
+        self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _compact(self):
+        # write the current state to a new file and swap it in, so the
+        # ledger on disk is complete at every moment
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as temp_file:
+            for slot in sorted(self.used):
+                for well in sorted(self.used[slot]):
+                    temp_file.write(json.dumps(
+                        {'slot': slot, 'well': well},
+                        separators=(',', ':')) + '\n')
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, self.path)
+
+    def _candidates(self, pip):
+        # full columns come from racks a partial pick-up cannot use first
+        racks = pip.tip_racks
+        if self.partial_pick_ups and pip.channels > 1:
+            racks = sorted(racks, key=lambda rack: clear_in_front(
+                self._ctx, rack))
+        for rack in racks:
+            tips = rack.rows()[0] if pip.channels > 1 else rack.wells()
+            for tip in tips:
+                yield tip
+
+    def _is_free(self, pip, tip):
+        # tips taken outside the ledger (e.g. by `transfer`) are skipped too
+        if not getattr(tip, 'has_tip', True):
+            return False
+        used = self.used.get(_rack_slot(tip.parent), ())
+        return not any(well in used for well in _tip_wells(
+            tip.well_name, pip.channels))
+
+    def _partial_tip(self, pip, num_tips):
+        # a multi-channel pipette picks up fewer tips than it has channels
+        # with its back channels over the last tips left in a rack column
+        # and its other channels over emptied wells or past the front of
+        # the rack, which only racks clear in front allow (see
+        # `clear_in_front`); columns already started are used before full
+        # ones, and full ones from the back of the racks
+        started, full = [], []
+        for rack in pip.tip_racks:
+            used = self.used.get(_rack_slot(rack), ())
+            overhang = clear_in_front(self._ctx, rack)
+            for column in rack.columns():
+                free = [index for index, tip in enumerate(column)
+                        if tip.well_name not in used and
+                        getattr(tip, 'has_tip', True)]
+                if len(free) < num_tips:
+                    continue
+                first = free[-1] - num_tips + 1
+                if free[-num_tips] != first:
+                    continue
+                if first + pip.channels > len(column) and not overhang:
+                    continue
+                if len(free) == len(column):
+                    full.append(column[first])
+                else:
+                    started.append(column[first])
+        tips = started + full[::-1]
+        return tips[0] if tips else None
+
+    def next_tip(self, pip, num_tips=None):
+        """
+        `next_tip` returns the next unused tip in `pip`'s tip racks and the
+        number of tips to pick up there, or (None, 0) when they are empty.
+        :param num_tips (int): The number of tips a multi-channel pipette is
+                               to pick up, if fewer than its channels. With
+                               no rack clear in front left to pick them up
+                               from, it picks up a full column instead,
+                               and (pip, num_tips) is appended to
+                               `full_columns`.
+        """
+        if num_tips and num_tips < pip.channels:
+            tip = self._partial_tip(pip, num_tips)
+            if tip is not None:
+                return tip, num_tips
+            self.full_columns.append((pip, num_tips))
+        for tip in self._candidates(pip):
+            if self._is_free(pip, tip):
+                return tip, pip.channels
+        return None, 0
+
+    def upcoming(self, pip, num_tips):
+        """
+        `upcoming` returns the next `num_tips` tips `pip` will pick up,
+        allowing for its tip racks being refilled.
+        """
+        tips = [tip for tip in self._candidates(pip)
+                if self._is_free(pip, tip)]
+        full = list(self._candidates(pip))
+        while len(tips) < num_tips:
+            tips.extend(full)
+        return tips[:num_tips]
+
+    def record(self, pip, tip, num_tips=None):
+        """
+        `record` appends a pick-up of `tip` by `pip` to the ledger.
+        :param num_tips (int): The number of tips picked up, if fewer than
+                               `pip`'s channels.
+        """
+        entry = {'slot': _rack_slot(tip.parent), 'well': tip.well_name}
+        num_tips = min(num_tips or pip.channels, pip.channels)
+        if num_tips > 1:
+            entry['tips'] = num_tips
+        self._append(entry)
+
+    def reset(self, racks):
+        """
+        `reset` records that `racks` were refilled with tips.
+        """
+        for rack in racks:
+            self._append({'slot': _rack_slot(rack), 'reset': True})
+
+    def snapshot(self):
+        """
+        `snapshot` returns the used tips as {slot: [well, ...]}.
+        """
+        return {slot: sorted(wells) for slot, wells in self.used.items()}
+
+    def restore(self, snapshot):
+        """
+        `restore` records the tips in `snapshot` (see `snapshot`) as used,
+        in addition to those already in the ledger.
+        """
+        for slot, wells in sorted(snapshot.items()):
+            for well in wells:
+                if well not in self.used.get(slot, ()):
+                    self._append({'slot': slot, 'well': well})
+
+
+def pick_up_or_refill(ctx, current_pipette, ledger=None, num_tips=None):
+    """
+    `pick_up_or_refill` picks up the next tip, pausing for the operator to
+    refill the tip racks and empty the tip waste when none are left.
+    :param ledger (TipLedger): If given, the next tip is taken from the
+                               ledger and the pick-up recorded in it, and
+                               the tip is returned.
+    :param num_tips (int): With a ledger, the number of tips a
+                           multi-channel pipette picks up, if fewer than its
+                           channels (e.g. for a partial column of samples,
+                           see `SampleMap`); they go on its back channels,
+                           pressed on with `PICK_UP_CURRENT_PER_TIP` each.
+    """
+    if ledger is None:
+        try:
+            current_pipette.pick_up_tip()
+        except OutOfTipsError:
+            pause_attention(
+             ctx, """Please Refill the {} Tip Boxes
+             and Empty the Tip Waste""".format(current_pipette))
+            current_pipette.reset_tipracks()
+            current_pipette.pick_up_tip()
+        return
+    tip, count = ledger.next_tip(current_pipette, num_tips)
+    if tip is None:
+        pause_attention(
+         ctx, """Please Refill the {} Tip Boxes
+         and Empty the Tip Waste""".format(current_pipette))
+        current_pipette.reset_tipracks()
+        ledger.reset(current_pipette.tip_racks)
+        tip, count = ledger.next_tip(current_pipette, num_tips)
+    _pick_up_at(ctx, current_pipette, tip, count)
+    ledger.record(current_pipette, tip, count)
+    return tip
+
+
+def _well_key(location):
+    """
+    `_well_key` returns the well a well, location or column (its first well,
+    for a multi-channel pipette) refers to.
+    """
+    if isinstance(location, (list, tuple)):
+        location = location[0]
+    target = getattr(location, 'labware', location)
+    # Location.labware wraps the well it refers to
+    return getattr(target, 'object', target)
+
+
+class TipPlanner(object):
+    """
+    `TipPlanner` picks up tips like `pick_up_or_refill`, but first looks
+    among the tips it parked back in their racks for one that can be used
+    again without carrying anything into the wells it goes into that is not
+    there already. It keeps track of the liquids in each well and on each
+    tip: a tip picks up the liquids of every well it goes into and leaves
+    them in the wells it goes into after. Each well holds a liquid of its
+    own (e.g. a sample) unless `fill` says otherwise, so the tip that added
+    beads to a sample column can take the supernatant off that column, but
+    a tip that has touched a sample never goes back into a reagent or on to
+    another sample. Tips are parked back in their racks, or at a spot of
+    their own (e.g. a sample column's place in a parking rack), and parked
+    tips are forgotten once their rack is refilled. A tip meant for a spot
+    never goes back in a rack: it goes to the trash when the spot is taken.
+    :param ctx (ProtocolContext): The protocol context.
+    :param ledger (TipLedger): The ledger new tips are taken from.
+    :param reuse (boolean): Whether to reuse parked tips at all; otherwise
+                            every pick-up takes a new tip, e.g. in a resumed
+                            run, which cannot know what was parked.
+    :param tracker (TipTracker): If given, new tips are picked up and tips
+                                 dropped through `tracker`, which counts the
+                                 tips in the trash.
+    """
+
+    def __init__(self, ctx, ledger, reuse=True, tracker=None):
+        self._ctx = ctx
+        self.ledger = ledger
+        self.reuse = reuse
+        self.tracker = tracker
+        self.reused = 0
+        self.moves = []
+        self._contents = {}
+        self._tokens = {}
+        self._emptied = 0
+        self._held = {}
+        self._parked = []
+
+    def _liquids(self, well):
+        return self._contents.setdefault(well, {well})
+
+    def _refills(self, tip):
+        return self.ledger.refills.get(_rack_slot(tip.parent), 0)
+
+    def fill(self, wells, liquid):
+        """
+        `fill` records that each of `wells` holds only `liquid` (any name,
+        e.g. 'ethanol'), such as a reagent spread over several wells, so a
+        tip that touched one can go into the others.
+        """
+        for well in wells:
+            self._contents[_well_key(well)] = {liquid}
+
+    def add(self, wells, liquid):
+        """
+        `add` records that `liquid` was added to each of `wells` without
+        the tip touching what was in them, e.g. from the top of the well.
+        """
+        for well in wells:
+            self._liquids(_well_key(well)).add(liquid)
+
+    def add_from(self, source, wells):
+        """
+        `add_from` records that liquid from `source` was added to each of
+        `wells` without the tip touching what was in them, so a tip that
+        only went into `source` can go into them after.
+        """
+        liquids = self._liquids(_well_key(source))
+        for well in wells:
+            self._liquids(_well_key(well)).update(liquids)
+
+    def emptied(self, wells, residue=None):
+        """
+        `emptied` records that each of `wells` was cleared of everything
+        added to it (e.g. the supernatant taken off a bead pellet, or a
+        pellet washed and dried before elution), so no tip that went into
+        it before goes into it again.
+        :param residue (Well): The source of the reagent the wells were
+                               cleared of (e.g. a wash buffer). The tips
+                               parked from the wells then stay theirs, but
+                               only while nothing else is added to them
+                               than more of that reagent, e.g. for the next
+                               wash with the same buffer.
+        """
+        self._emptied += 1
+        liquids = None
+        if residue is not None:
+            liquids = self._liquids(_well_key(residue))
+        for well in wells:
+            key = _well_key(well)
+            token = self._tokens.get(key, key)
+            emptied = self._tokens[key] = (key, self._emptied)
+            self._contents[key] = {emptied}
+            if liquids is None:
+                continue
+            for index, parked in enumerate(self._parked):
+                if token in parked[1]:
+                    self._parked[index] = (
+                        (parked[0], {emptied} | liquids) + parked[2:])
+
+    def moved(self, labware, onto):
+        """
+        `moved` records that the operator put the plate loaded as `labware`
+        in the place of `onto` (e.g. on the magnetic module), so the wells of
+        `onto` now hold what those of `labware` did. (labware, onto) is
+        appended to `moves`.
+        """
+        for well, onto_well in zip(labware.wells(), onto.wells()):
+            self._contents[onto_well] = set(self._liquids(well))
+            self._tokens[onto_well] = self._tokens.get(well, well)
+        self.moves.append((labware, onto))
+
+    def _touch(self, liquids, wells):
+        # the tip takes up what is in each well and leaves what it carries
+        for well in wells:
+            contents = self._liquids(well)
+            contents |= liquids
+            liquids = set(contents)
+        return liquids
+
+    def _find(self, pipette, wells, num_tips, spot, cleaner=None):
+        # the parked tip to use in `wells`, the one parked at `spot` first;
+        # with `cleaner`, only one that carries more than those liquids
+        self._parked = [parked for parked in self._parked
+                        if parked[2] == self._refills(parked[0])]
+        if not (self.reuse and wells):
+            return None
+        contents = self._liquids(wells[0])
+        spot = _well_key(spot) if spot is not None else None
+        found = [index for index, (parked, on_tip, _, count, owner)
+                 in enumerate(self._parked)
+                 if owner is pipette and count == num_tips and
+                 on_tip <= contents and
+                 (cleaner is None or not on_tip <= cleaner)]
+        for index in found:
+            if self._parked[index][0] == spot:
+                return index
+        return found[0] if found else None
+
+    def pick_up(self, pipette, wells, num_tips=None, spot=None):
+        """
+        `pick_up` picks up a tip for `pipette` to go into `wells` (wells or
+        columns, in the order the tip goes into their liquid, leaving out
+        wells it only dispenses into from above): a parked tip with nothing
+        on it that is not in the first of `wells` already, or a new one.
+        :param num_tips (int): See `pick_up_or_refill`; parked tips are only
+                               used again by pick-ups of as many tips.
+        :param spot (Well): Where the tip for `wells` is parked (see
+                            `park`); a tip there is used before others,
+                            and one that cannot be used is dropped in the
+                            trash before a new tip is picked up.
+        :returns: Whether the tip was used before.
+        """
+        wells = [_well_key(well) for well in wells]
+        index = self._find(pipette, wells, num_tips, spot)
+        if index is None:
+            self._clear(pipette, spot)
+            fallbacks = len(self.ledger.full_columns)
+            if self.tracker is not None:
+                tip = self.tracker.pick_up(pipette, num_tips=num_tips)
+            else:
+                tip = pick_up_or_refill(
+                    self._ctx, pipette, self.ledger, num_tips)
+            if len(self.ledger.full_columns) > fallbacks:
+                # a full column is picked up again at the full current
+                num_tips = None
+            self._held[pipette] = (tip, self._touch(set(), wells),
+                                   num_tips)
+        else:
+            self._pick_up_parked(pipette, self._parked.pop(index), wells)
+        return index is not None
+
+    def _at(self, spot):
+        # the index of the tip parked at `spot`, if any
+        if spot is None:
+            return None
+        spot = _well_key(spot)
+        for index, parked in enumerate(self._parked):
+            if parked[0] == spot:
+                return index
+        return None
+
+    def _clear(self, pipette, spot):
+        # a tip parked at `spot` that cannot go into the wells a new tip is
+        # taken for is of no more use: it goes to the trash, so the new tip
+        # can be parked there
+        index = self._at(spot)
+        if index is None or self._parked[index][4] is not pipette:
+            return
+        tip, _, _, num_tips = self._parked.pop(index)[:4]
+        _pick_up_at(self._ctx, pipette, tip, num_tips)
+        self.drop(pipette)
+
+    def _pick_up_parked(self, pipette, parked, wells):
+        tip, liquids, _, num_tips = parked[:4]
+        _pick_up_at(self._ctx, pipette, tip, num_tips)
+        self.reused += 1
+        self._held[pipette] = (tip, self._touch(liquids, wells), num_tips)
+
+    def swap(self, pipette, wells, spot=None, keep=False):
+        """
+        `swap` readies `pipette` to go into `wells` after the wells it
+        picked up its tip for: if a parked tip that has been in something
+        the held tip has not can go into them (e.g. the tip a column was
+        given its last reagent with), the held tip is parked, so it stays
+        as clean as it is (e.g. a tip that only went into a reagent), and
+        that tip is picked up; otherwise the held tip carries on.
+        :param spot (Well): See `pick_up`.
+        :param keep (boolean): Whether the held tip carries on regardless,
+                               e.g. when nothing else will use it.
+        :returns: Whether the tips were swapped.
+        """
+        tip, liquids, num_tips = self._held[pipette]
+        wells = [_well_key(well) for well in wells]
+        index = None if keep else self._find(
+            pipette, wells, num_tips, spot, liquids)
+        if index is None:
+            self._held[pipette] = (tip, self._touch(liquids, wells),
+                                   num_tips)
+            return False
+        parked = self._parked.pop(index)
+        self.park(pipette)
+        self._pick_up_parked(pipette, parked, wells)
+        return True
+
+    def park(self, pipette, spot=None):
+        """
+        `park` puts `pipette`'s tip down for `pick_up` to use again: at
+        `spot` if given, otherwise back in its place (in the rack, or the
+        spot it was picked up from). A tip parked at a spot already taken
+        by another tip for the same wells, or any tip when parked tips are
+        not reused, is dropped in the trash instead.
+        """
+        if not self.reuse or self._at(spot) is not None:
+            self.drop(pipette)
+            return
+        tip, liquids, num_tips = self._held.pop(pipette)
+        if spot is not None:
+            tip = _well_key(spot)
+            pipette.drop_tip(tip)
+        else:
+            pipette.return_tip()
+        self._parked.append(
+            (tip, liquids, self._refills(tip), num_tips, pipette))
+
+    def drop(self, pipette):
+        """
+        `drop` drops `pipette`'s tip in the trash, for a tip that is not to
+        be used again.
+        """
+        self._held.pop(pipette, None)
+        if self.tracker is not None:
+            self.tracker.drop(pipette)
+        else:
+            pipette.drop_tip()
+
+
+class TipTracker(object):
+    """
+    `TipTracker` picks up tips for each loaded pipette, recording them in a
+    `TipLedger`, and counts the tips dropped in the trash. It asks the
+    operator to replace tip racks when they run out and to empty the trash
+    when it reaches `drop_threshold` tips.
+    :param ctx (ProtocolContext): The protocol context, with every pipette
+                                  already loaded.
+    :param drop_threshold (int): The number of tips the trash will
+                                 accommodate before prompting the operator
+                                 to empty it.
+    :param tip_track (boolean): Whether to carry tip usage over between
+                                runs in the ledger file at `ledger_path`
+                                (ignored when simulating).
+    :param ledger_path (str): The tip ledger file.
+    :param rail_lights (boolean): Whether to turn the rail lights off while
+                                  waiting for the operator.
+    :param partial_pick_ups (boolean): See `TipLedger`.
+    """
+
+    def __init__(self, ctx, drop_threshold=120, tip_track=False,
+                 ledger_path=TIP_LEDGER_PATH, rail_lights=False,
+                 partial_pick_ups=False):
+        self._ctx = ctx
+        self.drop_threshold = drop_threshold
+        self.ledger = TipLedger(ctx, ledger_path, persistent=tip_track,
+                                partial_pick_ups=partial_pick_ups)
+        self.rail_lights = rail_lights
+        self.switch = True
+        self.drop_count = 0
+
+    def _pause(self, msg):
+        if self.rail_lights:
+            self._ctx.set_rail_lights(False)
+        self._ctx.pause(msg)
+        if self.rail_lights:
+            self._ctx.set_rail_lights(True)
+
+    def pick_up(self, pip, loc=None, num_tips=None):
+        """
+        `pick_up` picks up the next tip for `pip`, or the tip at `loc`
+        (e.g. a parked tip) when given.
+        :param num_tips (int): The number of tips a multi-channel pipette
+                               picks up, if fewer than its channels (see
+                               `pick_up_or_refill`).
+        """
+        if loc:
+            _pick_up_at(self._ctx, pip, loc, num_tips)
+            return loc
+        tip, count = self.ledger.next_tip(pip, num_tips)
+        if tip is None:
+            self._pause('Replace ' + str(pip.max_volume) + 'µl tipracks '
+                        'before resuming.')
+            pip.reset_tipracks()
+            self.ledger.reset(pip.tip_racks)
+            tip, count = self.ledger.next_tip(pip, num_tips)
+        _pick_up_at(self._ctx, pip, tip, count)
+        self.ledger.record(pip, tip, count)
+        return tip
+
+    def next_tips(self, pip, num_tips):
+        """
+        `next_tips` returns the tips the next `num_tips` calls to `pick_up`
+        will use for `pip`, allowing for the tip racks being replaced.
+        """
+        return self.ledger.upcoming(pip, num_tips)
+
+    def drop(self, pip):
+        """
+        `drop` drops the tip in the trash, alternating between the left and
+        right of the trash so tips do not pile up in one spot.
+        """
+        side = TRASH_DROP_OFFSETS[0 if self.switch else 1]
+        drop_loc = self._ctx.loaded_labwares[12].wells()[0].top().move(
+            Point(x=side))
+        pip.drop_tip(drop_loc)
+        self.switch = not self.switch
+        if pip.type == 'multi':
+            self.drop_count += 8
+        else:
+            self.drop_count += 1
+        if self.drop_count >= self.drop_threshold:
+            # Setup for flashing lights notification to empty trash
+            pip.home()
+            self._pause('Please empty tips from waste before resuming.')
+            self._ctx.home()  # home before continuing with protocol
+            self.drop_count = 0
@@ -0,0 +1,137 @@
+"""
+Tracing the commands a protocol sends to the robot.
+"""
+
+import json
+import os
+import sys
+
+from protocol_helpers.common import protocol_clock
+
+# commands of the protocol context, pipettes and modules that are traced
+TRACED_COMMANDS = frozenset([
+    'aspirate', 'dispense', 'mix', 'air_gap', 'blow_out', 'touch_tip',
+    'move_to', 'pick_up_tip', 'drop_tip', 'return_tip', 'transfer',
+    'distribute', 'consolidate', 'home', 'delay', 'pause', 'engage',
+    'disengage', 'set_temperature', 'start_set_temperature',
+    'await_temperature', 'set_block_temperature',
+    'set_lid_temperature', 'execute_profile', 'open_lid', 'close_lid',
+    'deactivate', 'deactivate_block', 'deactivate_lid'
+])
+
+# functions that only pass a call on (see Checkpoint.live and
+# ModuleTasks.guard); commands are attributed to their caller instead
+PASS_THROUGH = frozenset(['live_call', 'guarded'])
+
+
+class _Traced(object):
+    """
+    `_Traced` stands in for a protocol context, pipette or module, passing
+    every attribute through to it and timing its traced commands.
+    """
+
+    def __init__(self, tracer, target, name):
+        object.__setattr__(self, '_tracer', tracer)
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        if attr in TRACED_COMMANDS and callable(value):
+            return self._tracer._command(self._name, attr, value)
+        if attr in ('load_instrument', 'load_module'):
+            return self._tracer._loader(value)
+        return value
+
+    def __setattr__(self, attr, value):
+        setattr(self._target, attr, value)
+
+    def __repr__(self):
+        return repr(self._target)
+
+    def __str__(self):
+        return str(self._target)
+
+
+class Tracer(object):
+    """
+    `Tracer` records a timestamped event for every command sent through the
+    objects it wraps (see `wrap`), as one JSON line per command:
+
+        {"t": 812.4, "d": 3.1, "on": "m300", "cmd": "aspirate",
+         "helper": "resuspend_pellet", "step": "wash"}
+
+    `t` is the start of the command in seconds since the tracer was made
+    and `d` its duration. `helper` is the function the command was called
+    from and `step` the function called from `run` that it belongs to
+    (both 'run' for commands written inline in `run`). The events can be
+    summarized with `python -m protocol_tools.trace`. Offline contexts
+    (see protocol_tools.offline) keep a simulated clock, which is used in
+    place of the wall clock.
+    :param ctx (ProtocolContext): The protocol context; make the tracer in
+                                  `run` itself.
+    :param path (str): The trace file; tracing is off if empty.
+    """
+
+    def __init__(self, ctx, path):
+        self.path = path
+        self._run_code = sys._getframe(1).f_code
+        self._clock = protocol_clock(ctx)
+        self._start = self._clock()
+        self._file = None
+        if path:
+            folder_path = os.path.dirname(path)
+            if folder_path and not os.path.isdir(folder_path):
+                os.makedirs(folder_path)
+            self._file = open(path, 'w')
+
+    def wrap(self, target, name):
+        """
+        `wrap` returns `target` (the protocol context, a pipette or a
+        module) with its commands traced under `name`, or `target` itself
+        when tracing is off. Pipettes and modules loaded through a wrapped
+        context are traced under their load names.
+        """
+        if self._file is None:
+            return target
+        return _Traced(self, target, name)
+
+    def _caller(self, frame):
+        while frame.f_code.co_name in PASS_THROUGH:
+            frame = frame.f_back
+        helper = frame.f_code.co_name
+        step = helper
+        while frame is not None and frame.f_code is not self._run_code:
+            step = frame.f_code.co_name
+            frame = frame.f_back
+        return helper, step if frame is not None else helper
+
+    def _loader(self, load):
+        # pipettes and modules loaded through a traced context are traced
+        # under the name they were loaded by
+        def load_traced(name, *args, **kwargs):
+            return _Traced(self, load(name, *args, **kwargs), name)
+        return load_traced
+
+    def _command(self, name, command, method):
+        def traced(*args, **kwargs):
+            helper, step = self._caller(sys._getframe(1))
+            start = self._clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._file.write(json.dumps({
+                    't': round(start - self._start, 3),
+                    'd': round(self._clock() - start, 3),
+                    'on': name, 'cmd': command,
+                    'helper': helper, 'step': step
+                }, separators=(',', ':')) + '\n')
+                self._file.flush()
+        return traced
+
+    def close(self):
+        """
+        `close` closes the trace file.
+        """
+        if self._file is not None:
+            self._file.close()
@@ -0,0 +1,10 @@
+"""
+Offline tooling for the protocols in this repository.
+
+Nothing in this package is uploaded to the robot. It runs a protocol's
+`run(ctx)` against a stand-in ProtocolContext (see `offline`) so that run
+time, tip usage and other properties of a protocol can be inspected on a
+workstation. The `opentrons` package must be installed, since the
+protocols themselves import `opentrons.types` and labware geometry is read
+from the definitions shipped with `opentrons_shared_data`.
+"""
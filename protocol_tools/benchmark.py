@@ -0,0 +1,289 @@
+"""
+Simulation benchmarks for the protocols in this repository.
+
+    python -m protocol_tools.benchmark
+
+simulates every protocol in `BENCHMARKS` offline at 8, 24, 48 and 96
+samples (where the protocol accepts that many), each configuration in a
+fresh worker process, and records the simulation's wall time (the best of
+`--repeat` runs, after an untimed first run and with garbage collection
+off, as `timeit` does), the worker's peak resident memory and the number
+of commands the protocol sent. The time spent loading labware and modules
+(`OfflineContext.load_seconds`) is reported too: in the first run, as a
+protocol starting up in a new process sees it, and in the fastest timed
+run, once the process has loaded everything before. The results are
+compared with the baseline in benchmark_baseline.json; the command exits with status 1 if any
+configuration got slower or used more memory than the tolerances allow,
+sent more commands, or started failing.
+
+    python -m protocol_tools.benchmark --update
+
+rewrites the baseline from this run, e.g. after a change that is meant to
+alter the protocols. Wall times depend on the workstation, so compare
+against a baseline recorded on the same machine.
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from protocol_tools.estimate import REPO_ROOT, simulate
+
+# protocol, its sample count parameter and the sample counts it accepts;
+# protocols without parameters run once with their built-in sample count
+BENCHMARKS = [
+    ('NEBNext-Directional-RNA-PolyA-Part1.py', 'sample_count', [8, 24]),
+    ('NEBNext-Directional-RNA-PolyA-Part2.py', 'sample_count', [8, 24]),
+    ('NEBNext-Directional-RNA-PolyA-Part3.py', 'sample_count', [8, 24]),
+    ('NEBNext-Directional-RNA-PolyA-Part4.py', 'sample_count', [8, 24]),
+    ('sci-zymo-directzol-magbead.py', 'num_samples', [8, 24, 48, 96]),
+    ('SL edits/sci-zymo-directzol-magbead-edits.py', 'num_samples',
+     [8, 24, 48, 96]),
+    ('SL edits/NEBNext-Directional-RNA-PolyA-Part0.py', None, [24])
+]
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'benchmark_baseline.json')
+
+# allowed growth over the baseline before a result counts as a regression
+WALL_TIME_TOLERANCE = 0.25
+PEAK_RSS_TOLERANCE = 0.10
+
+# wall time differences below this many seconds are treated as noise
+WALL_TIME_SLACK = 0.02
+
+
+def peak_rss_mb():
+    """
+    `peak_rss_mb` returns the peak resident memory of this process in MB,
+    or None where it cannot be measured.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == 'darwin':
+        peak /= 1024.0
+    return round(peak / 1024.0, 1)
+
+
+def run_benchmark(job):
+    """
+    `run_benchmark` simulates one protocol configuration once untimed and
+    then `repeat` times, and returns its result. Exceptions raised by the
+    protocol are reported in the 'error' field rather than ending the
+    benchmark.
+    :param job (tuple): The protocol path (relative to the repository), its
+                        parameter values and the number of repeats.
+    """
+    path, values, repeat = job
+    result = {'protocol': path, 'samples': values.get('samples'),
+              'wall_seconds': None, 'peak_rss_mb': None, 'commands': None,
+              'first_load_ms': None, 'load_ms': None, 'error': ''}
+    values = {name: value for name, value in values.items()
+              if name != 'samples'}
+    path = os.path.join(REPO_ROOT, path)
+    times = []
+    try:
+        # the first run, which also imports opentrons, is not timed
+        ctx = simulate(path, values)
+        result['commands'] = ctx.num_commands
+        result['first_load_ms'] = round(ctx.load_seconds * 1000, 1)
+        gc.disable()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ctx = simulate(path, values)
+            times.append((time.perf_counter() - start, ctx.load_seconds))
+        wall_seconds, load_seconds = min(times)
+        result['wall_seconds'] = round(wall_seconds, 3)
+        result['load_ms'] = round(load_seconds * 1000, 1)
+    except Exception as e:
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    finally:
+        gc.enable()
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def benchmark(protocols=None, repeat=5, workers=1):
+    """
+    `benchmark` runs the benchmarks and returns their results, in the order
+    of `BENCHMARKS`.
+    :param protocols (List[str]): Only run protocols whose path contains one
+                                  of these strings.
+    :param repeat (int): Simulations per configuration; the fastest counts.
+    :param workers (int): Configurations simulated at once. More than one
+                          makes the wall times less comparable.
+    """
+    jobs = []
+    for path, parameter, sample_counts in BENCHMARKS:
+        if protocols and not any(name in path for name in protocols):
+            continue
+        for samples in sample_counts:
+            values = {'samples': samples}
+            if parameter is not None:
+                values[parameter] = samples
+            jobs.append((path, values, repeat))
+    # a new process per configuration, so each peak RSS is its own
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, maxtasksperchild=1) as pool:
+        return pool.map(run_benchmark, jobs, chunksize=1)
+
+
+def load_baseline(path=BASELINE_PATH):
+    """
+    `load_baseline` returns the baseline results by (protocol, samples), or
+    an empty dictionary if there is no baseline yet.
+    """
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as baseline_file:
+        results = json.load(baseline_file)['results']
+    return {(result['protocol'], result['samples']): result
+            for result in results}
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """
+    `save_baseline` writes `results` as the new baseline.
+    """
+    with open(path, 'w') as baseline_file:
+        json.dump({'python': sys.version.split()[0], 'results': results},
+                  baseline_file, indent=1, sort_keys=True)
+        baseline_file.write('\n')
+
+
+def regressions(result, base, time_tolerance=WALL_TIME_TOLERANCE,
+                rss_tolerance=PEAK_RSS_TOLERANCE):
+    """
+    `regressions` lists the ways `result` is worse than its baseline `base`
+    (empty if it is not).
+    """
+    if base is None:
+        return []
+    if result['error']:
+        return [] if base['error'] else ['fails']
+    if base['error']:
+        return []
+    found = []
+    if result['wall_seconds'] > max(
+            base['wall_seconds'] * (1 + time_tolerance),
+            base['wall_seconds'] + WALL_TIME_SLACK):
+        found.append('slower')
+    if (result['peak_rss_mb'] is not None and
+            base['peak_rss_mb'] is not None and
+            result['peak_rss_mb'] > base['peak_rss_mb'] * (
+                1 + rss_tolerance)):
+        found.append('more memory')
+    if result['commands'] > base['commands']:
+        found.append('more commands')
+    return found
+
+
+def report(results, baseline, time_tolerance=WALL_TIME_TOLERANCE,
+           rss_tolerance=PEAK_RSS_TOLERANCE):
+    """
+    `report` describes each result next to its baseline (in brackets) and
+    returns the description and the number of regressions.
+    """
+    def cell(value, base_value, form):
+        text = '-' if value is None else form.format(value)
+        if base_value is not None:
+            text += ' ({})'.format(form.format(base_value))
+        return text
+
+    width = max(len(result['protocol']) for result in results)
+    lines = ['{}  {:>7}  {:>16}  {:>16}  {:>13}  {:>15}  {:>13}  '
+             'status'.format('protocol'.ljust(width), 'samples', 'wall s',
+                             'peak RSS MB', 'commands', 'first load ms',
+                             'load ms')]
+    failures = 0
+    for result in results:
+        base = baseline.get((result['protocol'], result['samples']))
+        found = regressions(result, base, time_tolerance, rss_tolerance)
+        failures += bool(found)
+        if found:
+            status = ', '.join(found)
+        elif base is None:
+            status = 'new'
+        elif base['error'] and not result['error']:
+            status = 'fixed'
+        elif result['error']:
+            status = 'still fails'
+        else:
+            status = 'ok'
+        if result['error']:
+            status += ' - ' + result['error']
+        base = base or {}
+        lines.append('{}  {:>7}  {:>16}  {:>16}  {:>13}  {:>15}  {:>13}  '
+                     '{}'.format(
+                         result['protocol'].ljust(width), result['samples'],
+                         cell(result['wall_seconds'],
+                              base.get('wall_seconds'), '{:.3f}'),
+                         cell(result['peak_rss_mb'], base.get('peak_rss_mb'),
+                              '{:.0f}'),
+                         cell(result['commands'], base.get('commands'),
+                              '{}'),
+                         cell(result.get('first_load_ms'),
+                              base.get('first_load_ms'), '{:.1f}'),
+                         cell(result.get('load_ms'), base.get('load_ms'),
+                              '{:.1f}'),
+                         status))
+    return '\n'.join(lines), failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark protocol simulation time and memory.')
+    parser.add_argument('protocols', nargs='*',
+                        help='only benchmark protocols whose path contains '
+                             'one of these (default: all)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='simulations per configuration, the fastest '
+                             'counts (default: 5)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='configurations simulated at once (default: 1)')
+    parser.add_argument('--baseline', default=BASELINE_PATH,
+                        help='baseline file (default: {})'.format(
+                            os.path.relpath(BASELINE_PATH)))
+    parser.add_argument('--time-tolerance', type=float,
+                        default=WALL_TIME_TOLERANCE,
+                        help='allowed wall time growth (default: {})'.format(
+                            WALL_TIME_TOLERANCE))
+    parser.add_argument('--rss-tolerance', type=float,
+                        default=PEAK_RSS_TOLERANCE,
+                        help='allowed peak RSS growth (default: {})'.format(
+                            PEAK_RSS_TOLERANCE))
+    parser.add_argument('--update', action='store_true',
+                        help='save the results as the new baseline')
+    args = parser.parse_args(argv)
+    results = benchmark(args.protocols, args.repeat, args.workers)
+    baseline = load_baseline(args.baseline)
+    description, failures = report(results, baseline, args.time_tolerance,
+                                   args.rss_tolerance)
+    print(description)
+    if args.update:
+        if args.protocols:
+            # keep the baseline of the protocols that were not run
+            for result in results:
+                baseline[(result['protocol'], result['samples'])] = result
+            results = list(baseline.values())
+        save_baseline(results, args.baseline)
+        print('\nbaseline saved to {}'.format(args.baseline))
+    elif failures:
+        print('\n{} of {} configurations regressed'.format(
+            failures, len(results)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""
+Bundle protocols with the shared helpers for upload to the OT-2.
+
+    python -m protocol_tools.bundle [protocol.py ...] [--out dist]
+
+The robot only accepts a single file per protocol, so every
+`from protocol_helpers import ...` in a protocol is replaced by the source
+of the helpers it names, plus whatever those helpers use in turn. Only
+the helpers a protocol needs are inlined. The bundled file is compiled
+before it is written, so a broken bundle never reaches the robot. Without
+arguments, every protocol in the repository is bundled.
+"""
+
+import argparse
+import ast
+import os
+
+PACKAGE = 'protocol_helpers'
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HELPERS_DIR = os.path.join(REPO_ROOT, PACKAGE)
+BEGIN_MARKER = '# ---- {} (inlined by protocol_tools.bundle) ----'.format(
+    PACKAGE)
+END_MARKER = '# ---- end of {} ----'.format(PACKAGE)
+
+
+class BundleError(Exception):
+    pass
+
+
+def _is_helper_import(node):
+    return (isinstance(node, ast.ImportFrom) and node.module and
+            (node.module == PACKAGE or
+             node.module.startswith(PACKAGE + '.')))
+
+
+def _bound_names(node):
+    if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+        return [node.name]
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return [(alias.asname or alias.name).split('.')[0]
+                for alias in node.names]
+    if isinstance(node, ast.Assign):
+        return [target.id for target in node.targets
+                if isinstance(target, ast.Name)]
+    return []
+
+
+def _used_names(node):
+    return {child.id for child in ast.walk(node)
+            if isinstance(child, ast.Name)}
+
+
+def _segment(lines, node):
+    """Return the source of a top-level node with its leading comments."""
+    start = min([node.lineno] +
+                [d.lineno for d in getattr(node, 'decorator_list', [])]) - 1
+    while start > 0 and lines[start - 1].startswith('#'):
+        start -= 1
+    return ''.join(lines[start:node.end_lineno])
+
+
+class HelperLibrary(object):
+    """
+    `HelperLibrary` indexes the top-level definitions of every module in
+    the helper package.
+    """
+
+    def __init__(self, helpers_dir=HELPERS_DIR):
+        self.symbols = {}
+        self.imports = []
+        self.order = []
+        modules = sorted(name for name in os.listdir(helpers_dir)
+                         if name.endswith('.py') and name != '__init__.py')
+        parsed = {}
+        requires = {}
+        for name in modules:
+            path = os.path.join(helpers_dir, name)
+            with open(path) as helper_file:
+                source = helper_file.read()
+            module = PACKAGE + '.' + name[:-3]
+            parsed[module] = (ast.parse(source, path),
+                              source.splitlines(True))
+            requires[module] = set()
+        for module in self._module_order(parsed, requires):
+            tree, lines = parsed[module]
+            for node in tree.body:
+                if _is_helper_import(node):
+                    continue
+                if isinstance(node, (ast.Import, ast.ImportFrom)):
+                    self.imports.append(
+                        (set(_bound_names(node)), _segment(lines, node)))
+                    continue
+                for bound in _bound_names(node):
+                    if bound in self.symbols:
+                        raise BundleError('{} is defined twice in {}'.format(
+                            bound, PACKAGE))
+                    self.symbols[bound] = (node, _segment(lines, node))
+                if _bound_names(node):
+                    self.order.append(node)
+
+    @staticmethod
+    def _module_order(parsed, requires):
+        for module, (tree, _) in parsed.items():
+            for node in tree.body:
+                if _is_helper_import(node) and node.module in parsed:
+                    requires[module].add(node.module)
+        ordered = []
+
+        def visit(module, path):
+            if module in ordered:
+                return
+            if module in path:
+                raise BundleError('Circular import of ' + module)
+            for dependency in sorted(requires[module]):
+                visit(dependency, path + [module])
+            ordered.append(module)
+        for module in sorted(parsed):
+            visit(module, [])
+        return ordered
+
+    def closure(self, names):
+        """
+        `closure` returns the definitions needed by `names`, in source
+        order, together with the imports they use.
+        """
+        needed = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name in needed:
+                continue
+            if name not in self.symbols:
+                raise BundleError('{} has no helper named {}'.format(
+                    PACKAGE, name))
+            needed.add(name)
+            node = self.symbols[name][0]
+            pending.extend(used for used in _used_names(node)
+                           if used in self.symbols)
+        nodes = [node for node in self.order
+                 if any(bound in needed for bound in _bound_names(node))]
+        used = set()
+        for node in nodes:
+            used |= _used_names(node)
+        imports = []
+        for bound, text in self.imports:
+            if bound & used and text not in imports:
+                imports.append(text)
+        sources = [self.symbols[_bound_names(node)[0]][1] for node in nodes]
+        return imports, sources
+
+
+def bundle_source(source, path='<protocol>', library=None):
+    """
+    `bundle_source` returns the protocol `source` with its helper imports
+    replaced by the helpers' source.
+    :param source (str): The protocol source code.
+    :param path (str): The protocol path, used in error messages.
+    :param library (HelperLibrary): The indexed helper package.
+    """
+    tree = ast.parse(source, path)
+    helper_imports = [node for node in tree.body if _is_helper_import(node)]
+    if not helper_imports:
+        return source
+    library = library or HelperLibrary()
+    names = []
+    aliases = []
+    for node in helper_imports:
+        for alias in node.names:
+            names.append(alias.name)
+            if alias.asname and alias.asname != alias.name:
+                aliases.append('{} = {}\n'.format(alias.asname, alias.name))
+    protocol_names = set()
+    for node in tree.body:
+        if not _is_helper_import(node):
+            protocol_names.update(_bound_names(node))
+    imports, sources = library.closure(names)
+    lines = source.splitlines(True)
+    present = {_segment(lines, node) for node in tree.body
+               if isinstance(node, (ast.Import, ast.ImportFrom))}
+    imports = [text for text in imports if text not in present]
+    for text in sources:
+        clash = protocol_names.intersection(
+            _bound_names(ast.parse(text).body[0]))
+        if clash:
+            raise BundleError('{} redefines helper {}'.format(
+                path, ', '.join(sorted(clash))))
+    block = (BEGIN_MARKER + '\n' + ''.join(imports) + '\n\n' +
+             '\n\n'.join(sources) + '\n\n' + ''.join(aliases) +
+             END_MARKER + '\n')
+    first = helper_imports[0]
+    for node in reversed(helper_imports):
+        replacement = [block] if node is first else []
+        lines[node.lineno - 1:node.end_lineno] = replacement
+    bundled = ''.join(lines)
+    compile(bundled, path, 'exec')
+    return bundled
+
+
+def find_protocols(root=REPO_ROOT):
+    """
+    `find_protocols` lists the protocol files in the repository: Python
+    files defining both `metadata` and `run`.
+    """
+    protocols = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = sorted(
+            name for name in subdirectories
+            if not name.startswith('.') and
+            name not in (PACKAGE, 'protocol_tools', 'dist'))
+        for name in sorted(files):
+            if not name.endswith('.py'):
+                continue
+            path = os.path.join(directory, name)
+            with open(path) as protocol_file:
+                tree = ast.parse(protocol_file.read(), path)
+            names = set()
+            for node in tree.body:
+                names.update(_bound_names(node))
+            if {'metadata', 'run'} <= names:
+                protocols.append(path)
+    return protocols
+
+
+def bundle(paths=None, out_dir=None):
+    """
+    `bundle` writes bundled copies of protocols under `out_dir`, keeping
+    their path relative to the repository root, and returns the paths
+    written.
+    :param paths (List[str]): Protocol files; all protocols by default.
+    :param out_dir (str): Output directory, dist/ in the repository by
+                          default.
+    """
+    out_dir = out_dir or os.path.join(REPO_ROOT, 'dist')
+    library = HelperLibrary()
+    written = []
+    for path in paths or find_protocols():
+        path = os.path.abspath(path)
+        with open(path) as protocol_file:
+            bundled = bundle_source(protocol_file.read(), path, library)
+        relative = os.path.relpath(path, REPO_ROOT)
+        if relative.startswith(os.pardir):
+            relative = os.path.basename(path)
+        target = os.path.join(out_dir, relative)
+        if not os.path.isdir(os.path.dirname(target)):
+            os.makedirs(os.path.dirname(target))
+        with open(target, 'w') as bundled_file:
+            bundled_file.write(bundled)
+        written.append(target)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Inline protocol_helpers into protocols for upload.')
+    parser.add_argument('protocols', nargs='*',
+                        help='protocol files (default: all protocols)')
+    parser.add_argument('--out', help='output directory (default: dist/)')
+    args = parser.parse_args(argv)
+    for target in bundle(args.protocols, args.out):
+        print(os.path.relpath(target))
+
+
+if __name__ == '__main__':
+    main()
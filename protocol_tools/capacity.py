@@ -0,0 +1,166 @@
+"""
+Tip, trash and liquid waste capacity of protocols, from an offline run.
+
+    python -m protocol_tools.capacity NEBNext-Directional-RNA-PolyA-Part3.py \
+        --set sample_count=96
+
+simulates the protocol offline (see protocol_tools.estimate) and predicts
+every point in the run where something runs out or fills up, so the
+operator has to come to the robot: a pipette's tip racks running out of
+tips, the trash filling with tips, and a waste well (a reservoir well that
+liquid is only ever dispensed into) filling to its capacity. The trash is
+taken to be emptied whenever the tip racks are refilled, and the trash and
+waste wells whenever they fill up. Each point is listed with the step it
+happens in, together with what could spread the load instead: deck slots
+left free, which can take another tip rack, and wells of the waste
+reservoirs that nothing uses. Refills of tip racks that still had tips in
+them are listed too, since the pause they come with may not be needed.
+The command exits with status 1 if the run cannot finish without the
+operator, so it can be checked before the run starts.
+"""
+
+import argparse
+import os
+import sys
+
+from protocol_tools.estimate import parse_assignments, simulate
+
+# tips the trash holds before it has to be emptied (TipTracker's default
+# drop_threshold)
+TRASH_CAPACITY = 120
+
+# deck slots labware can be loaded in; 12 is the fixed trash
+DECK_SLOTS = range(1, 12)
+
+
+class CapacityPlan(object):
+    """
+    `CapacityPlan` is the tip, trash and liquid waste usage of an offline
+    run of a protocol, and the points where it runs out or fills up.
+    :param ctx (OfflineContext): The context the protocol was run with.
+    :param trash_capacity (int): The tips the trash holds.
+    """
+
+    def __init__(self, ctx, trash_capacity=TRASH_CAPACITY):
+        labels = ctx.phase_labels()
+        # waste wells: reservoir wells liquid is only ever dispensed into
+        waste = set(well for well in ctx.filled_wells
+                    if len(well.parent.rows()) == 1 and
+                    ctx.volume_drawn.get(well, 0) <= 0)
+        self.trash_capacity = trash_capacity
+        self.points = []
+        self.early_refills = []
+        self.tips = {}
+        self.refills = {}
+        self.trash_tips = 0
+        self.volumes = {}
+        trash = 0
+        filled = {}
+        for phase, kind, subject, amount in ctx.usage:
+            label = labels[phase]
+            if kind == 'tips':
+                self.tips[subject] = self.tips.get(subject, 0) + amount
+            elif kind == 'refill':
+                self.refills[subject] = self.refills.get(subject, 0) + 1
+                if amount:
+                    self.early_refills.append((label, '{} tip racks refilled '
+                                               'with {} tips left'.format(
+                                                   subject, amount)))
+                else:
+                    self.points.append((label, '{} ran out of tips'.format(
+                        subject)))
+                trash = 0
+            elif kind == 'trash':
+                self.trash_tips += amount
+                trash += amount
+                if trash > trash_capacity:
+                    self.points.append((label, 'the trash is full'))
+                    trash = amount
+            elif kind == 'liquid' and subject in waste:
+                self.volumes[subject] = self.volumes.get(
+                    subject, 0.0) + amount
+                filled[subject] = filled.get(subject, 0.0) + amount
+                if filled[subject] > subject.max_volume:
+                    self.points.append((label, '{} is full'.format(subject)))
+                    filled[subject] = amount
+        self.racks = {pipette: len(pipette.tip_racks)
+                      for pipette in ctx.loaded_instruments.values()}
+        used = set(ctx.loaded_labwares) | set(ctx.loaded_modules)
+        self.free_slots = [slot for slot in DECK_SLOTS if slot not in used]
+        self.waste = sorted(waste, key=lambda well: (
+            well.parent.slot, well.parent.wells().index(well)))
+        # wells of the waste reservoirs that nothing drew from or filled
+        self.spare_wells = [
+            well for labware in sorted(
+                set(well.parent for well in waste),
+                key=lambda labware: labware.slot)
+            for well in labware.wells()
+            if well not in ctx.volume_drawn and well not in self.volumes]
+
+    def report(self):
+        lines = ['tips:']
+        for pipette, racks in sorted(self.racks.items(),
+                                     key=lambda item: str(item[0])):
+            lines.append('  {}: {} tips from {} racks, refilled {} '
+                         'times'.format(pipette, self.tips.get(pipette, 0),
+                                        racks, self.refills.get(pipette, 0)))
+        lines.append('trash: {} tips (holds {})'.format(
+            self.trash_tips, self.trash_capacity))
+        if self.waste:
+            lines.append('liquid waste:')
+            for well in self.waste:
+                lines.append('  {} {}: {:.0f} of {:.0f} uL'.format(
+                    well.parent, well.well_name, self.volumes[well],
+                    well.max_volume))
+        lines.append('free deck slots: {}'.format(
+            ', '.join(str(slot) for slot in self.free_slots) or 'none'))
+        if self.waste:
+            lines.append('spare waste reservoir wells: {}'.format(
+                ', '.join(well.well_name for well in self.spare_wells) or
+                'none'))
+        for title, points in [
+                ('the operator is needed at:', self.points),
+                ('tip racks refilled early at:', self.early_refills)]:
+            if points:
+                lines.extend(['', title])
+                width = max(len(label) for label, _ in points)
+                for label, what in points:
+                    lines.append('  {}  {}'.format(label.ljust(width), what))
+        return '\n'.join(lines)
+
+
+def capacity_plan(path, values=None, trash_capacity=TRASH_CAPACITY):
+    """
+    `capacity_plan` returns the `CapacityPlan` of a protocol.
+    :param path (str): Path to the protocol file.
+    :param values (dict): Parameter overrides, see `load_protocol`.
+    :param trash_capacity (int): See `CapacityPlan`.
+    """
+    return CapacityPlan(simulate(path, values), trash_capacity)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Predict where a run runs out of tips or fills up its '
+                    'trash or liquid waste.')
+    parser.add_argument('protocols', nargs='+', help='protocol files')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a get_values() parameter')
+    parser.add_argument('--trash-capacity', type=int, default=TRASH_CAPACITY,
+                        help='tips the trash holds (default: {})'.format(
+                            TRASH_CAPACITY))
+    args = parser.parse_args(argv)
+    values = parse_assignments(args.set)
+    interrupted = False
+    for path in args.protocols:
+        plan = capacity_plan(path, values, args.trash_capacity)
+        print('{}:\n'.format(os.path.basename(path)))
+        print(plan.report())
+        print('')
+        interrupted = interrupted or bool(plan.points)
+    if interrupted:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""
+Command logs of offline runs, streamed to disk.
+
+    python -m protocol_tools.commands export sci-zymo-directzol-magbead.py \
+        --set num_samples=96 --out zymo-96.cmds
+    python -m protocol_tools.commands show zymo-96.cmds --step 'wash 2'
+
+simulates the protocol offline (see protocol_tools.estimate) and writes
+every command it times to a command log instead of keeping them in memory:
+a directory with one file per column of the (phase, kind, seconds)
+records, each holding fixed-width values (see `COLUMNS`), and an index
+(`INDEX_FILE`) naming the phases and kinds and giving the records each
+step spans. Records are buffered `CHUNK_SIZE` at a time, so writing and
+reading a log takes the same memory however long the run. `show` totals
+the time of a log per step and per command, for the whole run or one
+step, reading only that step's records.
+"""
+
+import argparse
+import array
+import json
+import os
+import sys
+
+from protocol_tools.estimate import (
+    format_seconds, load_protocol, parse_assignments)
+from protocol_tools.offline import OfflineContext
+
+# name, array typecode and file of each column of a log
+COLUMNS = [('phase', 'H', 'phase.u16'),
+           ('kind', 'B', 'kind.u8'),
+           ('seconds', 'd', 'seconds.f64')]
+
+# records held in memory before they are written, and read at a time
+CHUNK_SIZE = 4096
+
+INDEX_FILE = 'index.json'
+FORMAT_VERSION = 1
+
+
+class CommandWriter(object):
+    """
+    `CommandWriter` writes the commands of an offline run to a command log.
+    It is passed to `OfflineContext` in place of its `commands` list, and
+    the log is complete once `close` has been given the run's phase
+    labels.
+    :param path (str): The log's directory, created if needed.
+    """
+
+    def __init__(self, path):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.kinds = []
+        self.steps = []
+        self._count = 0
+        self._kind_codes = {}
+        self._buffers = [array.array(typecode) for _, typecode, _ in COLUMNS]
+        self._files = [open(os.path.join(path, name), 'wb')
+                       for _, _, name in COLUMNS]
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is not None:
+            for column_file in self._files:
+                column_file.close()
+
+    def append(self, command):
+        """
+        `append` adds a (phase, kind, seconds) command to the log.
+        """
+        phase, kind, seconds = command
+        code = self._kind_codes.get(kind)
+        if code is None:
+            code = self._kind_codes[kind] = len(self.kinds)
+            self.kinds.append(kind)
+        if self.steps and self.steps[-1][0] == phase:
+            self.steps[-1][2] += 1
+        else:
+            self.steps.append([phase, self._count, self._count + 1])
+        for buffer, value in zip(self._buffers, (phase, code, seconds)):
+            buffer.append(value)
+        self._count += 1
+        if len(self._buffers[0]) >= CHUNK_SIZE:
+            self._flush()
+
+    def extend(self, commands):
+        """
+        `extend` adds every command of an iterable (e.g. the records of
+        another log) to the log.
+        """
+        for command in commands:
+            self.append(command)
+
+    def close(self, phase_labels):
+        """
+        `close` writes the last records and the index, naming phases by
+        `phase_labels` (see `OfflineContext.phase_labels`).
+        """
+        self._flush()
+        for column_file in self._files:
+            column_file.close()
+        index = {'version': FORMAT_VERSION, 'count': self._count,
+                 'byteorder': sys.byteorder, 'phases': phase_labels,
+                 'kinds': self.kinds, 'steps': self.steps}
+        temp_path = os.path.join(self.path, INDEX_FILE + '.tmp')
+        with open(temp_path, 'w') as index_file:
+            json.dump(index, index_file)
+        os.replace(temp_path, os.path.join(self.path, INDEX_FILE))
+
+    def _flush(self):
+        for buffer, column_file in zip(self._buffers, self._files):
+            buffer.tofile(column_file)
+            del buffer[:]
+
+
+class CommandLog(object):
+    """
+    `CommandLog` reads a command log written by `CommandWriter`.
+    :param path (str): The log's directory.
+    """
+
+    def __init__(self, path):
+        index_path = os.path.join(path, INDEX_FILE)
+        if not os.path.isfile(index_path):
+            raise ValueError('{} is not a complete command log'.format(path))
+        with open(index_path) as index_file:
+            index = json.load(index_file)
+        if index['version'] != FORMAT_VERSION:
+            raise ValueError('{} is a version {} command log, not {}'.format(
+                path, index['version'], FORMAT_VERSION))
+        self.path = path
+        self.phase_labels = index['phases']
+        self.kinds = index['kinds']
+        self.steps = [tuple(step) for step in index['steps']]
+        self._count = index['count']
+        self._swap = index['byteorder'] != sys.byteorder
+
+    def __len__(self):
+        return self._count
+
+    def records(self, start=0, stop=None):
+        """
+        `records` yields the (phase label, kind, seconds) of the commands
+        from `start` up to `stop` (by default the end of the log), reading
+        `CHUNK_SIZE` records at a time.
+        """
+        stop = self._count if stop is None else min(stop, self._count)
+        files = [open(os.path.join(self.path, name), 'rb')
+                 for _, _, name in COLUMNS]
+        try:
+            for column_file, (_, typecode, _) in zip(files, COLUMNS):
+                column_file.seek(start * array.array(typecode).itemsize)
+            while start < stop:
+                size = min(CHUNK_SIZE, stop - start)
+                chunks = []
+                for column_file, (_, typecode, _) in zip(files, COLUMNS):
+                    chunk = array.array(typecode)
+                    chunk.fromfile(column_file, size)
+                    if self._swap:
+                        chunk.byteswap()
+                    chunks.append(chunk)
+                for phase, kind, seconds in zip(*chunks):
+                    yield self.phase_labels[phase], self.kinds[kind], seconds
+                start += size
+        finally:
+            for column_file in files:
+                column_file.close()
+
+    def step(self, label):
+        """
+        `step` yields the records of the step named `label` (as in
+        `phase_labels`), seeking straight to them.
+        """
+        if label not in self.phase_labels:
+            raise ValueError('{} has no step {}'.format(self.path, label))
+        phase = self.phase_labels.index(label)
+        for step_phase, start, stop in self.steps:
+            if step_phase == phase:
+                for record in self.records(start, stop):
+                    yield record
+
+
+def totals(records):
+    """
+    `totals` returns the seconds of a stream of records per step and per
+    command kind, as two lists of (name, seconds) pairs: the steps in the
+    order they ran and the kinds longest first.
+    """
+    step_seconds = {}
+    kind_seconds = {}
+    for label, kind, seconds in records:
+        step_seconds[label] = step_seconds.get(label, 0.0) + seconds
+        kind_seconds[kind] = kind_seconds.get(kind, 0.0) + seconds
+    return (list(step_seconds.items()),
+            sorted(kind_seconds.items(), key=lambda item: -item[1]))
+
+
+def export_commands(path, out, values=None):
+    """
+    `export_commands` simulates a protocol and writes its commands to a
+    command log, returning the `OfflineContext` of the run.
+    :param path (str): Path to the protocol file.
+    :param out (str): The log's directory.
+    :param values (dict): Parameter overrides, see `load_protocol`.
+    """
+    module = load_protocol(path, values)
+    with CommandWriter(out) as writer:
+        ctx = OfflineContext(commands=writer).execute(module.run)
+        writer.close(ctx.phase_labels())
+    return ctx
+
+
+def report(log, label=None):
+    """
+    `report` describes the time a command log spends per step and per
+    command, for the whole run or for the step named `label`.
+    """
+    records = log.records() if label is None else log.step(label)
+    step_seconds, kind_seconds = totals(records)
+    lines = ['{}: {} commands, {}'.format(
+        label or os.path.basename(os.path.normpath(log.path)),
+        len(log) if label is None else sum(
+            stop - start for phase, start, stop in log.steps
+            if log.phase_labels[phase] == label),
+        format_seconds(sum(seconds for _, seconds in step_seconds)))]
+    width = max(len(name) for name, _ in step_seconds + kind_seconds)
+    for title, items in [('per step:', step_seconds),
+                         ('per command:', kind_seconds)]:
+        lines.extend(['', title])
+        for name, seconds in items:
+            lines.append('  {}  {}'.format(
+                name.ljust(width), format_seconds(seconds)))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Write the commands of an offline run to disk, or '
+                    'summarize a written command log.')
+    actions = parser.add_subparsers(dest='action')
+    actions.required = True
+    export_parser = actions.add_parser(
+        'export', help='simulate a protocol and write its command log')
+    export_parser.add_argument('protocol', help='protocol file')
+    export_parser.add_argument('--set', action='append',
+                               metavar='NAME=VALUE',
+                               help='override a get_values() parameter')
+    export_parser.add_argument('--out', required=True,
+                               help='command log directory')
+    show_parser = actions.add_parser(
+        'show', help='total the time of a command log')
+    show_parser.add_argument('log', help='command log directory')
+    show_parser.add_argument('--step', help='only total this step')
+    args = parser.parse_args(argv)
+    if args.action == 'export':
+        ctx = export_commands(args.protocol, args.out,
+                              parse_assignments(args.set))
+        print('{} commands written to {}'.format(ctx.num_commands, args.out))
+        return
+    print(report(CommandLog(args.log), args.step))
+
+
+if __name__ == '__main__':
+    main()
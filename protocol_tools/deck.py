@@ -0,0 +1,370 @@
+"""
+Deck layout checks for protocols, from an offline run.
+
+    python -m protocol_tools.deck \
+        "SL edits/sci-zymo-directzol-magbead-edits.py" \
+        --set num_samples=96 --cache deck-cache.json
+
+simulates the protocol offline (see protocol_tools.estimate) and checks the
+deck it loads, so layout problems are found before the protocol reaches the
+robot: modules in slots they cannot go in, labware in the slots a
+thermocycler covers or loaded over other labware, labware too tall for a
+pipette to carry its tips over, and tips dropped in the fixed trash (at
+each of `TipTracker`'s `TRASH_DROP_OFFSETS`) with a channel outside the
+trash or out of the pipette's reach. Every point a pipette moved to during
+the run is checked against its reach too, and every tip rack it picked up
+fewer tips than it has channels from must have its front slot clear for the
+channels hanging past its front (see `clear_in_front`); a run that had to
+pick up full columns for want of such a rack fails too. The checks of the
+layout only depend on what is loaded where, so their verdict is kept under
+a hash of the layout (see `layout_key`): in memory for the life of the
+process, so a sweep over many configurations of the same deck checks it
+once, and with --cache in a JSON file shared between runs. A run the
+protocol ends early still has the deck it loaded until then checked. The
+reach of each mount is approximate (see `MOUNT_X_RANGES`), and module
+connections (e.g. a thermocycler's serial port) are not checked. The
+command exits with status 1 if any problem is found.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections import deque
+
+from opentrons.types import Point
+
+from protocol_helpers.tips import (
+    PICK_UP_CURRENT_PER_TIP, TRASH_DROP_OFFSETS, clear_in_front)
+from protocol_tools.estimate import load_protocol, parse_assignments
+from protocol_tools.offline import (
+    CHANNEL_SPACING, HOME_POINT, LABWARE_Z_MARGIN, SLOT_ORIGINS,
+    OfflineContext,
+    load_labware_definition, load_module_definition)
+
+# deck slots each type of module can be loaded in
+MODULE_SLOTS = {
+    'magneticModuleType': (1, 3, 4, 6, 7, 9, 10),
+    'temperatureModuleType': (1, 3, 4, 6, 7, 9, 10),
+    'thermocyclerModuleType': (7,)
+}
+
+# slots a thermocycler loaded in slot 7 covers
+THERMOCYCLER_SLOTS = (7, 8, 10, 11)
+
+# deck x range (mm) the nozzle on each mount reaches, roughly: the left
+# mount sits 34 mm left of the right one, so falls short on the right
+MOUNT_X_RANGES = {'left': (0.0, HOME_POINT.x - 34.0),
+                  'right': (0.0, HOME_POINT.x)}
+
+# front edge of the deck (mm), which every channel stays behind; the
+# middle of a pipette's channels goes no further back than it homes to
+DECK_FRONT = 0.0
+
+# footprint (mm) of a deck slot
+SLOT_SIZE = (127.76, 85.48)
+
+# part of every layout key, so verdicts cached by older checks are not used
+LAYOUT_CHECKS_VERSION = 1
+
+
+def layout_key(ctx):
+    """
+    `layout_key` returns a hash of everything the layout checks look at:
+    the labware and modules loaded in each slot, in the order they were
+    loaded, each pipette with its tip racks, and the trash drop offsets.
+    :param ctx (OfflineContext): The context the protocol was run with.
+    """
+    pipettes = sorted(
+        [pipette.mount, pipette.name,
+         sorted(rack.load_name for rack in pipette.tip_racks)]
+        for pipette in ctx.loaded_instruments.values())
+    layout = {'version': LAYOUT_CHECKS_VERSION,
+              'placements': ctx.placements,
+              'pipettes': pipettes,
+              'trash_offsets': TRASH_DROP_OFFSETS}
+    return hashlib.sha1(
+        json.dumps(layout, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def out_of_reach(pipette, x, y):
+    """
+    `out_of_reach` tells whether a pipette with its first channel at
+    (`x`, `y`), as in its `positions`, would have any channel outside the
+    reach of its mount.
+    """
+    low, high = MOUNT_X_RANGES[pipette.mount]
+    span = CHANNEL_SPACING * (pipette.channels - 1)
+    return not (low <= x <= high and y - span >= DECK_FRONT and
+                y - span / 2.0 <= HOME_POINT.y)
+
+
+def _slot_at(x, y):
+    for slot, (left, front) in sorted(SLOT_ORIGINS.items()):
+        if (left <= x <= left + SLOT_SIZE[0] and
+                front <= y <= front + SLOT_SIZE[1]):
+            return 'slot {}'.format(slot)
+    return 'off the deck'
+
+
+def layout_problems(ctx):
+    """
+    `layout_problems` lists the problems with the deck a protocol loaded:
+    slots loaded more than once, modules in slots they cannot go in or
+    with labware in the slots they cover, labware (and modules) too tall
+    to carry the longest tip over, and trash drops that miss the trash or
+    are out of reach.
+    :param ctx (OfflineContext): The context the protocol was run with.
+    """
+    problems = []
+    slots = {}
+    for kind, slot, name in ctx.placements:
+        slots.setdefault(slot, []).append((kind, name))
+    modules = {}
+    for slot, loaded in sorted(slots.items()):
+        on_deck = [name for kind, name in loaded if kind != 'module labware']
+        on_module = [name for kind, name in loaded
+                     if kind == 'module labware']
+        if len(on_deck) > 1 or len(on_module) > 1:
+            problems.append('slot {} is loaded more than once: {}'.format(
+                slot, ', '.join(name for _, name in loaded)))
+        for kind, name in loaded:
+            if kind == 'module':
+                modules[slot] = load_module_definition(name)
+    for slot, definition in sorted(modules.items()):
+        module_type = definition['moduleType']
+        if slot not in MODULE_SLOTS[module_type]:
+            problems.append('{} cannot go in slot {} (only {})'.format(
+                definition['model'], slot, ', '.join(
+                    str(allowed) for allowed in MODULE_SLOTS[module_type])))
+        if module_type == 'thermocyclerModuleType':
+            for covered in THERMOCYCLER_SLOTS:
+                if covered != slot and covered in slots:
+                    problems.append('{} in slot {} is under the '
+                                    'thermocycler'.format(', '.join(
+                                        name for _, name in slots[covered]),
+                                        covered))
+    # the tallest tip a pipette carries must clear everything on the deck
+    tips = [(rack.tip_length, pipette)
+            for pipette in ctx.loaded_instruments.values()
+            for rack in pipette.tip_racks if rack.tip_length]
+    if tips:
+        tip_length, pipette = max(tips, key=lambda tip: tip[0])
+        ceiling = HOME_POINT.z - LABWARE_Z_MARGIN - tip_length
+        for kind, slot, name in ctx.placements:
+            if kind == 'module':
+                height = modules[slot]['dimensions']['bareOverallHeight']
+            else:
+                height = load_labware_definition(
+                    name)['dimensions']['zDimension']
+                if kind == 'module labware':
+                    height += modules[slot]['labwareOffset']['z']
+            if height > ceiling:
+                problems.append(
+                    '{} in slot {} is {:.1f} mm tall: {} cannot carry its '
+                    '{:.1f} mm tips over it (at most {:.1f} mm)'.format(
+                        name, slot, height, pipette, tip_length, ceiling))
+    trash = ctx.fixed_trash.wells()[0]
+    centre = trash.top().point
+    for pipette in sorted(ctx.loaded_instruments.values(),
+                          key=lambda pipette: pipette.mount):
+        for offset in TRASH_DROP_OFFSETS:
+            point = trash.top().move(Point(x=offset)).point
+            # the trash centres multi-channel pipettes over its well
+            back = point.y + CHANNEL_SPACING * (pipette.channels - 1) / 2.0
+            front = point.y - CHANNEL_SPACING * (pipette.channels - 1) / 2.0
+            if (abs(point.x - centre.x) > trash.length / 2.0 or
+                    abs(back - centre.y) > trash.width / 2.0 or
+                    abs(front - centre.y) > trash.width / 2.0):
+                problems.append('{} drops tips outside the trash at {:+} '
+                                'mm'.format(pipette, offset))
+            if out_of_reach(pipette, point.x, back):
+                problems.append('{} cannot reach the trash at {:+} '
+                                'mm'.format(pipette, offset))
+    return problems
+
+
+def reach_problems(ctx):
+    """
+    `reach_problems` lists the pipettes that moved out of reach during a
+    run, with the number of points they could not reach and the first.
+    :param ctx (OfflineContext): The context the protocol was run with.
+    """
+    problems = []
+    for pipette in sorted(ctx.loaded_instruments.values(),
+                          key=lambda pipette: pipette.mount):
+        missed = sorted(point for point in pipette.positions
+                        if out_of_reach(pipette, *point))
+        if missed:
+            x, y = missed[0]
+            problems.append(
+                '{} moves out of reach at {} points, e.g. x={:.1f} y={:.1f} '
+                '({})'.format(pipette, len(missed), x, y, _slot_at(x, y)))
+    return problems
+
+
+def pick_up_problems(ctx):
+    """
+    `pick_up_problems` lists the tip racks pipettes picked up fewer tips
+    than they have channels from with their front channels over labware
+    in the slot in front, the pipettes that pressed fewer tips on with
+    more than `PICK_UP_CURRENT_PER_TIP` each, and the pipettes that had to
+    pick up a full column for fewer tips because none of their racks is
+    clear in front.
+    :param ctx (OfflineContext): The context the protocol was run with.
+    """
+    problems = []
+    for pipette in sorted(ctx.loaded_instruments.values(),
+                          key=lambda pipette: pipette.mount):
+        for rack in sorted(pipette.overhangs, key=lambda rack: rack.slot):
+            if not clear_in_front(ctx, rack):
+                problems.append(
+                    '{} picks up fewer tips than it has channels from the '
+                    'tip rack in slot {}, with channels over slot {}'.format(
+                        pipette, rack.slot, rack.slot - 3))
+        for num_tips, current in sorted(pipette.partial_currents):
+            if current > PICK_UP_CURRENT_PER_TIP * num_tips + 1e-6:
+                problems.append(
+                    '{} picks up {} tips at {} A, more than {} A a '
+                    'tip'.format(pipette, num_tips, current,
+                                 PICK_UP_CURRENT_PER_TIP))
+        # protocols may hand the ledger a wrapped pipette
+        fallbacks = [num_tips for owner, num_tips in ctx.full_column_pick_ups
+                     if owner.mount == pipette.mount]
+        if fallbacks:
+            problems.append(
+                '{} picks up a full column for fewer tips {} times: none of '
+                'its tip racks has an empty slot or short labware in front '
+                '(e.g. a tip rack in slot 5 with a reservoir in slot '
+                '2)'.format(pipette, len(fallbacks)))
+    return problems
+
+
+class LayoutCache(object):
+    """
+    `LayoutCache` keeps the `layout_problems` found in each deck layout
+    under its `layout_key`, so a layout is only checked once.
+    :param path (str): A JSON file the verdicts are read from and saved
+                       to, if any.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.verdicts = {}
+        self.hits = 0
+        if path is not None and os.path.isfile(path):
+            with open(path) as cache_file:
+                self.verdicts = json.load(cache_file)
+
+    def problems(self, ctx, key=None):
+        """
+        `problems` returns the layout problems of the deck `ctx` loaded,
+        checking the layout only if it has no verdict yet.
+        :param key (str): The layout's `layout_key`, if already known.
+        """
+        key = key or layout_key(ctx)
+        if key in self.verdicts:
+            self.hits += 1
+        else:
+            self.verdicts[key] = layout_problems(ctx)
+            if self.path is not None:
+                self.save()
+        return list(self.verdicts[key])
+
+    def save(self):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as cache_file:
+            json.dump(self.verdicts, cache_file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+# verdicts kept for the life of the process
+_LAYOUT_CACHE = LayoutCache()
+
+
+class DeckCheck(object):
+    """
+    `DeckCheck` is the deck layout problems of an offline run of a
+    protocol.
+    :param ctx (OfflineContext): The context the protocol was run with.
+    :param cache (LayoutCache): Where layout verdicts are kept; one for
+                                the whole process by default.
+    :param error (Exception): What ended the run early, if anything.
+    """
+
+    def __init__(self, ctx, cache=None, error=None):
+        cache = _LAYOUT_CACHE if cache is None else cache
+        self.key = layout_key(ctx)
+        self.placements = list(ctx.placements)
+        self.layout = cache.problems(ctx, self.key)
+        self.reach = reach_problems(ctx)
+        self.pick_ups = pick_up_problems(ctx)
+        self.error = error
+
+    @property
+    def problems(self):
+        return self.layout + self.reach + self.pick_ups
+
+    def report(self):
+        lines = ['deck (layout {}):'.format(self.key[:12])]
+        for kind, slot, name in sorted(self.placements,
+                                       key=lambda placement: placement[1]):
+            lines.append('  {:>2}  {}{}'.format(
+                slot, name, ' (on the module)'
+                if kind == 'module labware' else ''))
+        if self.error is not None:
+            lines.extend(['', 'the run ended early ({}: {}), so only the '
+                              'deck loaded until then was checked'.format(
+                                  type(self.error).__name__, self.error)])
+        lines.append('')
+        if self.problems:
+            lines.append('problems:')
+            lines.extend('  {}'.format(problem) for problem in self.problems)
+        else:
+            lines.append('no problems found')
+        return '\n'.join(lines)
+
+
+def check_deck(path, values=None, cache=None):
+    """
+    `check_deck` returns the `DeckCheck` of a protocol.
+    :param path (str): Path to the protocol file.
+    :param values (dict): Parameter overrides, see `load_protocol`.
+    :param cache (LayoutCache): See `DeckCheck`.
+    """
+    module = load_protocol(path, values)
+    # only the deck and the pipettes' positions are needed
+    ctx = OfflineContext(commands=deque(maxlen=0))
+    error = None
+    try:
+        ctx.execute(module.run)
+    except Exception as e:
+        error = e
+    return DeckCheck(ctx, cache, error)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Check the deck layout of a protocol before it runs.')
+    parser.add_argument('protocols', nargs='+', help='protocol files')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a get_values() parameter')
+    parser.add_argument('--cache', help='JSON file keeping the verdict on '
+                                        'each layout between runs')
+    args = parser.parse_args(argv)
+    values = parse_assignments(args.set)
+    cache = LayoutCache(args.cache) if args.cache else None
+    failed = False
+    for path in args.protocols:
+        check = check_deck(path, values, cache)
+        print('{}:\n'.format(os.path.basename(path)))
+        print(check.report())
+        print('')
+        failed = failed or bool(check.problems)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+A content-addressed cache of the labware and module definitions offline
+runs load.
+
+Every `load_labware` of every simulation reads a definition shipped with
+`opentrons_shared_data` and parses its JSON; a sweep or a benchmark loads
+the same few definitions thousands of times. `DefinitionCache` parses each
+one once per process, and keeps it parsed on disk (pickled) under the sha1
+of the definition file, so a new process memory-maps the parsed definition
+rather than decoding the JSON again. The files are named by their content,
+so a definition changed by an opentrons upgrade gets a new entry and a
+stale one is never used. Parsed definitions are shared between every
+labware loaded from them and must not be changed.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import pickle
+
+from opentrons_shared_data import load_shared_data
+
+# where parsed definitions are kept between processes; set
+# PROTOCOL_TOOLS_CACHE to an empty string to keep them in memory only
+CACHE_DIR = os.environ.get('PROTOCOL_TOOLS_CACHE', os.path.join(
+    os.path.expanduser('~'), '.cache', 'protocol_tools', 'definitions'))
+
+
+class DefinitionCache(object):
+    """
+    `DefinitionCache` loads JSON definitions from `opentrons_shared_data`,
+    parsing each at most once. `hits`, `disk_hits` and `parsed` count the
+    definitions found in memory, found on disk and parsed from JSON.
+    :param path (str): The directory parsed definitions are kept in, or
+                       None to keep them in memory only.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or None
+        self.hits = 0
+        self.disk_hits = 0
+        self.parsed = 0
+        self._loaded = {}
+
+    def load(self, name):
+        """
+        `load` returns the parsed definition at `name`, a path within
+        `opentrons_shared_data` (e.g.
+        'labware/definitions/2/nest_12_reservoir_15ml/1.json').
+        """
+        definition = self._loaded.get(name)
+        if definition is not None:
+            self.hits += 1
+            return definition
+        data = load_shared_data(name)
+        cache_path = None
+        if self.path is not None:
+            cache_path = os.path.join(
+                self.path, hashlib.sha1(data).hexdigest() + '.pickle')
+            definition = self._read(cache_path)
+        if definition is None:
+            definition = json.loads(data)
+            self.parsed += 1
+            if cache_path is not None:
+                self._write(cache_path, definition)
+        else:
+            self.disk_hits += 1
+        self._loaded[name] = definition
+        return definition
+
+    def _read(self, cache_path):
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                with mmap.mmap(cache_file.fileno(), 0,
+                               access=mmap.ACCESS_READ) as mapped:
+                    return pickle.loads(mapped)
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+            # missing, empty or written by another python: parse it again
+            return None
+
+    def _write(self, cache_path, definition):
+        temp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(temp_path, 'wb') as cache_file:
+                pickle.dump(definition, cache_file,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            # a read-only cache only costs the parse
+            pass
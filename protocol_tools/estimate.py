@@ -0,0 +1,262 @@
+"""
+Run-time estimates for protocols, computed offline.
+
+    python -m protocol_tools.estimate sci-zymo-directzol-magbead.py \
+        --set num_samples=96
+
+runs the protocol's `run(ctx)` against an `OfflineContext` and prints the
+estimated wall-clock time of the whole run and of each step, and for
+protocols with a sample count, the samples per hour that makes. Parameters
+from the protocol's `get_values()` JSON can be overridden with `--set`.
+Operator pauses are counted but take no time in the estimate.
+
+    python -m protocol_tools.estimate sci-zymo-directzol-magbead.py \
+        --set num_samples=96 --compare multi_dispense=true
+
+also estimates the run with the `--compare` values applied on top and
+reports the time, tips and gantry travel the change saves (or costs).
+"""
+
+import argparse
+import ast
+import json
+import os
+import sys
+import types
+
+from protocol_tools.offline import OfflineContext
+
+# protocols import the shared helpers from the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# get_values() parameters protocols give their number of samples in
+SAMPLE_PARAMETERS = ('sample_count', 'num_samples')
+
+
+def protocol_values(path):
+    """
+    `protocol_values` returns the default parameter values of a protocol,
+    parsed from the JSON literal in its `get_values()` function. Protocols
+    without `get_values()` return an empty dictionary.
+    :param path (str): Path to the protocol file.
+    """
+    with open(path) as protocol_file:
+        tree = ast.parse(protocol_file.read(), path)
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == 'get_values':
+            for call in ast.walk(node):
+                if (isinstance(call, ast.Call) and call.args and
+                        isinstance(call.args[0], ast.Constant) and
+                        isinstance(call.args[0].value, str)):
+                    return json.loads(call.args[0].value)
+    return {}
+
+
+def protocol_samples(path, values=None):
+    """
+    `protocol_samples` returns the number of samples a protocol runs with,
+    from the first of `SAMPLE_PARAMETERS` it has, or None if it has none.
+    :param path (str): Path to the protocol file.
+    :param values (dict): Parameter overrides, see `load_protocol`.
+    """
+    all_values = protocol_values(path)
+    all_values.update(values or {})
+    for name in SAMPLE_PARAMETERS:
+        if name in all_values:
+            return all_values[name]
+    return None
+
+
+def load_protocol(path, values=None):
+    """
+    `load_protocol` executes a protocol file as a fresh module, without
+    running it.
+    :param path (str): Path to the protocol file.
+    :param values (dict): Parameter values replacing those returned by the
+                          protocol's `get_values()`; unspecified parameters
+                          keep their defaults.
+    """
+    path = os.path.abspath(path)
+    with open(path) as protocol_file:
+        code = compile(protocol_file.read(), path, 'exec')
+    module = types.ModuleType(
+        os.path.splitext(os.path.basename(path))[0].replace('-', '_'))
+    module.__file__ = path
+    exec(code, module.__dict__)
+    if values:
+        if 'get_values' not in module.__dict__:
+            raise ValueError('{} has no get_values() to override'.format(
+                path))
+        all_values = protocol_values(path)
+        all_values.update(values)
+        module.get_values = lambda *names: [all_values[n] for n in names]
+    return module
+
+
+class RunEstimate(object):
+    """
+    `RunEstimate` summarizes an offline run of a protocol.
+    :param samples (int): The number of samples in the run, if known.
+    """
+
+    def __init__(self, path, ctx, samples=None):
+        self.path = path
+        self.ctx = ctx
+        self.samples = samples
+        self.total_seconds = ctx.clock
+        self.pauses = len(ctx.pauses)
+        self.pick_ups = ctx.pick_ups
+        self.tips_used = ctx.tips_used
+        self.reagent_volume = ctx.reagent_volume()
+        self.travel_m = ctx.travel_mm / 1000.0
+        self.num_commands = ctx.num_commands
+        self.phases = [(label, seconds) for label, seconds in zip(
+                           ctx.phase_labels(), ctx.phase_seconds)
+                       if seconds > 0]
+        self.kinds = sorted(ctx.kind_seconds.items(),
+                            key=lambda item: -item[1])
+        self.liquids = sorted(ctx.liquid_seconds.items(),
+                              key=lambda item: -item[1])
+
+    @property
+    def samples_per_hour(self):
+        """
+        `samples_per_hour` is the throughput of the run, excluding operator
+        pauses, or None if the number of samples is not known.
+        """
+        if not self.samples or self.total_seconds <= 0:
+            return None
+        return self.samples * 3600.0 / self.total_seconds
+
+    def report(self):
+        lines = ['{}: {} (excluding {} operator pauses)'.format(
+                     os.path.basename(self.path),
+                     format_seconds(self.total_seconds), self.pauses),
+                 '{} commands, {} tip pick-ups, {} new tips'.format(
+                     self.num_commands, self.pick_ups, self.tips_used),
+                 '{:.0f} uL of reagents, {:.1f} m of gantry travel'.format(
+                     self.reagent_volume, self.travel_m)]
+        if self.samples_per_hour is not None:
+            lines.append('{} samples, {:.1f} samples per hour'.format(
+                self.samples, self.samples_per_hour))
+        lines.extend(['', 'per step:'])
+        width = max((len(label) for label, _ in
+                     self.phases + self.kinds + self.liquids), default=0)
+        for label, seconds in self.phases:
+            lines.append('  {}  {}'.format(
+                label.ljust(width), format_seconds(seconds)))
+        lines.extend(['', 'per command:'])
+        for kind, seconds in self.kinds:
+            lines.append('  {}  {}'.format(
+                kind.ljust(width), format_seconds(seconds)))
+        if self.liquids:
+            # time spent pipetting in each liquid class
+            lines.extend(['', 'per liquid class:'])
+            for name, seconds in self.liquids:
+                lines.append('  {}  {}'.format(
+                    name.ljust(width), format_seconds(seconds)))
+        return '\n'.join(lines)
+
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '{}:{:02d}:{:02d}'.format(hours, minutes, seconds)
+
+
+def simulate(path, values=None, commands=None):
+    """
+    `simulate` runs a protocol against an `OfflineContext` and returns the
+    context holding every recorded command.
+    :param path (str): Path to the protocol file.
+    :param values (dict): Parameter overrides, see `load_protocol`.
+    :param commands (list): Where the context appends commands, see
+                            `OfflineContext`.
+    """
+    module = load_protocol(path, values)
+    return OfflineContext(commands).execute(module.run)
+
+
+def estimate(path, values=None, commands=None):
+    """
+    `estimate` returns the `RunEstimate` of a protocol.
+    :param path (str): Path to the protocol file.
+    :param values (dict): Parameter overrides, see `load_protocol`.
+    :param commands (list): See `simulate`.
+    """
+    return RunEstimate(path, simulate(path, values, commands),
+                       protocol_samples(path, values))
+
+
+def compare(path, values, changes):
+    """
+    `compare` estimates a protocol before and after applying `changes` to
+    its parameters and describes the time, tips and travel saved by the
+    change.
+    :param path (str): Path to the protocol file.
+    :param values (dict): Parameter overrides shared by both runs.
+    :param changes (dict): Parameter overrides applied to the second run.
+    """
+    before = estimate(path, values)
+    changed = dict(values or {})
+    changed.update(changes)
+    after = estimate(path, changed)
+    saved_seconds = before.total_seconds - after.total_seconds
+    saved_tips = before.tips_used - after.tips_used
+    saved_travel = before.travel_m - after.travel_m
+    return '\n'.join([
+        'with {}:'.format(', '.join(
+            '{}={}'.format(name, json.dumps(value))
+            for name, value in sorted(changes.items()))),
+        '  time    {} -> {}  ({} {})'.format(
+            format_seconds(before.total_seconds),
+            format_seconds(after.total_seconds),
+            'saves' if saved_seconds >= 0 else 'costs',
+            format_seconds(abs(saved_seconds))),
+        '  tips    {} -> {}  ({} {})'.format(
+            before.tips_used, after.tips_used,
+            'saves' if saved_tips >= 0 else 'costs', abs(saved_tips)),
+        '  travel  {:.1f} m -> {:.1f} m  ({} {:.1f} m)'.format(
+            before.travel_m, after.travel_m,
+            'saves' if saved_travel >= 0 else 'costs', abs(saved_travel))])
+
+
+def parse_assignments(assignments):
+    """
+    `parse_assignments` turns ['name=value', ...] into a dictionary, reading
+    each value as JSON where possible and as a string otherwise.
+    """
+    values = {}
+    for assignment in assignments or []:
+        name, _, value = assignment.partition('=')
+        try:
+            values[name] = json.loads(value)
+        except ValueError:
+            values[name] = value
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Estimate protocol run time offline.')
+    parser.add_argument('protocols', nargs='+', help='protocol files')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a get_values() parameter')
+    parser.add_argument('--compare', action='append', metavar='NAME=VALUE',
+                        help='report the time and tips saved by changing a '
+                             'get_values() parameter')
+    args = parser.parse_args(argv)
+    values = parse_assignments(args.set)
+    for path in args.protocols:
+        if args.compare:
+            print('{}:'.format(os.path.basename(path)))
+            print(compare(path, values, parse_assignments(args.compare)))
+        else:
+            print(estimate(path, values).report())
+        print('')
+
+
+if __name__ == '__main__':
+    main()
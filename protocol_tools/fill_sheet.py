@@ -0,0 +1,126 @@
+"""
+Reagent fill sheets for protocols, worked out from an offline run.
+
+    python -m protocol_tools.fill_sheet sci-zymo-directzol-magbead.py \
+        --set num_samples=96
+
+simulates the protocol offline (see protocol_tools.estimate) and totals the
+volume drawn from every source well, i.e. every well that liquid was taken
+from and nothing was dispensed into. Each well needs that volume plus its
+dead volume: the liquid below the lowest point the protocol aspirates it
+from, and a little above, so the tip never draws air; protocols that
+follow the liquid surface down (see `LiquidLevels`) expect it. The sheet
+lists the volume to load into each well, by labware, and the command
+exits with status 1 if any well would have to hold more than its capacity
+to finish the run, so it can be checked before the run starts.
+"""
+
+import argparse
+import math
+import os
+import sys
+
+from protocol_helpers.levels import DEAD_VOLUME_SUBMERSION
+from protocol_tools.estimate import parse_assignments, simulate
+
+
+class FillSheet(object):
+    """
+    `FillSheet` is the volume to load into each source well of an offline
+    run of a protocol.
+    :param ctx (OfflineContext): The context the protocol was run with.
+    :param submersion (float): Liquid kept above the lowest aspirate
+                               height of each well, in mm.
+    """
+
+    def __init__(self, ctx, submersion=DEAD_VOLUME_SUBMERSION):
+        self.wells = []
+        for well, drawn in ctx.volume_drawn.items():
+            if well in ctx.filled_wells or drawn <= 0:
+                continue
+            self.wells.append((well, drawn, dead_volume(
+                well, ctx.lowest_aspirate.get(well, 0) + submersion)))
+        labware_order = {labware: i for i, labware in enumerate(
+            ctx.loaded_labwares.values())}
+        self.wells.sort(key=lambda entry: (
+            labware_order.get(entry[0].parent, len(labware_order)),
+            entry[0].parent.wells().index(entry[0])))
+
+    def overfilled(self):
+        """
+        `overfilled` lists the wells that would need more than their
+        capacity, as (well, fill volume) pairs.
+        """
+        return [(well, drawn + dead) for well, drawn, dead in self.wells
+                if drawn + dead > well.max_volume]
+
+    def report(self):
+        lines = []
+        labware = None
+        for well, drawn, dead in self.wells:
+            if well.parent is not labware:
+                labware = well.parent
+                if lines:
+                    lines.append('')
+                lines.append('{}:'.format(labware))
+                lines.append('  {:>4}  {:>9}  {:>8}  {:>9}  {:>8}'.format(
+                    'well', 'fill uL', 'used uL', 'dead uL', 'holds uL'))
+            fill = drawn + dead
+            lines.append('  {:>4}  {:>9}  {:>8}  {:>9}  {:>8}{}'.format(
+                well.well_name, int(math.ceil(fill)),
+                int(math.ceil(drawn)), int(math.ceil(dead)),
+                int(well.max_volume),
+                '  over capacity' if fill > well.max_volume else ''))
+        return '\n'.join(lines)
+
+
+def dead_volume(well, height):
+    """
+    `dead_volume` returns the volume (uL) of liquid below `height` mm in
+    `well`, as if the well had straight sides (as `LiquidLevels` does), so
+    wells that narrow towards the bottom are given a little more than they
+    need.
+    """
+    return well.max_volume * min(height, well.depth) / well.depth
+
+
+def fill_sheet(path, values=None, submersion=DEAD_VOLUME_SUBMERSION):
+    """
+    `fill_sheet` returns the `FillSheet` of a protocol.
+    :param path (str): Path to the protocol file.
+    :param values (dict): Parameter overrides, see `load_protocol`.
+    :param submersion (float): See `FillSheet`.
+    """
+    return FillSheet(simulate(path, values), submersion)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Work out the reagent volumes to load for a run.')
+    parser.add_argument('protocols', nargs='+', help='protocol files')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a get_values() parameter')
+    parser.add_argument('--submersion', type=float,
+                        default=DEAD_VOLUME_SUBMERSION,
+                        help='liquid kept above the lowest aspirate height, '
+                             'in mm (default: {})'.format(
+                                 DEAD_VOLUME_SUBMERSION))
+    args = parser.parse_args(argv)
+    values = parse_assignments(args.set)
+    failures = []
+    for path in args.protocols:
+        sheet = fill_sheet(path, values, args.submersion)
+        print('{}:\n'.format(os.path.basename(path)))
+        print(sheet.report())
+        print('')
+        for well, fill in sheet.overfilled():
+            failures.append('{} would run dry: the run needs {:.0f} uL in '
+                            'it, but it holds {:.0f} uL.'.format(
+                                well, fill, well.max_volume))
+    if failures:
+        print('\n'.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1207 @@
+"""
+Offline stand-in for the Opentrons protocol API.
+
+An `OfflineContext` can be passed to a protocol's `run(ctx)` in place of a
+ProtocolContext. No commands are sent to a robot or to the Opentrons
+hardware simulator. Instead every aspirate, dispense, move, delay and module
+command is timed with a simple kinematic model and recorded, so the run time
+of a protocol can be worked out in a fraction of a second.
+
+Only the parts of the API used by the protocols in this repository are
+provided. Labware and module geometry are read from the definitions that
+ship with `opentrons_shared_data`, so the load names used on the robot
+work unchanged.
+"""
+
+import math
+import sys
+import time
+
+from opentrons.types import Location, Point
+from opentrons.protocol_api.labware import OutOfTipsError
+
+from protocol_tools.definitions import CACHE_DIR, DefinitionCache
+
+
+# front left corner of each OT-2 deck slot, in deck coordinates (mm)
+SLOT_ORIGINS = {
+    1: (0.0, 0.0), 2: (132.5, 0.0), 3: (265.0, 0.0),
+    4: (0.0, 90.5), 5: (132.5, 90.5), 6: (265.0, 90.5),
+    7: (0.0, 181.0), 8: (132.5, 181.0), 9: (265.0, 181.0),
+    10: (0.0, 271.5), 11: (132.5, 271.5), 12: (265.0, 271.5)
+}
+
+# gantry position after homing
+HOME_POINT = Point(418.0, 353.0, 218.0)
+
+# per-axis speed limits (mm/s) reported by ctx.max_speeds on an OT-2, and
+# the default speed the gantry moves at when no limit is lower
+DEFAULT_MAX_SPEEDS = {
+    'X': 600, 'Y': 400, 'Z': 125, 'A': 125, 'B': 40, 'C': 40}
+DEFAULT_GANTRY_SPEED = 400
+
+# clearance above the tallest labware when moving between labware, and
+# above the current labware when moving between its wells
+LABWARE_Z_MARGIN = 10
+WELL_Z_MARGIN = 5
+
+# name: (max volume, channels, default aspirate/dispense/blow out flow rate)
+PIPETTE_SPECS = {
+    'p20_single_gen2': (20, 1, 7.56),
+    'p20_multi_gen2': (20, 8, 7.6),
+    'p300_single_gen2': (300, 1, 92.86),
+    'p300_multi_gen2': (300, 8, 94),
+    'p1000_single_gen2': (1000, 1, 274.7)
+}
+
+# current (A) each pipette presses onto a full set of tips with, from the
+# pipette definitions that ship with `opentrons_shared_data`
+PICK_UP_CURRENTS = {
+    'p20_single_gen2': 0.1,
+    'p20_multi_gen2': 0.6,
+    'p300_single_gen2': 0.125,
+    'p300_multi_gen2': 0.8,
+    'p1000_single_gen2': 0.17
+}
+
+# distance (mm) between the channels of a multi-channel pipette, which
+# reach towards the front of the deck from its first channel
+CHANNEL_SPACING = 9.0
+
+# fraction of the pipette's max volume the plunger travels for a blow out
+BLOW_OUT_FRACTION = 0.1
+
+# fixed durations (s) of commands that are not modelled kinematically
+TIP_PICK_UP_SECONDS = 4.0
+TIP_DROP_SECONDS = 2.5
+TOUCH_TIP_SECONDS = 1.5
+PIPETTE_HOME_SECONDS = 4.0
+HOME_SECONDS = 10.0
+MAGNET_MOVE_SECONDS = 3.0
+LID_MOVE_SECONDS = 20.0
+
+# temperature ramp rates (degrees C per second) as (heating, cooling)
+AMBIENT_TEMPERATURE = 25.0
+TEMPERATURE_MODULE_RAMP = (0.2, 0.03)
+THERMOCYCLER_BLOCK_RAMP = (4.0, 2.0)
+THERMOCYCLER_LID_RAMP = (0.3, 0.1)
+
+MODULE_MODELS = {
+    'magdeck': 'magneticModuleV1',
+    'magnetic module': 'magneticModuleV1',
+    'magnetic module gen2': 'magneticModuleV2',
+    'tempdeck': 'temperatureModuleV1',
+    'temperature module': 'temperatureModuleV1',
+    'temperature module gen2': 'temperatureModuleV2',
+    'thermocycler': 'thermocyclerModuleV1',
+    'thermocycler module': 'thermocyclerModuleV1'
+}
+
+# helper functions that are never reported as a protocol step
+HELPER_NAMES = frozenset([
+    'create_chunks', 'pick_up_or_refill', 'pause_attention',
+    'aspirate_with_delay', 'dispense_with_delay', 'mix_with_delay',
+    'slow_tip_withdrawal', 'pre_wet', 'set_default_clearances',
+    'restore_default_clearances', 'viscous_flow_rates', 'etoh_flow_rates',
+    'default_flow_rates', 'reuse_tips', 'name_the_tips', '_pick_up', '_drop',
+    'traced'
+])
+
+# definitions loaded by every offline run in this process
+DEFINITIONS = DefinitionCache(CACHE_DIR)
+
+
+def load_labware_definition(load_name, version=1):
+    """
+    `load_labware_definition` reads a labware definition shipped with
+    `opentrons_shared_data`, through `DEFINITIONS`.
+    :param load_name (str): The labware load name, as used on the robot.
+    :param version (int): The definition version.
+    """
+    return DEFINITIONS.load(
+        'labware/definitions/2/{}/{}.json'.format(load_name, version))
+
+
+def load_module_definition(model):
+    """
+    `load_module_definition` reads a module definition (schema 2) shipped
+    with `opentrons_shared_data`, through `DEFINITIONS`.
+    :param model (str): The module model, e.g. 'magneticModuleV2'.
+    """
+    return DEFINITIONS.load('module/definitions/2/{}.json'.format(model))
+
+
+def _slot_number(location):
+    slot = int(location)
+    if slot not in SLOT_ORIGINS:
+        raise ValueError('Invalid deck slot: {}'.format(location))
+    return slot
+
+
+def _well_of(location):
+    """Return the offline well or labware a Location refers to."""
+    labware = location.labware
+    # newer opentrons releases wrap the labware in a LabwareLike
+    return getattr(labware, 'object', labware)
+
+
+def _add_new(items, item):
+    """Append `item` to `items` unless it is already there."""
+    if all(seen is not item for seen in items):
+        items.append(item)
+
+
+class AxisMaxSpeeds(dict):
+    """
+    Per-axis speed limits, mirroring ctx.max_speeds: assigning None to an
+    axis removes its limit.
+    """
+
+    def __setitem__(self, axis, speed):
+        if speed is None:
+            self.pop(axis, None)
+        else:
+            dict.__setitem__(self, axis, speed)
+
+    def speed(self, axis):
+        limit = self.get(axis, DEFAULT_MAX_SPEEDS[axis])
+        return min(limit, DEFAULT_GANTRY_SPEED)
+
+
+class FlowRates(object):
+
+    def __init__(self, aspirate, dispense, blow_out):
+        self.aspirate = aspirate
+        self.dispense = dispense
+        self.blow_out = blow_out
+
+
+class Clearances(object):
+
+    def __init__(self, aspirate=1.0, dispense=1.0):
+        self.aspirate = aspirate
+        self.dispense = dispense
+
+
+class OfflineWell(object):
+
+    def __init__(self, parent, name, definition, origin):
+        self.parent = parent
+        self.well_name = name
+        self.max_volume = definition['totalLiquidVolume']
+        self.depth = definition['depth']
+        self.diameter = definition.get('diameter')
+        self.length = definition.get('xDimension')
+        self.width = definition.get('yDimension')
+        self.has_tip = parent.is_tiprack
+        self._fresh_tip = parent.is_tiprack
+        self._x = origin[0] + definition['x']
+        self._y = origin[1] + definition['y']
+        self._z = origin[2] + definition['z']
+
+    def top(self, z=0.0):
+        return Location(Point(self._x, self._y, self._z + self.depth + z),
+                        self)
+
+    def bottom(self, z=0.0):
+        return Location(Point(self._x, self._y, self._z + z), self)
+
+    def center(self):
+        return Location(
+            Point(self._x, self._y, self._z + self.depth / 2.0), self)
+
+    def __repr__(self):
+        return '{} of {}'.format(self.well_name, self.parent)
+
+
+class OfflineLabware(object):
+
+    def __init__(self, definition, slot, origin, label=None):
+        parameters = definition['parameters']
+        self.load_name = parameters['loadName']
+        self.name = label or self.load_name
+        self.is_tiprack = parameters.get('isTiprack', False)
+        self.tip_length = parameters.get('tipLength')
+        # multi-channel pipettes go over the wells of e.g. reservoirs with
+        # their middle, rather than their first channel
+        self.centers_multichannel = ('centerMultichannelOnWells' in
+                                     parameters.get('quirks', []))
+        self.slot = slot
+        self.highest_z = origin[2] + definition['dimensions']['zDimension']
+        offset = definition['cornerOffsetFromSlot']
+        self._origin = (origin[0] + offset['x'], origin[1] + offset['y'],
+                        origin[2] + offset['z'])
+        self._display_name = label or definition['metadata']['displayName']
+        self._definition = definition
+
+    def __getattr__(self, name):
+        # the wells are only made when something first uses them
+        if name not in ('_columns', '_wells', '_by_name', '_rows'):
+            raise AttributeError(name)
+        self._make_wells()
+        return self.__dict__[name]
+
+    def _make_wells(self):
+        definition = self._definition
+        self._columns = [
+            [OfflineWell(self, name, definition['wells'][name], self._origin)
+             for name in column]
+            for column in definition['ordering']]
+        self._wells = [well for column in self._columns for well in column]
+        self._by_name = {well.well_name: well for well in self._wells}
+        rows = {}
+        for well in self._wells:
+            rows.setdefault(well.well_name.rstrip('0123456789'), []).append(
+                well)
+        self._rows = rows
+
+    def wells(self):
+        return list(self._wells)
+
+    def wells_by_name(self):
+        return dict(self._by_name)
+
+    def columns(self):
+        return list(self._columns)
+
+    def columns_by_name(self):
+        return {str(i + 1): column for i, column in enumerate(self._columns)}
+
+    def rows(self):
+        return list(self._rows.values())
+
+    def rows_by_name(self):
+        return dict(self._rows)
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def channel_wells(self, well, channels):
+        """
+        `channel_wells` returns the well each channel of a pipette is in
+        when its first channel is in `well`: the wells down the column
+        from it, or `well` once per channel in labware with a single row
+        (e.g. a 12 well reservoir).
+        """
+        for column in self._columns:
+            if well in column:
+                if len(column) == 1:
+                    return [well] * channels
+                start = column.index(well)
+                return column[start:start + channels]
+        return [well]
+
+    def next_tip(self, num_tips=1, starting_tip=None):
+        """
+        `next_tip` returns the first well from which `num_tips` consecutive
+        tips down a column are available, or None.
+        """
+        started = starting_tip is None
+        for column in self._columns:
+            for i in range(len(column) - num_tips + 1):
+                if not started:
+                    if column[i] is not starting_tip:
+                        continue
+                    started = True
+                if all(well.has_tip for well in column[i:i + num_tips]):
+                    return column[i]
+        return None
+
+    def reset(self):
+        for well in self._wells:
+            well.has_tip = well._fresh_tip = self.is_tiprack
+
+    def __repr__(self):
+        return '{} on {}'.format(self._display_name, self.slot)
+
+
+class OfflinePipetteConfig(object):
+    """
+    `OfflinePipetteConfig` stands in for the settings the robot's hardware
+    controller keeps for a pipette, of which only the tip pick-up current
+    is provided (see protocol_helpers.tips.set_pick_up_current).
+    """
+
+    def __init__(self, pick_up_current):
+        self.config = self
+        self.pick_up_current = pick_up_current
+
+    def update_config_item(self, name, value):
+        setattr(self.config, name, value)
+
+
+class OfflineHardware(object):
+    """
+    `OfflineHardware` stands in for the robot's hardware controller, as
+    `ctx._hw_manager.hardware`, holding an `OfflinePipetteConfig` for each
+    loaded pipette by mount.
+    """
+
+    def __init__(self):
+        self.hardware = self
+        self._attached_instruments = {}
+
+
+class OfflinePipette(object):
+
+    def __init__(self, ctx, name, mount, tip_racks=None):
+        if name not in PIPETTE_SPECS:
+            raise ValueError('Unsupported pipette: {}'.format(name))
+        max_volume, channels, flow_rate = PIPETTE_SPECS[name]
+        self.name = name
+        self.mount = mount
+        self.max_volume = max_volume
+        self.channels = channels
+        self.type = 'multi' if channels > 1 else 'single'
+        self.tip_racks = list(tip_racks or [])
+        self.flow_rate = FlowRates(flow_rate, flow_rate, flow_rate)
+        self.well_bottom_clearance = Clearances()
+        self.current_volume = 0.0
+        self.has_tip = False
+        self._tips = 0
+        self.starting_tip = None
+        self._ctx = ctx
+        self._z_axis = 'A' if mount == 'right' else 'Z'
+        self._point = HOME_POINT
+        self._target = None
+        self._tip_well = None
+        # distinct (x, y) points the first channel moved to
+        self.positions = set()
+        # tip racks tips were picked up from with channels hanging past
+        # their front
+        self.overhangs = set()
+        # (tips, current) of each pick-up of fewer tips than channels
+        self.partial_currents = set()
+        # the robot's hardware controller knows the pipette by its mount
+        self._implementation = self
+        self._sources = set()
+        self._air = 0.0
+        self._tip_use = None
+
+    def __repr__(self):
+        return '{} on {} mount'.format(self.name, self.mount)
+
+    def get_mount(self):
+        return self.mount
+
+    def _record(self, kind, seconds):
+        self._ctx._record(kind, seconds)
+        if self._tip_use is None:
+            return
+        self._tip_use[1] += seconds
+        well = self._target
+        if isinstance(well, OfflineWell) and not well.parent.is_tiprack:
+            well = self._ctx._stand_ins.get(well, well)
+            wells = self._tip_use[2]
+            wells[well] = wells.get(well, 0.0) + seconds
+
+    # motion
+
+    def _move(self, location):
+        target = _well_of(location)
+        point = location.point
+        ctx = self._ctx
+        seconds = ctx._travel_seconds(
+            self._point, point, self._target, target, self._z_axis)
+        ctx.travel_mm += math.hypot(point.x - self._point.x,
+                                    point.y - self._point.y)
+        labware = getattr(target, 'parent', target)
+        if getattr(labware, 'centers_multichannel', False):
+            self.positions.add((point.x, point.y + CHANNEL_SPACING *
+                                (self.channels - 1) / 2.0))
+        else:
+            self.positions.add((point.x, point.y))
+        self._point = point
+        self._target = target
+        if seconds > 0:
+            self._record('move', seconds)
+
+    def _location(self, location, clearance):
+        if location is None:
+            if self._target is None:
+                raise RuntimeError('No location specified and no previous '
+                                   'location for {}'.format(self))
+            return Location(self._point, self._target)
+        if isinstance(location, OfflineWell):
+            return location.bottom(clearance)
+        return location
+
+    def move_to(self, location, force_direct=False, minimum_z_height=None,
+                speed=None):
+        self._move(location)
+        return self
+
+    def home(self):
+        self._point = Point(self._point.x, self._point.y, HOME_POINT.z)
+        self._target = None
+        self._record('home', PIPETTE_HOME_SECONDS)
+        return self
+
+    # liquid handling
+
+    def _require_tip(self, action):
+        if not self.has_tip:
+            raise RuntimeError(
+                'Cannot {} without a tip attached ({})'.format(action, self))
+
+    def _aspirate(self, volume, location, rate, liquid):
+        if volume is None:
+            volume = self.max_volume - self.current_volume
+        self._move(self._location(
+            location, self.well_bottom_clearance.aspirate))
+        if self.current_volume + volume > self.max_volume + 1e-6:
+            raise RuntimeError(
+                'Cannot aspirate {} uL: {} holds {} of {} uL'.format(
+                    volume, self, self.current_volume, self.max_volume))
+        self.current_volume += volume
+        height = None
+        if isinstance(self._target, OfflineWell):
+            height = self._point.z - self._target.bottom().point.z
+            # drawn from the top of a well (e.g. to blow out again), the
+            # tip only takes in air
+            liquid = liquid and height < self._target.depth
+        if not liquid:
+            self._air += volume
+        elif height is not None:
+            self._sources.add(self._target)
+            for well in self._target.parent.channel_wells(
+                    self._target, self._tips):
+                self._ctx._draw(well, volume, height)
+        self._record(
+            'aspirate', volume / (self.flow_rate.aspirate * rate))
+        return self
+
+    def aspirate(self, volume=None, location=None, rate=1.0):
+        self._require_tip('aspirate')
+        return self._aspirate(volume, location, rate, liquid=True)
+
+    def dispense(self, volume=None, location=None, rate=1.0):
+        self._require_tip('dispense')
+        if volume is None or volume > self.current_volume:
+            volume = self.current_volume
+        self._move(self._location(
+            location, self.well_bottom_clearance.dispense))
+        self.current_volume -= volume
+        # an air gap sits above the liquid, so it is dispensed first
+        air = min(volume, self._air)
+        self._air -= air
+        liquid = volume - air
+        if liquid > 0 and isinstance(self._target, OfflineWell):
+            wells = self._target.parent.channel_wells(
+                self._target, self._tips)
+            if self._target in self._sources:
+                # returned to the well it came from, e.g. while mixing
+                for well in wells:
+                    self._ctx._draw(well, -liquid)
+            else:
+                self._ctx.filled_wells.update(wells)
+                for well in wells:
+                    self._ctx._use('liquid', well, liquid)
+        self._record(
+            'dispense', volume / (self.flow_rate.dispense * rate))
+        return self
+
+    def mix(self, repetitions=1, volume=None, location=None, rate=1.0):
+        self._require_tip('mix')
+        if volume is None:
+            volume = self.max_volume
+        location = self._location(
+            location, self.well_bottom_clearance.aspirate)
+        for _ in range(repetitions):
+            self.aspirate(volume, location, rate)
+            self.dispense(volume, location, rate)
+        return self
+
+    def air_gap(self, volume=None, height=None):
+        self._require_tip('air gap')
+        if height is None:
+            height = 5
+        target = self._target
+        if isinstance(target, OfflineWell):
+            self._move(target.top(height))
+        return self._aspirate(volume, None, 1.0, liquid=False)
+
+    def blow_out(self, location=None):
+        if isinstance(location, OfflineWell):
+            location = location.top()
+        if location is not None:
+            self._move(location)
+        self.current_volume = self._air = 0.0
+        self._record('blow_out', BLOW_OUT_FRACTION * self.max_volume /
+                          self.flow_rate.blow_out)
+        return self
+
+    def touch_tip(self, location=None, radius=1.0, v_offset=-1.0,
+                  speed=60.0):
+        self._require_tip('touch tip')
+        if location is not None:
+            self._move(location.top(v_offset)
+                       if isinstance(location, OfflineWell) else location)
+        self._record('touch_tip', TOUCH_TIP_SECONDS)
+        return self
+
+    # tips
+
+    def _next_tip(self):
+        racks = self.tip_racks
+        starting = self.starting_tip
+        if starting is not None and starting.parent in racks:
+            racks = racks[racks.index(starting.parent):]
+        else:
+            starting = None
+        for rack in racks:
+            tip = rack.next_tip(self.channels, starting)
+            if tip is not None:
+                return tip
+            starting = None
+        raise OutOfTipsError
+
+    def _tip_wells(self, tip):
+        column = next(column for column in tip.parent._columns
+                      if tip in column)
+        start = column.index(tip)
+        return column[start:start + self.channels]
+
+    def pick_up_tip(self, location=None, presses=None, increment=None):
+        if self.has_tip:
+            raise RuntimeError('{} already has a tip'.format(self))
+        self._ctx._watch()
+        self._tip_use = [self._ctx.clock, 0.0, {}]
+        if location is None:
+            tip = self._next_tip()
+        elif isinstance(location, OfflineWell):
+            tip = location
+        else:
+            tip = _well_of(location)
+        self._move(tip.top())
+        # channels over emptied wells or past the front of the rack pick
+        # up nothing, so a multi-channel pipette can take fewer tips
+        wells = self._tip_wells(tip)
+        if len(wells) < self.channels:
+            self.overhangs.add(tip.parent)
+        held = [well for well in wells if well.has_tip] or wells
+        if len(held) < self.channels:
+            config = self._ctx._hw_manager._attached_instruments[self.mount]
+            self.partial_currents.add(
+                (len(held), config.config.pick_up_current))
+        fresh = 0
+        for well in held:
+            if well._fresh_tip:
+                fresh += 1
+            well.has_tip = well._fresh_tip = False
+        self._tips = len(held)
+        self._ctx.tips_used += fresh
+        self._ctx.pick_ups += 1
+        self._record('pick_up_tip', TIP_PICK_UP_SECONDS)
+        if fresh:
+            self._ctx._use('tips', self, fresh)
+        self.has_tip = True
+        self.current_volume = self._air = 0.0
+        self._tip_well = tip
+        self._sources = set()
+        return self
+
+    def drop_tip(self, location=None, home_after=True):
+        returned = False
+        if location is None:
+            location = self._ctx.fixed_trash.wells()[0].top()
+        elif isinstance(location, OfflineWell):
+            if location.parent.is_tiprack:
+                # a used tip put down on a well of the rack, even one that
+                # still held its tip (e.g. an empty parking rack)
+                for well in self._tip_wells(location)[:self._tips]:
+                    well.has_tip = True
+                    well._fresh_tip = False
+                returned = True
+            location = location.top()
+        self._move(location)
+        self._record('drop_tip', TIP_DROP_SECONDS)
+        if not returned:
+            self._ctx._use('trash', self, self._tips)
+        if self._tip_use is not None:
+            stand_ins = self._ctx._stand_ins
+            self._ctx.tip_uses.append(tuple(self._tip_use) + (frozenset(
+                stand_ins.get(well, well) for well in self._sources),))
+            self._tip_use = None
+        self.has_tip = False
+        self.current_volume = self._air = 0.0
+        self._tip_well = None
+        return self
+
+    def return_tip(self, home_after=True):
+        return self.drop_tip(self._tip_well)
+
+    def fresh_tips(self):
+        """
+        `fresh_tips` returns the number of unused tips left in the pipette's
+        tip racks.
+        """
+        return sum(well._fresh_tip for rack in self.tip_racks
+                   for well in rack.wells())
+
+    def reset_tipracks(self):
+        self._ctx._use('refill', self, self.fresh_tips())
+        for rack in self.tip_racks:
+            rack.reset()
+        return self
+
+    # complex liquid handling
+
+    def _targets(self, targets):
+        if isinstance(targets, (OfflineWell, Location)):
+            return [targets]
+        flat = []
+        for target in targets:
+            if isinstance(target, (list, tuple)):
+                # a multichannel pipette addresses a column by its top well
+                flat.extend(target[:1] if self.channels > 1 else target)
+            else:
+                flat.append(target)
+        return flat
+
+    def _plan(self, volume, source, dest):
+        sources = self._targets(source)
+        dests = self._targets(dest)
+        if len(sources) == 1:
+            sources = sources * len(dests)
+        elif len(dests) == 1:
+            dests = dests * len(sources)
+        if len(sources) != len(dests):
+            raise ValueError(
+                'Cannot pair {} sources with {} destinations'.format(
+                    len(sources), len(dests)))
+        if isinstance(volume, (list, tuple)):
+            volumes = list(volume)
+        else:
+            volumes = [volume] * len(sources)
+        return list(zip(sources, dests, volumes))
+
+    def transfer(self, volume, source, dest, **kwargs):
+        new_tip = kwargs.get('new_tip', 'once')
+        air_gap = kwargs.get('air_gap', 0)
+        mix_before = kwargs.get('mix_before')
+        mix_after = kwargs.get('mix_after')
+        blow_out = kwargs.get('blow_out', False)
+        capacity = self.max_volume - air_gap
+        if new_tip == 'once':
+            self.pick_up_tip()
+        for src, dst, vol in self._plan(volume, source, dest):
+            num_trans = max(1, int(math.ceil(vol / float(capacity))))
+            for _ in range(num_trans):
+                if new_tip == 'always':
+                    if self.has_tip:
+                        self.drop_tip()
+                    self.pick_up_tip()
+                if mix_before:
+                    self.mix(mix_before[0], mix_before[1], src)
+                self.aspirate(vol / num_trans, src)
+                if air_gap:
+                    self.air_gap(air_gap)
+                self.dispense(vol / num_trans + air_gap, dst)
+                if mix_after:
+                    self.mix(mix_after[0], mix_after[1], dst)
+                if blow_out:
+                    self.blow_out(self._ctx.fixed_trash.wells()[0])
+                if new_tip == 'always':
+                    self.drop_tip()
+        if new_tip == 'once':
+            self.drop_tip()
+        return self
+
+    def distribute(self, volume, source, dest, **kwargs):
+        new_tip = kwargs.get('new_tip', 'once')
+        disposal = kwargs.get('disposal_volume', 0)
+        mix_before = kwargs.get('mix_before')
+        plan = self._plan(volume, source, dest)
+        per_asp = max(1, int((self.max_volume - disposal) // plan[0][2]))
+        if new_tip != 'never':
+            self.pick_up_tip()
+        for i in range(0, len(plan), per_asp):
+            chunk = plan[i:i + per_asp]
+            src = chunk[0][0]
+            if mix_before:
+                self.mix(mix_before[0], mix_before[1], src)
+            self.aspirate(sum(vol for _, _, vol in chunk) + disposal, src)
+            for _, dst, vol in chunk:
+                self.dispense(vol, dst)
+            if disposal:
+                self.blow_out(self._ctx.fixed_trash.wells()[0])
+        if new_tip != 'never':
+            self.drop_tip()
+        return self
+
+    def consolidate(self, volume, source, dest, **kwargs):
+        new_tip = kwargs.get('new_tip', 'once')
+        plan = self._plan(volume, source, dest)
+        per_asp = max(1, int(self.max_volume // plan[0][2]))
+        if new_tip != 'never':
+            self.pick_up_tip()
+        for i in range(0, len(plan), per_asp):
+            chunk = plan[i:i + per_asp]
+            for src, _, vol in chunk:
+                self.aspirate(vol, src)
+            self.dispense(None, chunk[0][1])
+        if new_tip != 'never':
+            self.drop_tip()
+        return self
+
+
+class OfflineModule(object):
+
+    def __init__(self, ctx, model, slot):
+        self.model = model
+        self.slot = slot
+        self.labware = None
+        self._ctx = ctx
+        self._definition = load_module_definition(model)
+
+    def load_labware(self, name, label=None, namespace=None, version=1):
+        offset = self._definition['labwareOffset']
+        x, y = SLOT_ORIGINS[self.slot]
+        self.labware = self._ctx._place_labware(
+            name, self.slot, (x + offset['x'], y + offset['y'], offset['z']),
+            label, version)
+        self._ctx.placements.append(('module labware', self.slot, name))
+        return self.labware
+
+    def _ramp_seconds(self, current, target, rates):
+        rate = rates[0] if target > current else rates[1]
+        return abs(target - current) / rate
+
+    def _ramp(self, kind, current, target, rates):
+        self._ctx._record(kind, self._ramp_seconds(current, target, rates))
+
+    def __repr__(self):
+        return '{} on {}'.format(self.model, self.slot)
+
+
+class OfflineMagneticModule(OfflineModule):
+
+    def __init__(self, ctx, model, slot):
+        OfflineModule.__init__(self, ctx, model, slot)
+        self.status = 'disengaged'
+
+    def engage(self, height=None, offset=None, height_from_base=None):
+        if self.status != 'engaged':
+            self._ctx._record('engage', MAGNET_MOVE_SECONDS)
+        self.status = 'engaged'
+
+    def disengage(self):
+        if self.status != 'disengaged':
+            self._ctx._record('disengage', MAGNET_MOVE_SECONDS)
+        self.status = 'disengaged'
+
+
+class OfflineTemperatureModule(OfflineModule):
+
+    def __init__(self, ctx, model, slot):
+        OfflineModule.__init__(self, ctx, model, slot)
+        self.temperature = AMBIENT_TEMPERATURE
+        self.target = None
+        # the clock time a ramp started with `start_set_temperature` ends
+        self._ready_at = 0.0
+
+    @property
+    def status(self):
+        return 'idle' if self.target is None else 'holding at target'
+
+    def set_temperature(self, celsius):
+        self._ramp('set_temperature', self.temperature, celsius,
+                   TEMPERATURE_MODULE_RAMP)
+        self.temperature = self.target = celsius
+        self._ready_at = self._ctx.clock
+
+    def start_set_temperature(self, celsius):
+        # the ramp runs alongside the commands that follow
+        self._ctx._record('start_set_temperature', 0.0)
+        self._ready_at = self._ctx.clock + self._ramp_seconds(
+            self.temperature, celsius, TEMPERATURE_MODULE_RAMP)
+        self.temperature = self.target = celsius
+
+    def await_temperature(self, celsius):
+        self._ctx._record('await_temperature',
+                          max(0.0, self._ready_at - self._ctx.clock))
+
+    def deactivate(self):
+        self.target = None
+
+
+class OfflineThermocycler(OfflineModule):
+
+    def __init__(self, ctx, model, slot):
+        OfflineModule.__init__(self, ctx, model, slot)
+        self.lid_position = 'open'
+        self.block_temperature = AMBIENT_TEMPERATURE
+        self.lid_temperature = AMBIENT_TEMPERATURE
+        self.block_target_temperature = None
+        self.lid_target_temperature = None
+
+    def _move_lid(self, position):
+        if self.lid_position != position:
+            self._ctx._record('lid', LID_MOVE_SECONDS)
+        self.lid_position = position
+        return position
+
+    def open_lid(self):
+        return self._move_lid('open')
+
+    def close_lid(self):
+        return self._move_lid('closed')
+
+    def set_block_temperature(self, temperature, hold_time_seconds=None,
+                              hold_time_minutes=None, ramp_rate=None,
+                              block_max_volume=None):
+        rates = THERMOCYCLER_BLOCK_RAMP
+        if ramp_rate:
+            rates = (min(ramp_rate, rates[0]), min(ramp_rate, rates[1]))
+        self._ramp('set_block_temperature', self.block_temperature,
+                   temperature, rates)
+        self.block_temperature = temperature
+        self.block_target_temperature = temperature
+        hold = (hold_time_seconds or 0) + (hold_time_minutes or 0) * 60
+        if hold:
+            self._ctx._record('hold', hold)
+
+    def set_lid_temperature(self, temperature):
+        self._ramp('set_lid_temperature', self.lid_temperature,
+                   temperature, THERMOCYCLER_LID_RAMP)
+        self.lid_temperature = self.lid_target_temperature = temperature
+
+    def execute_profile(self, steps, repetitions, block_max_volume=None):
+        for _ in range(repetitions):
+            for step in steps:
+                self.set_block_temperature(
+                    step['temperature'],
+                    hold_time_seconds=step.get('hold_time_seconds'),
+                    hold_time_minutes=step.get('hold_time_minutes'))
+
+    def deactivate_lid(self):
+        self.lid_target_temperature = None
+
+    def deactivate_block(self):
+        self.block_target_temperature = None
+
+    def deactivate(self):
+        self.deactivate_lid()
+        self.deactivate_block()
+
+
+MODULE_TYPES = {
+    'magneticModuleV1': OfflineMagneticModule,
+    'magneticModuleV2': OfflineMagneticModule,
+    'temperatureModuleV1': OfflineTemperatureModule,
+    'temperatureModuleV2': OfflineTemperatureModule,
+    'thermocyclerModuleV1': OfflineThermocycler
+}
+
+
+class OfflineContext(object):
+    """
+    `OfflineContext` stands in for the ProtocolContext handed to `run(ctx)`
+    and keeps what the run does in the attributes set in `__init__`.
+
+    Phases are named after the protocol step a command was issued from:
+    a function defined in the protocol and called directly from `run`
+    (e.g. `bind` or `wash`; repeated calls are numbered), or for code
+    written inline in `run`, the first line of the latest `ctx.comment`.
+    :param commands (list): Where commands are appended, e.g. a
+                            `CommandWriter` streaming them to disk (see
+                            protocol_tools.commands); a new list by
+                            default.
+    """
+
+    def __init__(self, commands=None):
+        self.max_speeds = AxisMaxSpeeds()
+        self.loaded_labwares = {}
+        self.loaded_modules = {}
+        self.loaded_instruments = {}
+        # every labware and module loaded, as (kind, slot, name) tuples, so
+        # slots loaded twice can be told apart
+        self.placements = []
+        # wall time spent loading labware and modules
+        self.load_seconds = 0.0
+        # seconds of commands issued in each liquid class (read from
+        # `LiquidClasses.in_use` of the protocol's liquid classes)
+        self.liquid_seconds = {}
+        # each tip a pipette picks up, appended when it is dropped as a
+        # (clock, seconds, wells, sources) tuple: the `clock` it was picked
+        # up at, the seconds of every command from picking it up to
+        # dropping it, the seconds of those issued in each well other than
+        # a tip rack's, and the wells it drew liquid from; the wells of a
+        # plate that another has been put in place of (see
+        # `TipPlanner.moved`) count as the other plate's
+        self.tip_uses = []
+        # plates put in place of others, as (clock, place, labware) tuples
+        self.stand_ins = []
+        self.rail_lights_on = False
+        # seconds of every timed command so far
+        self.clock = 0.0
+        # every timed command, as a (phase, kind, seconds) tuple
+        self.commands = [] if commands is None else commands
+        self.num_commands = 0
+        # seconds of each phase and each kind of command
+        self.phase_seconds = []
+        self.kind_seconds = {}
+        # the message of every pause
+        self.pauses = []
+        self.pick_ups = 0
+        self.tips_used = 0
+        # XY distance the gantry covers
+        self.travel_mm = 0.0
+        # net volume aspirated from each well
+        self.volume_drawn = {}
+        # lowest height above the bottom of each well that liquid was
+        # aspirated at
+        self.lowest_aspirate = {}
+        # wells that liquid was dispensed into from elsewhere
+        self.filled_wells = set()
+        # what the run consumes and fills up, in the order it happens, as
+        # (phase, kind, subject, amount) tuples: fresh tips picked up
+        # ('tips', by pipette), tips dropped anywhere but a tip rack
+        # ('trash', by pipette), tip racks refilled ('refill', by pipette,
+        # with the fresh tips left in them) and liquid dispensed into a
+        # well from elsewhere ('liquid', by well, in uL)
+        self.usage = []
+        self._highest_z = 0.0
+        self._hw_manager = OfflineHardware()
+        self._stand_ins = {}
+        self._run_code = None
+        self._ledgers = []
+        self._liquid_classes = []
+        self._planners = []
+        self._moves_seen = {}
+        self._protocol_file = None
+        self._step_frame = None
+        self._phase_counts = {}
+        self._phases = []
+        self._last_phase = 0
+        self._inline_phase = self._new_phase('setup')
+        self._phase = self._inline_phase
+        self._place_labware('opentrons_1_trash_1100ml_fixed', 12,
+                            SLOT_ORIGINS[12] + (0.0,), None, 1)
+
+    # protocol execution and phase tracking
+
+    def execute(self, run):
+        """
+        `execute` calls a protocol's `run` function with this context.
+        :param run (function): The protocol's `run(ctx)` function.
+        """
+        self._run_code = run.__code__
+        self._protocol_file = run.__code__.co_filename
+        run(self)
+        return self
+
+    @property
+    def full_column_pick_ups(self):
+        """
+        `full_column_pick_ups` lists the pick-ups of a full column for
+        fewer tips, for want of a rack to pick up fewer from (see
+        `TipLedger.next_tip`), as (pipette, tips) tuples.
+        """
+        return [pick_up for ledger in self._ledgers
+                for pick_up in ledger.full_columns]
+
+    def _watch(self):
+        # what the protocol_helpers objects in run's variables do without
+        # a command to show for it is read from their state
+        frame = sys._getframe(1)
+        while frame is not None and frame.f_code is not self._run_code:
+            frame = frame.f_back
+        if frame is None:
+            return
+        for value in list(frame.f_locals.values()):
+            ledger = getattr(value, 'ledger', value)
+            if type(ledger).__name__ == 'TipLedger':
+                _add_new(self._ledgers, ledger)
+            elif type(value).__name__ == 'LiquidClasses':
+                _add_new(self._liquid_classes, value)
+            if type(value).__name__ == 'TipPlanner':
+                _add_new(self._planners, value)
+        for planner in self._planners:
+            seen = self._moves_seen.get(id(planner), 0)
+            for labware, place in planner.moves[seen:]:
+                self._stand_in(place, labware)
+            self._moves_seen[id(planner)] = len(planner.moves)
+
+    def _liquid_class(self):
+        # the class of the innermost scope in use
+        for classes in self._liquid_classes:
+            if classes.in_use:
+                return classes.in_use[-1].liquid.name
+        return None
+
+    def _new_phase(self, name):
+        count = self._phase_counts.get(name, 0) + 1
+        self._phase_counts[name] = count
+        self._phases.append((name, count))
+        self.phase_seconds.append(0.0)
+        return len(self._phases) - 1
+
+    def _current_phase(self):
+        frame = sys._getframe(2)
+        step = None
+        while frame is not None and frame.f_code is not self._run_code:
+            step = frame
+            frame = frame.f_back
+        if frame is None or step is None:
+            return self._inline_phase
+        code = step.f_code
+        if (code.co_filename != self._protocol_file or
+                code.co_name in HELPER_NAMES):
+            return self._inline_phase
+        if step is not self._step_frame:
+            self._step_frame = step
+            self._phase = self._new_phase(code.co_name)
+            self._inline_phase = None
+            self._watch()
+        return self._phase
+
+    def _record(self, kind, seconds):
+        phase = self._current_phase()
+        if phase is None:
+            phase = self._inline_phase = self._new_phase('run')
+        self.clock += seconds
+        self.num_commands += 1
+        self.phase_seconds[phase] += seconds
+        self.kind_seconds[kind] = self.kind_seconds.get(kind, 0.0) + seconds
+        liquid = self._liquid_class()
+        if liquid is not None:
+            self.liquid_seconds[liquid] = self.liquid_seconds.get(
+                liquid, 0.0) + seconds
+        self._last_phase = phase
+        self.commands.append((phase, kind, seconds))
+
+    def _use(self, kind, subject, amount):
+        # usage belongs to the phase of the command just recorded
+        self.usage.append((self._last_phase, kind, subject, amount))
+
+    def _draw(self, well, volume, height=None):
+        self.volume_drawn[well] = self.volume_drawn.get(well, 0.0) + volume
+        if height is not None:
+            self.lowest_aspirate[well] = min(
+                height, self.lowest_aspirate.get(well, height))
+
+    def reagent_volume(self):
+        """
+        `reagent_volume` returns the volume (uL) taken from wells that
+        nothing else was dispensed into during the run, i.e. the reagents
+        the protocol consumed. Air gaps and liquid returned to its own well
+        while mixing are not counted.
+        """
+        return sum(volume for well, volume in self.volume_drawn.items()
+                   if well not in self.filled_wells and volume > 0)
+
+    def phase_labels(self):
+        """
+        `phase_labels` returns the display name of every phase, in order;
+        steps that ran more than once are numbered ('wash 1', 'wash 2').
+        """
+        return [name if self._phase_counts[name] == 1
+                else '{} {}'.format(name, count)
+                for name, count in self._phases]
+
+    # deck
+
+    def _place_labware(self, load_name, slot, origin, label, version):
+        start = time.perf_counter()
+        definition = load_labware_definition(load_name, version or 1)
+        labware = OfflineLabware(definition, slot, origin, label)
+        self.loaded_labwares[slot] = labware
+        self._highest_z = max(self._highest_z, labware.highest_z)
+        self.load_seconds += time.perf_counter() - start
+        return labware
+
+    def load_labware(self, load_name, location, label=None, namespace=None,
+                     version=None):
+        slot = _slot_number(location)
+        self.placements.append(('labware', slot, load_name))
+        return self._place_labware(
+            load_name, slot, SLOT_ORIGINS[slot] + (0.0,), label, version)
+
+    def load_module(self, module_name, location=None, configuration=None):
+        model = MODULE_MODELS.get(module_name.lower())
+        if model is None:
+            raise ValueError('Unsupported module: {}'.format(module_name))
+        if location is None:
+            if not model.startswith('thermocycler'):
+                raise ValueError('{} needs a deck slot'.format(module_name))
+            location = 7
+        slot = _slot_number(location)
+        start = time.perf_counter()
+        module = MODULE_TYPES[model](self, model, slot)
+        self.placements.append(('module', slot, model))
+        self.loaded_modules[slot] = module
+        self._highest_z = max(
+            self._highest_z,
+            module._definition['dimensions']['bareOverallHeight'])
+        self.load_seconds += time.perf_counter() - start
+        return module
+
+    def load_instrument(self, instrument_name, mount, tip_racks=None,
+                        replace=False):
+        pipette = OfflinePipette(self, instrument_name, mount, tip_racks)
+        self.loaded_instruments[mount] = pipette
+        self._hw_manager._attached_instruments[mount] = OfflinePipetteConfig(
+            PICK_UP_CURRENTS[instrument_name])
+        return pipette
+
+    @property
+    def fixed_trash(self):
+        return self.loaded_labwares[12]
+
+    def _travel_seconds(self, start, end, start_target, end_target, z_axis):
+        speeds = self.max_speeds
+        z_speed = speeds.speed(z_axis)
+        xy = max(abs(end.x - start.x) / speeds.speed('X'),
+                 abs(end.y - start.y) / speeds.speed('Y'))
+        if start_target is not None and start_target is end_target:
+            return max(xy, abs(end.z - start.z) / z_speed)
+        start_labware = getattr(start_target, 'parent', start_target)
+        end_labware = getattr(end_target, 'parent', end_target)
+        if (start_labware is not None and start_labware is end_labware and
+                isinstance(end_labware, OfflineLabware)):
+            safe_z = end_labware.highest_z + WELL_Z_MARGIN
+        else:
+            safe_z = self._highest_z + LABWARE_Z_MARGIN
+        safe_z = max(safe_z, start.z, end.z)
+        return xy + (2 * safe_z - start.z - end.z) / z_speed
+
+    # protocol-level commands
+
+    def is_simulating(self):
+        return True
+
+    def comment(self, msg):
+        if sys._getframe(1).f_code is not self._run_code:
+            return
+        lines = [line.strip() for line in str(msg).splitlines()
+                 if line.strip()]
+        if lines:
+            self._inline_phase = self._new_phase(lines[0].rstrip(':'))
+        self._watch()
+
+    def delay(self, seconds=0, minutes=0, msg=None):
+        self._record('delay', seconds + minutes * 60)
+
+    def pause(self, msg=None):
+        self.pauses.append(msg)
+        self._record('pause', 0.0)
+        self._use('pause', msg, 1)
+
+    def home(self):
+        for pipette in self.loaded_instruments.values():
+            pipette._point = HOME_POINT
+            pipette._target = None
+        self._record('home', HOME_SECONDS)
+
+    def set_rail_lights(self, on):
+        self.rail_lights_on = on
+
+    def _stand_in(self, place, labware):
+        # the operator put `labware` where `place` was loaded (e.g. on the
+        # magnetic module), so from now on time spent in the wells of
+        # `place` is put down to those of `labware`
+        self.stand_ins.append((self.clock, place, labware))
+        for well, labware_well in zip(place.wells(), labware.wells()):
+            self._stand_ins[well] = labware_well
@@ -0,0 +1,142 @@
+"""
+What splitting samples over two wells costs a bead clean up.
+
+    python -m protocol_tools.split NEBNext-Directional-RNA-PolyA-Part2.py \
+        --set sample_count=48
+
+simulates a protocol that splits its samples for a bead clean up (see
+`SplitLayout`) offline (see protocol_tools.estimate) and works out how
+much of the run the split and the recombining of the halves take, so it
+can be weighed against cleaning up each sample in a single deep well:
+
+- moving liquid between halves: every tip that drew liquid from one half
+  of a sample and went into the other, i.e. the split transfers and, with
+  both halves on the mag plate, recombining the eluates (which also takes
+  the eluate off, as a single-well clean up would);
+- second halves: the time each other tip spent in second halves, and its
+  pick-up, drop, travel and reagent time shared between the halves it
+  went into;
+- second run on the magnet: with a split plate, the time from putting it
+  on the magnetic module to its last pipetting that no tip accounts for,
+  i.e. settling, drying and incubation.
+"""
+
+import argparse
+import math
+import os
+
+from protocol_helpers.batches import PLATE_ROWS, SplitLayout
+from protocol_tools.estimate import (
+    format_seconds, parse_assignments, protocol_samples, simulate)
+from protocol_tools.offline import OfflineMagneticModule
+
+
+class SplitCost(object):
+    """
+    `SplitCost` is what splitting its samples cost an offline run of a
+    protocol, in seconds. A run that never moves liquid between the halves
+    of a sample does not split its samples, and raises a ValueError.
+    :param ctx (OfflineContext): The run.
+    :param num_cols (int): The number of sample columns.
+    """
+
+    def __init__(self, path, ctx, num_cols):
+        self.path = path
+        self.num_cols = num_cols
+        self.total_seconds = ctx.clock
+        mag_plate = next(module.labware
+                         for module in ctx.loaded_modules.values()
+                         if isinstance(module, OfflineMagneticModule))
+        layout = SplitLayout(num_cols)
+        split_plate = ctx.stand_ins[0][2] if ctx.stand_ins else None
+        self.split_plate = layout.split_plate
+        halves = {}
+        for index, columns in enumerate(
+                layout.halves(mag_plate, split_plate)):
+            for part, column in enumerate(columns):
+                for well in column:
+                    halves[well] = (index, part)
+        self.transfers = 0.0
+        self.second_halves = 0.0
+        second_run_start = ctx.stand_ins[0][0] if ctx.stand_ins else None
+        second_run_end = second_run_start
+        second_run_tips = 0.0
+        for clock, seconds, wells, sources in ctx.tip_uses:
+            visited = [halves[well] for well in wells if well in halves]
+            if not visited:
+                continue
+            if second_run_start is not None and clock >= second_run_start:
+                second_run_tips += seconds
+                if any(part == 1 for _, part in visited):
+                    second_run_end = clock + seconds
+            drawn = [halves[well] for well in sources if well in halves]
+            if any((index, 1 - part) in visited for index, part in drawn):
+                self.transfers += seconds
+                continue
+            in_halves = sum(seconds_in for well, seconds_in in wells.items()
+                            if well in halves)
+            in_second = sum(seconds_in for well, seconds_in in wells.items()
+                            if halves.get(well, (0, 0))[1] == 1)
+            share = (sum(part for _, part in visited) /
+                     float(len(visited)))
+            self.second_halves += in_second + (seconds - in_halves) * share
+        if not self.transfers:
+            raise ValueError('{} does not split its samples'.format(path))
+        self.second_run = 0.0
+        if second_run_start is not None:
+            self.second_run = max(0.0, second_run_end - second_run_start -
+                                  second_run_tips)
+
+    @property
+    def seconds(self):
+        return self.transfers + self.second_halves + self.second_run
+
+    def report(self):
+        lines = ['{}: {} sample columns, {}'.format(
+                     os.path.basename(self.path), self.num_cols,
+                     'second halves on a split plate' if self.split_plate
+                     else 'both halves on the mag plate')]
+        items = [('moving liquid between halves', self.transfers),
+                 ('second halves', self.second_halves)]
+        if self.split_plate:
+            items.append(('second run on the magnet', self.second_run))
+        width = max(len(label) for label, _ in items)
+        for label, seconds in items:
+            lines.append('  {}  {}'.format(
+                label.ljust(width), format_seconds(seconds)))
+        lines.append('  {}  {} ({:.0%} of {})'.format(
+            'total'.ljust(width), format_seconds(self.seconds),
+            self.seconds / self.total_seconds,
+            format_seconds(self.total_seconds)))
+        return '\n'.join(lines)
+
+
+def split_cost(path, values=None):
+    """
+    `split_cost` returns the `SplitCost` of a protocol.
+    :param path (str): Path to the protocol file.
+    :param values (dict): Parameter overrides, see `load_protocol`.
+    """
+    samples = protocol_samples(path, values)
+    if samples is None:
+        raise ValueError('{} has no sample count'.format(path))
+    return SplitCost(path, simulate(path, values),
+                     int(math.ceil(samples / float(PLATE_ROWS))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Report what splitting samples over two wells costs a '
+                    'bead clean up.')
+    parser.add_argument('protocols', nargs='+', help='protocol files')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a get_values() parameter')
+    args = parser.parse_args(argv)
+    values = parse_assignments(args.set)
+    for path in args.protocols:
+        print(split_cost(path, values).report())
+        print('')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Parameter sweeps over a protocol's `get_values()` configuration.
+
+    python -m protocol_tools.sweep sci-zymo-directzol-magbead.py \
+        --vary num_samples=8,16,24,48,96 --vary park_tips=true,false \
+        --vary starting_vol=200,400 --out sweep.csv
+
+simulates the protocol offline for every combination of the varied
+parameters and writes one row per combination to a table. Each row holds
+the estimated duration, samples per hour, tip usage, reagent volume, the
+number of deck layout problems (see protocol_tools.deck; each worker
+checks a layout once) and, for combinations the protocol rejects, the
+error it raised. Simulations run in a pool of worker processes, one per
+core by default. Tables ending in .parquet are written with pandas, which
+is only needed for that format.
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from protocol_tools.deck import DeckCheck
+from protocol_tools.estimate import (
+    estimate, format_seconds, parse_assignments, protocol_values)
+
+RESULT_COLUMNS = [
+    'duration_seconds', 'duration', 'samples_per_hour', 'tips_used',
+    'pick_ups', 'reagent_volume_ul', 'commands', 'pauses', 'deck_problems',
+    'error']
+
+
+def parameter_grid(ranges):
+    """
+    `parameter_grid` returns every combination of the given parameter
+    values as a list of dictionaries.
+    :param ranges (dict): Maps each parameter name to the list of values
+                          it takes.
+    """
+    names = sorted(ranges)
+    return [dict(zip(names, combination))
+            for combination in itertools.product(
+                *[ranges[name] for name in names])]
+
+
+def run_configuration(job):
+    """
+    `run_configuration` simulates one protocol configuration and returns
+    its row of the sweep table. Exceptions raised by the protocol are
+    reported in the 'error' column rather than ending the sweep.
+    :param job (tuple): The protocol path and its parameter values.
+    """
+    path, values = job
+    row = {'protocol': os.path.basename(path)}
+    row.update(values)
+    try:
+        # the totals are all a row needs, so no commands are kept
+        result = estimate(path, values, commands=deque(maxlen=0))
+    except Exception as e:
+        row.update({column: None for column in RESULT_COLUMNS})
+        row['error'] = '{}: {}'.format(type(e).__name__, e)
+        return row
+    row.update({
+        'duration_seconds': round(result.total_seconds, 1),
+        'duration': format_seconds(result.total_seconds),
+        'samples_per_hour': (None if result.samples_per_hour is None
+                             else round(result.samples_per_hour, 1)),
+        'tips_used': result.tips_used,
+        'pick_ups': result.pick_ups,
+        'reagent_volume_ul': round(result.reagent_volume, 1),
+        'commands': result.num_commands,
+        'pauses': result.pauses,
+        'deck_problems': len(DeckCheck(result.ctx).problems),
+        'error': ''
+    })
+    return row
+
+
+def sweep(paths, ranges, fixed=None, workers=None):
+    """
+    `sweep` simulates each protocol with every combination of `ranges` and
+    returns the rows of the sweep table, in grid order.
+    :param paths (List[str]): Protocol files.
+    :param ranges (dict): Maps each varied parameter to its values.
+    :param fixed (dict): Parameter values shared by every combination.
+    :param workers (int): Number of worker processes; one per core by
+                          default.
+    """
+    jobs = []
+    for path in paths:
+        defaults = protocol_values(path)
+        unknown = sorted(set(ranges).union(fixed or {}) - set(defaults))
+        if unknown:
+            raise ValueError('{} has no parameter {}'.format(
+                path, ', '.join(unknown)))
+        for values in parameter_grid(ranges):
+            values.update(fixed or {})
+            jobs.append((path, values))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count())))
+        return list(executor.map(run_configuration, jobs,
+                                 chunksize=chunksize))
+
+
+def write_table(rows, path):
+    """
+    `write_table` writes the sweep rows to a CSV file, or to a Parquet file
+    when `path` ends in .parquet.
+    """
+    columns = []
+    for row in rows:
+        columns.extend(column for column in row
+                       if column not in columns and
+                       column not in RESULT_COLUMNS)
+    columns.extend(RESULT_COLUMNS)
+    if path.endswith('.parquet'):
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError('Writing Parquet tables requires pandas and '
+                              'pyarrow; write a .csv table instead.')
+        pandas.DataFrame(rows, columns=columns).to_parquet(path, index=False)
+        return
+    with open(path, 'w', newline='') as table:
+        writer = csv.DictWriter(table, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_ranges(assignments):
+    """
+    `parse_ranges` turns ['name=value1,value2', ...] into a dictionary
+    of value lists, reading each value as JSON where possible and as a
+    string otherwise.
+    """
+    ranges = {}
+    for assignment in assignments or []:
+        name, _, values = assignment.partition('=')
+        ranges[name] = []
+        for value in values.split(','):
+            try:
+                ranges[name].append(json.loads(value))
+            except ValueError:
+                ranges[name].append(value)
+    return ranges
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Simulate protocols over a grid of parameter values.')
+    parser.add_argument('protocols', nargs='+', help='protocol files')
+    parser.add_argument('--vary', action='append', metavar='NAME=V1,V2,...',
+                        help='values to sweep a get_values() parameter over')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a get_values() parameter')
+    parser.add_argument('--workers', type=int,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--out', default='sweep.csv',
+                        help='output table, .csv or .parquet '
+                             '(default: sweep.csv)')
+    args = parser.parse_args(argv)
+    rows = sweep(args.protocols, parse_ranges(args.vary),
+                 parse_assignments(args.set), args.workers)
+    write_table(rows, args.out)
+    failed = sum(1 for row in rows if row['error'])
+    print('{} configurations written to {} ({} failed)'.format(
+        len(rows), args.out, failed))
+
+
+if __name__ == '__main__':
+    main()
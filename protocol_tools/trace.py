@@ -0,0 +1,133 @@
+"""
+Summaries of protocol command traces.
+
+    python -m protocol_tools.trace trace.jsonl
+
+reads a trace written on the robot by `protocol_helpers.Tracer` (set the
+protocol's `trace_path` parameter, e.g. to /data/B/trace.jsonl) and
+reports where the run's time went: the helpers that took the longest, with
+the commands that took the longest within each.
+
+    python -m protocol_tools.trace sci-zymo-directzol-magbead.py \
+        --set num_samples=96 --out zymo.jsonl
+
+traces a protocol run offline instead (see protocol_tools.estimate), with
+the durations estimated offline. Operator pauses are reported separately,
+since on the robot they measure how long the operator took.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+from protocol_tools.estimate import (
+    format_seconds, parse_assignments, simulate)
+
+
+def read_trace(path):
+    """
+    `read_trace` returns the events of a trace file as dictionaries. A
+    partly written last line (from a run that was stopped) is ignored.
+    """
+    events = []
+    with open(path) as trace_file:
+        for line in trace_file:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events
+
+
+def trace_protocol(path, out, values=None):
+    """
+    `trace_protocol` runs a protocol offline with its commands traced to
+    `out` and returns the events.
+    :param path (str): Path to the protocol file.
+    :param out (str): The trace file to write.
+    :param values (dict): Parameter overrides, see `estimate.load_protocol`.
+    """
+    values = dict(values or {})
+    values['trace_path'] = out
+    simulate(path, values)
+    return read_trace(out)
+
+
+def summarize(events, key='helper', top=3):
+    """
+    `summarize` describes the time spent in each helper (or step, with
+    `key='step'`), longest first, with its `top` slowest commands.
+    :param events (List[dict]): Trace events, see `read_trace`.
+    """
+    pauses = [event for event in events if event['cmd'] == 'pause']
+    events = [event for event in events if event['cmd'] != 'pause']
+    total = sum(event['d'] for event in events)
+    groups = {}
+    for event in events:
+        group = groups.setdefault(event[key], {'seconds': 0.0, 'calls': 0,
+                                               'commands': {}})
+        group['seconds'] += event['d']
+        group['calls'] += 1
+        command = '{}.{}'.format(event['on'], event['cmd'])
+        group['commands'][command] = (
+            group['commands'].get(command, 0.0) + event['d'])
+    width = max([len(name) for name in groups] + [len(key)])
+    lines = ['{} traced commands, {} in total'.format(
+                 len(events), format_seconds(total)),
+             '',
+             '{}  {:>8}  {:>6}  {:>6}  top commands'.format(
+                 key.ljust(width), 'time', 'share', 'calls')]
+    for name, group in sorted(groups.items(),
+                              key=lambda item: -item[1]['seconds']):
+        commands = sorted(group['commands'].items(),
+                          key=lambda item: -item[1])[:top]
+        lines.append('{}  {:>8}  {:>5.1f}%  {:>6}  {}'.format(
+            name.ljust(width), format_seconds(group['seconds']),
+            100.0 * group['seconds'] / total if total else 0.0,
+            group['calls'], ', '.join(
+                '{} {}'.format(command, format_seconds(seconds))
+                for command, seconds in commands)))
+    if pauses:
+        lines.extend(['', '{} operator pauses, {} in total'.format(
+            len(pauses), format_seconds(sum(e['d'] for e in pauses)))])
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Summarize where a protocol run spends its time.')
+    parser.add_argument('paths', nargs='+',
+                        help='trace files (.jsonl), or protocols to trace '
+                             'offline')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a get_values() parameter when '
+                             'tracing a protocol offline')
+    parser.add_argument('--out',
+                        help='keep the trace of an offline run in this file')
+    parser.add_argument('--by', choices=['helper', 'step'], default='helper',
+                        help='group commands by helper (default) or step')
+    parser.add_argument('--top', type=int, default=3,
+                        help='commands listed per group (default: 3)')
+    args = parser.parse_args(argv)
+    for path in args.paths:
+        if path.endswith('.py'):
+            out = args.out
+            if out is None:
+                handle, out = tempfile.mkstemp(suffix='.jsonl')
+                os.close(handle)
+            try:
+                events = trace_protocol(path, out,
+                                        parse_assignments(args.set))
+            finally:
+                if args.out is None:
+                    os.remove(out)
+        else:
+            events = read_trace(path)
+        print('{}:'.format(os.path.basename(path)))
+        print(summarize(events, args.by, args.top))
+        print('')
+
+
+if __name__ == '__main__':
+    main()
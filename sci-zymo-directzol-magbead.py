@@ -1,14 +1,15 @@
 def get_values(*names):
     import json
-    _all_values = json.loads("""{"num_samples":8,"deepwell_type":"nest_96_wellplate_2ml_deep","res_type":"nest_12_reservoir_15ml","starting_vol":400,"elution_vol":50,"park_tips":true,"mag_gen":"magdeck","m300_mount":"left"}""")
+    _all_values = json.loads("""{"num_samples":8,"deepwell_type":"nest_96_wellplate_2ml_deep","res_type":"nest_12_reservoir_15ml","starting_vol":400,"elution_vol":50,"park_tips":true,"multi_dispense":false,"resuspend_washes":true,"optimize_path":false,"resume":false,"mag_gen":"magdeck","m300_mount":"left","trace_path":""}""")
     return [_all_values[n] for n in names]
 
 
 from opentrons.types import Point
-import json
-import os
 import math
-from opentrons import types
+from protocol_helpers import (
+    Checkpoint, LiquidClasses, LiquidLevels, ModuleTasks, SampleMap,
+    TipPlanner, TipTracker, Tracer, create_chunks, plan_column_order,
+    resuspend_pellet)
 
 
 metadata = {
@@ -22,13 +23,18 @@ metadata = {
 def run(ctx):
 
     [num_samples, deepwell_type, res_type, starting_vol,
-     elution_vol, park_tips, mag_gen, m300_mount] = get_values(  # noqa: F821
+     elution_vol, park_tips, multi_dispense, resuspend_washes,
+     optimize_path, resume, mag_gen, m300_mount,
+     trace_path] = get_values(  # noqa: F821
         'num_samples', 'deepwell_type', 'res_type', 'starting_vol',
-        'elution_vol', 'park_tips', 'mag_gen', 'm300_mount')
+        'elution_vol', 'park_tips', 'multi_dispense', 'resuspend_washes',
+        'optimize_path', 'resume', 'mag_gen', 'm300_mount', 'trace_path')
 
-    if num_samples % 8 != 0:
-        raise Exception("Enter a sample number wholly divisible by 8")
-    if not 0 <= num_samples <= 96:
+    # with a trace_path, every pipette and module command is traced
+    tracer = Tracer(ctx, trace_path)
+    ctx = tracer.wrap(ctx, 'ctx')
+
+    if not 0 < num_samples <= 96:
         raise Exception("Enter a sample number between 1-96")
 
     if mag_gen == 'magdeck':
@@ -53,6 +59,9 @@ def run(ctx):
     res2 = ctx.load_labware(res_type, '3', 'reagent reservoir 2')
     res1 = ctx.load_labware(res_type, '2', 'reagent reservoir 1')
     num_cols = math.ceil(num_samples/8)
+    # the last sample column may be partly filled; its tips are picked up
+    # one per sample so it takes reagent for those samples only
+    samples = SampleMap(num_samples)
     tips300 = [ctx.load_labware('opentrons_96_tiprack_300ul', slot,
                                 '200µl filtertiprack')
                for slot in ['5', '7', '8', '10', '11']]
@@ -69,8 +78,6 @@ def run(ctx):
     m300 = ctx.load_instrument(
         'p300_multi_gen2', m300_mount, tip_racks=tips300)
 
-    tip_log = {val: {} for val in ctx.loaded_instruments.values()}
-
     """
     Here is where you can define the locations of your reagents.
     """
@@ -87,88 +94,139 @@ def run(ctx):
     elution_samples_m = elutionplate.rows()[0][:num_cols]
 
 #    magdeck.disengage()  # just in case
-    tempdeck.set_temperature(4)
-
-    m300.flow_rate.aspirate = 50
-    m300.flow_rate.dispense = 150
-    m300.flow_rate.blow_out = 300
     tip_track = False
 
-    folder_path = '/data/B'
-    tip_file_path = folder_path + '/tip_log.json'
-    if tip_track and not ctx.is_simulating():
-        if os.path.isfile(tip_file_path):
-            with open(tip_file_path) as json_file:
-                data = json.load(json_file)
-                for pip in tip_log:
-                    if pip.name in data:
-                        tip_log[pip]['count'] = data[pip.name]
-                    else:
-                        tip_log[pip]['count'] = 0
-        else:
-            for pip in tip_log:
-                tip_log[pip]['count'] = 0
-    else:
-        for pip in tip_log:
-            tip_log[pip]['count'] = 0
+    # number of tips trash will accommodate before prompting user to empty;
+    # with a partly filled last column, full columns of tips are taken from
+    # the racks with labware in front first, saving the others for it
+    tips = TipTracker(ctx, drop_threshold=120, tip_track=tip_track,
+                      partial_pick_ups=samples.partial)
+    trash = ctx.loaded_labwares[12].wells()[0]
+
+    # with resume, an interrupted run restarts at the first unfinished
+    # column; operator pauses and delays of finished steps are skipped
+    checkpoint = Checkpoint(ctx, '/data/B/zymo_checkpoint.json',
+                            resume=resume, ledger=tips.ledger)
+    tips.drop_count = checkpoint.state.get('drop_count', 0)
+    pause = checkpoint.live(ctx.pause)
+    delay = checkpoint.live(ctx.delay)
+
+    # with park_tips, each sample column's tip waits in its parking spot
+    # between adding a reagent and taking it off again, and for the next
+    # step if that adds more of the same reagent (see remove_supernatant),
+    # while tips that only go into a reagent go on to the next column (see
+    # TipPlanner); a resumed run cannot know what was parked and takes new
+    # tips
+    planner = TipPlanner(ctx, tips.ledger,
+                         reuse=park_tips and not checkpoint.resuming,
+                         tracker=tips)
+    # the reagent in each source; give washes of the same buffer the same
+    # name to add them with the same tips and carry each column's tip from
+    # one to the next
+    reagents = {}
+    for wells, name in [
+            (binding_buffer, 'binding buffer'), (wash1, 'wash 1'),
+            (wash2, 'wash 2'), (wash3, 'wash 3'), (wash4, 'wash 4'),
+            (dnase1, 'dnase'), (stopreaction, 'stop reaction'),
+            ([elution_solution], 'elution solution')]:
+        planner.fill(wells, name)
+        reagents.update((well, name) for well in wells)
+
+    # the elution plate cools while the extraction runs and the beads
+    # settle while the pipette picks up its next tips; the pipette
+    # waits for a module before it first touches the plate on it
+    modules = ModuleTasks(ctx, delay=delay)
+    modules.start_set_temperature(tempdeck, 4)
+    m300 = modules.guard(m300)
+
+    # flow rates for each liquid, set only for the steps that pipette it;
+    # the washes run at this protocol's 150 ul/s rather than the NEBNext
+    # ethanol rates
+    liquids = LiquidClasses(ctx)
+    liquids.tune('ethanol', p300=(150, 150, 300))
+
+    # supernatants are drawn off slowly so the pellet stays put, whatever
+    # their liquid class, and emptied into the waste at the fast rate the
+    # protocol has always run at (uL/s)
+    supernatant_rate = 30
+    waste_rate = 500
+
+    def column_order(stops, new_tips=True):
+        """
+        `column_order` returns the order to process the sample columns in.
+        With `optimize_path`, the columns are reordered to shorten the
+        gantry's travel (see `plan_column_order`), otherwise they are
+        processed left to right.
+        :param stops (List[List[Well]]): For each column, the places the
+                                         pipette visits while processing it.
+        :param new_tips (boolean): Whether each column picks up a new tip.
+        """
+        if not optimize_path:
+            return list(range(len(stops)))
+        return plan_column_order(
+            stops, tips.next_tips(m300, len(stops)) if new_tips else None)
 
-    for pip in tip_log:
-        if pip.type == 'multi':
-            tip_log[pip]['tips'] = [tip for rack in pip.tip_racks
-                                    for tip in rack.rows()[0]]
-        else:
-            tip_log[pip]['tips'] = [tip for rack in pip.tip_racks
-                                    for tip in rack.wells()]
-        tip_log[pip]['max'] = len(tip_log[pip]['tips'])
+    def column_stops(columns, park, source=None):
+        """
+        `column_stops` lists the places visited for each column when a
+        reagent is added: its source (if given), the column itself and the
+        tip's parking spot or the trash.
+        """
+        stops = []
+        for i, (m, spot) in enumerate(zip(columns, parking_spots)):
+            path = [m, spot if park else trash]
+            if source:
+                path.insert(0, source[i//(12//len(source))])
+            stops.append(path)
+        return stops
+
+    # reagents are aspirated just below their surface, worked out from the
+    # volume each step takes out of its reservoir channels and the dead
+    # volume the fill sheet adds to each (python -m
+    # protocol_tools.fill_sheet; a resumed run cannot know the volume left
+    # and aspirates at the bottom)
+    levels = LiquidLevels(clearance=1, track=not checkpoint.resuming)
+
+    def fill_sources(vol, source, whole_columns=False):
+        """
+        `fill_sources` adds to `levels` the volume that adding `vol` to every
+        sample takes out of each well of `source`, or to every well of the
+        sample columns with `whole_columns` (see `add_reagent_multi`).
+        """
+        for i in range(num_cols):
+            levels.fill(source[i//(12//len(source))], vol*(
+                m300.channels if whole_columns else samples.tips(i)))
 
-    def _pick_up(pip, loc=None):
-        if tip_log[pip]['count'] == tip_log[pip]['max'] and not loc:
-            ctx.pause('Replace ' + str(pip.max_volume) + 'µl tipracks before \
-resuming.')
-            pip.reset_tipracks()
-            tip_log[pip]['count'] = 0
-        if loc:
-            pip.pick_up_tip(loc)
-        else:
-            pip.pick_up_tip(tip_log[pip]['tips'][tip_log[pip]['count']])
-            tip_log[pip]['count'] += 1
-
-    switch = True
-    drop_count = 0
-    # number of tips trash will accommodate before prompting user to empty
-    drop_threshold = 120
-
-    def _drop(pip):
-        nonlocal switch
-        nonlocal drop_count
-        side = 30 if switch else -18
-        drop_loc = ctx.loaded_labwares[12].wells()[0].top().move(
-            Point(x=side))
-        pip.drop_tip(drop_loc)
-        switch = not switch
-        if pip.type == 'multi':
-            drop_count += 8
-        else:
-            drop_count += 1
-        if drop_count >= drop_threshold:
-            # Setup for flashing lights notification to empty trash
-            m300.home()
-            ctx.pause('Please empty tips from waste before resuming.')
-            ctx.home()  # home before continuing with protocol
-            drop_count = 0
-
-    waste_vol = 0
+    waste_vol = checkpoint.state.get('waste_vol', 0)
     waste_threshold = 185000
+    checkpoint.watch(lambda: {'drop_count': tips.drop_count,
+                              'waste_vol': waste_vol})
 
-    def remove_supernatant(vol, park=False):
+    def remove_supernatant(vol, park=False, liquid='aqueous', source=None,
+                           then=None):
         """
         `remove_supernatant` will transfer supernatant from the deepwell
         extraction plate to the liquid waste reservoir.
         :param vol (float): The amount of volume to aspirate from all deepwell
                             sample wells and dispense in the liquid waste.
-        :param park (boolean): Whether to pick up sample-corresponding tips
-                               in the 'parking rack' or to pick up new tips.
+        :param park (boolean): Whether to park the sample-corresponding tips
+                               in the 'parking rack' after use, rather than
+                               dropping them in the trash.
+        :param liquid (str): The liquid class of the supernatant, for its
+                             air gap and blow out; it is aspirated at
+                             `supernatant_rate` and dispensed at
+                             `waste_rate` whatever the class.
+        :param source (Well): Where the reagent in the supernatant came
+                              from.
+        :param then (Well): Where the reagent the next step adds comes
+                            from. With `park`, the tips are only parked if
+                            it is more of the reagent they took off, for
+                            the next step to use again (see
+                            `TipPlanner.emptied`); otherwise they go to the
+                            trash, leaving the parking spots free.
         """
+        keep = (park and source is not None and then is not None and
+                reagents[source] == reagents[then])
 
         def _waste_track(vol):
             nonlocal waste_vol
@@ -182,75 +240,38 @@ resuming.')
                 waste_vol = 0
             waste_vol += vol
 
-        m300.flow_rate.aspirate = 30
-        num_trans = math.ceil(vol/200)
-        vol_per_trans = vol/num_trans
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            if park:
-                _pick_up(m300, spot)
-            else:
-                _pick_up(m300)
-            side = -1 if i % 2 == 0 else 1
-            loc = m.bottom(0.5).move(Point(x=side*2))
-            for _ in range(num_trans):
-                _waste_track(vol_per_trans)
-                if m300.current_volume > 0:
-                    # void air gap if necessary
-                    m300.dispense(m300.current_volume, m.top())
-                m300.move_to(m.center())
-                m300.transfer(vol_per_trans, loc, waste, new_tip='never',
-                              air_gap=20)
-                m300.blow_out(waste)
-                m300.air_gap(20)
-            _drop(m300)
-        m300.flow_rate.aspirate = 150
-
-    def resuspend_pellet(well, pip, mvol, reps=5):
-        """
-        'resuspend_pellet' will forcefully dispense liquid over the
-        pellet after the magdeck engage in order to more thoroughly resuspend
-        the pellet.param well: The current well that the resuspension will
-        occur in. param pip: The pipet that is currently attached/ being used.
-        param mvol: The volume that is transferred before the mixing steps.
-        param reps: The number of mix repetitions that should occur. Note~
-        During each mix rep, there are 2 cycles of aspirating from center,
-        dispensing at the top and 2 cycles of aspirating from center,
-        dispensing at the bottom (5 mixes total)
-        """
+        with liquids.use(m300, liquid):
+            num_trans = math.ceil(vol/200)
+            vol_per_trans = vol/num_trans
+            order = column_order(
+                [[spot, m, waste, trash] if park else [m, waste, trash]
+                 for m, spot in zip(mag_samples_m, parking_spots)],
+                new_tips=not park)
+            for i in checkpoint.columns('remove supernatant', order):
+                m, spot = mag_samples_m[i], parking_spots[i]
+                planner.pick_up(m300, [m], samples.tips(i), spot)
+                side = -1 if i % 2 == 0 else 1
+                loc = m.bottom(0.5).move(Point(x=side*2))
+                for _ in range(num_trans):
+                    _waste_track(vol_per_trans)
+                    if m300.current_volume > 0:
+                        # void air gap if necessary
+                        m300.dispense(m300.current_volume, m.top())
+                    m300.move_to(m.center())
+                    m300.aspirate(vol_per_trans, loc, rate=(
+                        supernatant_rate / m300.flow_rate.aspirate))
+                    m300.air_gap(20)
+                    m300.dispense(m300.current_volume, waste, rate=(
+                        waste_rate / m300.flow_rate.dispense))
+                    m300.blow_out(waste)
+                    m300.air_gap(20)
+                if keep:
+                    planner.park(m300, spot)
+                else:
+                    planner.drop(m300)
+        planner.emptied(mag_samples_m, source if keep else None)
 
-        rightLeft = int(str(well).split(' ')[0][1:]) % 2
-        """
-        'rightLeft' will determine which value to use in the list of 'top' and
-        'bottom' (below), based on the column of the 'well' used.
-        In the case that an Even column is used, the first value of 'top' and
-        'bottom' will be used, otherwise,
-        the second value of each will be used.
-        """
-        center = well.bottom().move(types.Point(x=0, y=0, z=0.1))
-        top = [
-            well.bottom().move(types.Point(x=-3.8, y=3.8, z=0.1)),
-            well.bottom().move(types.Point(x=3.8, y=3.8, z=0.1))
-        ]
-        bottom = [
-            well.bottom().move(types.Point(x=-3.8, y=-3.8, z=0.1)),
-            well.bottom().move(types.Point(x=3.8, y=-3.8, z=0.1))
-        ]
-
-        pip.flow_rate.dispense = 500
-        pip.flow_rate.aspirate = 150
-
-        mix_vol = 0.9 * mvol
-
-        pip.move_to(center)
-        for _ in range(reps):
-            for _ in range(2):
-                pip.aspirate(mix_vol, center)
-                pip.dispense(mix_vol, top[rightLeft])
-            for _ in range(2):
-                pip.aspirate(mix_vol, center)
-                pip.dispense(mix_vol, bottom[rightLeft])
-
-    def bind(vol, park=True):
+    def bind(vol, park=True, then=None):
         """
         `bind` will perform magnetic bead binding on each sample in the
         deepwell plate. Each channel of binding beads will be mixed before
@@ -260,165 +281,235 @@ resuming.')
         :param vol (float): The amount of volume to aspirate from the elution
                             buffer source and dispense to each well containing
                             beads.
-        :param park (boolean): Whether to save sample-corresponding tips
-                               between adding elution buffer and transferring
-                               supernatant to the final clean elutions PCR
-                               plate.
+        :param park (boolean): Whether to save the tips that add the beads
+                               for the next columns and the
+                               sample-corresponding tips that remove the
+                               supernatant for later steps.
+        :param then (List[Well]): The source of the next step's reagent
+                                  (see `remove_supernatant`).
         """
-        latest_chan = -1
-        for i, (well, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300)
-            num_trans = math.ceil(vol/200)
-            vol_per_trans = vol/num_trans
-            asp_per_chan = (0.95*res1.wells()[0].max_volume)//(vol_per_trans*8)
+        mixed_chans = set()
+        num_trans = math.ceil(vol/200)
+        vol_per_trans = vol/num_trans
+        asp_per_chan = (0.95*res1.wells()[0].max_volume)//(vol_per_trans*8)
+        order = column_order(
+            [[binding_buffer[int(i*num_trans//asp_per_chan)], well, trash]
+             for i, well in enumerate(mag_samples_m)], new_tips=not park)
+        for i in checkpoint.columns('bind', order):
+            well = mag_samples_m[i]
+            sources = [binding_buffer[int((i*num_trans + t)//asp_per_chan)]
+                       for t in range(num_trans)]
+            # the beads are added from the top, so the tip stays clean
+            planner.pick_up(m300, sources, samples.tips(i))
             for t in range(num_trans):
                 chan_ind = int((i*num_trans + t)//asp_per_chan)
                 source = binding_buffer[chan_ind]
                 if m300.current_volume > 0:
                     # void air gap if necessary
                     m300.dispense(m300.current_volume, source.top())
-                if chan_ind > latest_chan:  # mix if accessing new channel
+                if chan_ind not in mixed_chans:  # mix if accessing new channel
                     for _ in range(5):
                         m300.aspirate(180, source.bottom(0.5))
                         m300.dispense(180, source.bottom(5))
-                    latest_chan = chan_ind
+                    mixed_chans.add(chan_ind)
                 m300.transfer(vol_per_trans, source, well.top(), air_gap=20,
                               new_tip='never')
+                planner.add_from(source, [well])
                 if t < num_trans - 1:
                     m300.air_gap(20)
             # m300.mix(5, 200, well)
             m300.blow_out(well.top(-2))
             m300.air_gap(20)
             if park:
-                m300.drop_tip(spot)
+                planner.park(m300)
             else:
-                _drop(m300)
-        ctx.pause('mix for 10 minutes off-deck in a heatershaker')
+                planner.drop(m300)
+        pause('mix for 10 minutes off-deck in a heatershaker')
         magdeck.engage(height=MAG_HEIGHT)
-        ctx.delay(minutes=settling_time, msg='Incubating on MagDeck for \
-' + str(settling_time) + ' minutes.')
+        modules.start_settling(
+            magdeck, minutes=settling_time,
+            msg='Incubating on MagDeck for ' + str(settling_time) +
+            ' minutes.')
 
         # remove initial supernatant
-        remove_supernatant(vol+starting_vol, park=park)
+        remove_supernatant(vol+starting_vol, park=park, liquid='lysate',
+                           source=binding_buffer[0],
+                           then=then[0] if then else None)
 
-    def wash(vol, source, mix_reps=15, park=True, resuspend=True):
+    def add_reagent_multi(vol, source, disposal_vol=20):
         """
-        `wash` will perform bead washing for the extraction protocol.
+        `add_reagent_multi` adds reagent to every sample column with a single
+        tip. The volume for each well is split into aliquots small enough
+        for one aspiration of up to 200ul to serve at least two columns, and
+        each aspiration is dispensed from the top of the wells into the
+        columns in turn, so the tip never touches the samples. Every channel
+        dispenses, so a partly filled last column is given reagent in its
+        empty wells too.
+        :param vol (float): The amount of volume to dispense to each well.
+        :param source (List[Well]): A list of wells from where liquid will be
+                                    aspirated, split between the columns as
+                                    in `wash`.
+        :param disposal_vol (float): The volume each aspiration takes on top
+                                     of what it dispenses and blows back into
+                                     the source, so the last dispense is as
+                                     accurate as the first.
+        """
+        per_asp = 200 - disposal_vol
+        num_trans = math.ceil(2*vol/per_asp)
+        vol_per_trans = vol/num_trans
+        for _ in checkpoint.step('add reagent'):
+            planner.pick_up(m300, source)
+            for s, src in enumerate(source):
+                columns = [m for i, m in enumerate(mag_samples_m)
+                           if i//(12//len(source)) == s]
+                dests = [m for _ in range(num_trans) for m in columns]
+                for chunk in create_chunks(dests, int(per_asp//vol_per_trans)):
+                    m300.aspirate(vol_per_trans*len(chunk) + disposal_vol,
+                                  levels.draw(m300, vol_per_trans*len(chunk),
+                                              src))
+                    for m in chunk:
+                        m300.dispense(vol_per_trans, m.top())
+                    planner.add_from(src, chunk)
+                    m300.blow_out(src.top())
+            # the tip only went into the reagent
+            planner.park(m300)
+
+    def add_and_mix(vol, source, step, mix_vol, park=True, resuspend=True,
+                    multi_dispense=False):
+        """
+        `add_and_mix` adds reagent to every sample column and resuspends the
+        beads in it, for `wash`, `dnase` and `stop_reaction`.
         :param vol (float): The amount of volume to aspirate from each
                             source and dispense to each well containing beads.
         :param source (List[Well]): A list of wells from where liquid will be
                                     aspirated. If the length of the source list
-                                    > 1, `wash` automatically calculates
+                                    > 1, `add_and_mix` automatically calculates
                                     the index of the source that should be
                                     accessed.
-        :param mix_reps (int): The number of repititions to mix the beads with
-                               specified wash buffer (ignored if resuspend is
-                               False).
+        :param step (str): The name the columns are checkpointed under (see
+                           `Checkpoint.columns`).
+        :param mix_vol (float): The volume the beads are resuspended with
+                                (see `resuspend_pellet`).
         :param park (boolean): Whether to save sample-corresponding tips
-                               between adding wash buffer and removing
-                               supernatant.
-        :param resuspend (boolean): Whether to resuspend beads in wash buffer.
+                               between adding the reagent and removing
+                               supernatant, and for later steps.
+        :param resuspend (boolean): Whether to resuspend beads in the reagent.
+        :param multi_dispense (boolean): Whether to add the reagent to all
+                                         columns with a single tip (see
+                                         `add_reagent_multi`), picking up
+                                         sample-corresponding tips only to
+                                         resuspend. The single tip is a
+                                         column of tips more, unless the
+                                         columns would otherwise each take
+                                         a new tip just to add the reagent
+                                         (without `park` or `resuspend`):
+                                         with either, it takes more tips,
+                                         and with `resuspend` it saves no
+                                         time.
         """
 
         if resuspend and magdeck.status == 'engaged':
             magdeck.disengage()
 
+        fill_sources(vol, source, whole_columns=multi_dispense)
+        if multi_dispense:
+            add_reagent_multi(vol, source)
+            # columns only need a tip of their own to resuspend the beads
+            columns = mag_samples_m if resuspend else []
+        else:
+            columns = mag_samples_m
+
         num_trans = math.ceil(vol/200)
         vol_per_trans = vol/num_trans
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300)
+        order = column_order(column_stops(
+            columns, park, None if multi_dispense else source))
+        for i in checkpoint.columns(step, order):
+            m, spot = columns[i], parking_spots[i]
             # side = 1 if i % 2 == 0 else -1
             # loc = m.bottom(0.5).move(Point(x=side*2))
             src = source[i//(12//len(source))]
-            for n in range(num_trans):
+            # in multi-dispense mode the reagent is already in the well
+            if multi_dispense:
+                planner.pick_up(m300, [m], samples.tips(i), spot)
+            else:
+                planner.pick_up(m300, [src], samples.tips(i))
+            for n in range(0 if multi_dispense else num_trans):
                 if m300.current_volume > 0:
                     m300.dispense(m300.current_volume, src.top())
-                m300.transfer(vol_per_trans, src, m.top(), air_gap=20,
-                              new_tip='never')
+                m300.transfer(vol_per_trans,
+                              levels.draw(m300, vol_per_trans, src,
+                                          samples.tips(i)), m.top(),
+                              air_gap=20, new_tip='never')
+                planner.add_from(src, [m])
                 if n < num_trans - 1:  # only air_gap if going back to source
                     m300.air_gap(20)
             if resuspend:
-                # m300.mix(mix_reps, 150, loc)
-                resuspend_pellet(m, m300, 180)
+                # the column's own tip resuspends, if it has one parked,
+                # so the tip that added the reagent stays clean for the
+                # next column
+                planner.swap(m300, [m], spot, keep=i == order[-1])
+                resuspend_pellet(m, m300, mix_vol)
             m300.blow_out(m.top())
             m300.air_gap(20)
             if park:
-                m300.drop_tip(spot)
+                planner.park(m300, spot)
             else:
-                _drop(m300)
+                planner.drop(m300)
+
+    def wash(vol, source, mix_reps=15, park=True, resuspend=True,
+             multi_dispense=False, then=None):
+        """
+        `wash` will perform bead washing for the extraction protocol.
+        :param vol (float): The amount of volume to aspirate from each
+                            source and dispense to each well containing beads.
+        :param source (List[Well]): A list of wells from where liquid will be
+                                    aspirated. If the length of the source list
+                                    > 1, `wash` automatically calculates
+                                    the index of the source that should be
+                                    accessed.
+        :param mix_reps (int): The number of repititions to mix the beads with
+                               specified wash buffer (ignored if resuspend is
+                               False).
+        :param park (boolean): Whether to save sample-corresponding tips
+                               between adding wash buffer and removing
+                               supernatant, and for later steps.
+        :param resuspend (boolean): Whether to resuspend beads in wash buffer.
+        :param multi_dispense (boolean): Whether to add the wash buffer to all
+                                         columns with a single tip (see
+                                         `add_and_mix`).
+        :param then (List[Well]): The source of the next step's reagent
+                                  (see `remove_supernatant`).
+        """
+        add_and_mix(vol, source, 'wash', 180, park, resuspend,
+                    multi_dispense)
 
         if magdeck.status == 'disengaged':
             magdeck.engage(height=MAG_HEIGHT)
 
-        ctx.delay(minutes=settling_time, msg='Incubating on MagDeck for \
-' + str(settling_time) + ' minutes.')
-
-        remove_supernatant(vol, park=park)
+        modules.start_settling(
+            magdeck, minutes=settling_time,
+            msg='Incubating on MagDeck for ' + str(settling_time) +
+            ' minutes.')
 
-    def dnase(vol, source, mix_reps=6, park=True, resuspend=True):
+        remove_supernatant(vol, park=park, liquid='ethanol',
+                           source=source[0], then=then[0] if then else None)
 
-        if resuspend and magdeck.status == 'engaged':
-            magdeck.disengage()
-
-        num_trans = math.ceil(vol/200)
-        vol_per_trans = vol/num_trans
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300)
-            # side = 1 if i % 2 == 0 else -1
-            # loc = m.bottom(0.5).move(Point(x=side*2))
-            src = source[i//(12//len(source))]
-            for n in range(num_trans):
-                if m300.current_volume > 0:
-                    m300.dispense(m300.current_volume, src.top())
-                m300.transfer(vol_per_trans, src, m.top(), air_gap=20,
-                              new_tip='never')
-                if n < num_trans - 1:  # only air_gap if going back to source
-                    m300.air_gap(20)
-            if resuspend:
-                # m300.mix(mix_reps, 30, loc)
-                resuspend_pellet(m, m300, 50)
-            m300.blow_out(m.top())
-            m300.air_gap(20)
-            if park:
-                m300.drop_tip(spot)
-            else:
-                _drop(m300)
+    def dnase(vol, source, mix_reps=6, park=True, resuspend=True,
+              multi_dispense=False):
+        add_and_mix(vol, source, 'dnase', 50, park, resuspend,
+                    multi_dispense)
 
-        ctx.pause('''
+        pause('''
                     Incubating for 10 minutes for DNase 1 treatment
                     with occasional mixing.
         ''')
 
-    def stop_reaction(vol, source, mix_reps=6, park=True, resuspend=True):
-
-        if resuspend and magdeck.status == 'engaged':
-            magdeck.disengage()
+    def stop_reaction(vol, source, mix_reps=6, park=True,
+                      resuspend=True, multi_dispense=False, then=None):
+        add_and_mix(vol, source, 'stop reaction', 180, park, resuspend,
+                    multi_dispense)
 
-        num_trans = math.ceil(vol/200)
-        vol_per_trans = vol/num_trans
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300)
-            # side = 1 if i % 2 == 0 else -1
-            # loc = m.bottom(0.5).move(Point(x=side*2))
-            src = source[i//(12//len(source))]
-            for n in range(num_trans):
-                if m300.current_volume > 0:
-                    m300.dispense(m300.current_volume, src.top())
-                m300.transfer(vol_per_trans, src, m.top(), air_gap=20,
-                              new_tip='never')
-                if n < num_trans - 1:  # only air_gap if going back to source
-                    m300.air_gap(20)
-            if resuspend:
-                # m300.mix(mix_reps, 50, loc)
-                resuspend_pellet(m, m300, 180)
-            m300.blow_out(m.top())
-            m300.air_gap(20)
-            if park:
-                m300.drop_tip(spot)
-            else:
-                _drop(m300)
-
-        ctx.pause('''
+        pause('''
                      Incubating for 10 minutes with
                      occasional mixing for stop reaction
                      ''')
@@ -426,10 +517,13 @@ resuming.')
         if magdeck.status == 'disengaged':
             magdeck.engage(height=MAG_HEIGHT)
 
-        ctx.delay(minutes=settling_time, msg='Incubating on MagDeck for \
-' + str(settling_time) + ' minutes.')
+        modules.start_settling(
+            magdeck, minutes=settling_time,
+            msg='Incubating on MagDeck for ' + str(settling_time) +
+            ' minutes.')
 
-        remove_supernatant(vol, park=park)
+        remove_supernatant(vol, park=park, source=source[0],
+                           then=then[0] if then else None)
 
     def elute(vol, park=True):
         """
@@ -447,11 +541,20 @@ resuming.')
         # resuspend beads in elution
         if magdeck.status == 'enagaged':
             magdeck.disengage()
-        for i, (m, spot) in enumerate(zip(mag_samples_m, parking_spots)):
-            _pick_up(m300)
+        fill_sources(vol, [elution_solution])
+        # tips that went into the pellets before would carry wash buffer
+        # into the eluates
+        planner.emptied(mag_samples_m)
+        order = column_order(
+            column_stops(mag_samples_m, park, [elution_solution]))
+        for i in checkpoint.columns('elute', order):
+            m, spot = mag_samples_m[i], parking_spots[i]
+            planner.pick_up(m300, [elution_solution, m], samples.tips(i),
+                            spot)
             side = 1 if i % 2 == 0 else -1
             loc = m.bottom(0.5).move(Point(x=side*2))
-            m300.aspirate(vol, elution_solution)
+            m300.aspirate(vol, levels.draw(
+                m300, vol, elution_solution, samples.tips(i)))
             m300.move_to(m.center())
             m300.dispense(vol, loc)
             # m300.mix(mix_reps, 0.8*vol, loc)
@@ -459,53 +562,65 @@ resuming.')
             m300.blow_out(m.bottom(5))
             m300.air_gap(20)
             if park:
-                m300.drop_tip(spot)
+                planner.park(m300, spot)
             else:
-                _drop(m300)
+                planner.drop(m300)
 
         magdeck.engage(height=MAG_HEIGHT)
-        ctx.delay(minutes=settling_time, msg='Incubating on MagDeck for \
-' + str(settling_time) + ' minutes.')
-
-        for i, (m, e, spot) in enumerate(
-                zip(mag_samples_m, elution_samples_m, parking_spots)):
-            if park:
-                _pick_up(m300, spot)
-            else:
-                _pick_up(m300)
+        modules.start_settling(
+            magdeck, minutes=settling_time,
+            msg='Incubating on MagDeck for ' + str(settling_time) +
+            ' minutes.')
+
+        order = column_order(
+            [[spot, m, e, trash] if park else [m, e, trash]
+             for m, e, spot in zip(
+                mag_samples_m, elution_samples_m, parking_spots)],
+            new_tips=not park)
+        for i in checkpoint.columns('transfer eluate', order):
+            m, e = mag_samples_m[i], elution_samples_m[i]
+            spot = parking_spots[i]
+            planner.pick_up(m300, [m], samples.tips(i), spot)
             side = -1 if i % 2 == 0 else 1
             loc = m.bottom(0.5).move(Point(x=side*2))
             m300.transfer(vol, loc, e.bottom(5), air_gap=20, new_tip='never')
             m300.blow_out(e.top(-2))
             m300.air_gap(20)
-            m300.drop_tip()
+            planner.drop(m300)
 
     """
     Here is where you can call the methods defined above to fit your specific
     protocol. The normal sequence is:
     """
-    bind(430, park=park_tips)
-    ctx.comment('\n\n\n')
-    wash(500, wash1, park=park_tips)
-    ctx.comment('\n\n\n')
-    wash(500, wash2, park=park_tips)
-    ctx.comment('\n\n\n')
-    wash(500, wash3, park=park_tips)
-    ctx.comment('\n\n\n')
-    wash(300, wash4, park=park_tips)
+    with liquids.use(m300, 'lysate'):
+        bind(430, park=park_tips, then=wash1)
     ctx.comment('\n\n\n')
-    # dnase1 treatment
-    dnase(50, dnase1, park=park_tips)
+    with liquids.use(m300, 'ethanol'):
+        wash(500, wash1, park=park_tips, then=wash2)
+        ctx.comment('\n\n\n')
+        # with multi_dispense, the later washes are added to every column
+        # with a single tip, a column of tips more per wash unless tips are
+        # neither parked nor resuspending (see add_and_mix); with
+        # resuspend_washes false, their pellets are not resuspended, only
+        # covered
+        wash(500, wash2, park=park_tips, resuspend=resuspend_washes,
+             multi_dispense=multi_dispense, then=wash3)
+        ctx.comment('\n\n\n')
+        wash(500, wash3, park=park_tips, resuspend=resuspend_washes,
+             multi_dispense=multi_dispense, then=wash4)
+        ctx.comment('\n\n\n')
+        wash(300, wash4, park=park_tips, resuspend=resuspend_washes,
+             multi_dispense=multi_dispense, then=dnase1)
     ctx.comment('\n\n\n')
-    stop_reaction(500, stopreaction, park=park_tips)
+    with liquids.use(m300, 'aqueous'):
+        # dnase1 treatment
+        dnase(50, dnase1, park=park_tips)
+        ctx.comment('\n\n\n')
+        stop_reaction(500, stopreaction, park=park_tips,
+                      then=[elution_solution])
     ctx.comment('\n\n\n')
-    ctx.delay(minutes=10, msg="dry beads for 10 minute")
-    elute(elution_vol, park=park_tips)
-
-    # track final used tip
-    if tip_track and not ctx.is_simulating():
-        if not os.path.isdir(folder_path):
-            os.mkdir(folder_path)
-        data = {pip.name: tip_log[pip]['count'] for pip in tip_log}
-        with open(tip_file_path, 'w') as outfile:
-            json.dump(data, outfile)
+    delay(minutes=10, msg="dry beads for 10 minute")
+    with liquids.use(m300, 'aqueous'):
+        elute(elution_vol, park=park_tips)
+    checkpoint.finish()
+    tracer.close()
@@ -0,0 +1,28 @@
+"""
+Fixtures shared by the tests, which run the helpers against an
+`OfflineContext` in place of a robot.
+"""
+
+import pytest
+
+from protocol_tools.offline import OfflineContext
+
+
+@pytest.fixture
+def ctx():
+    return OfflineContext()
+
+
+class RobotContext(OfflineContext):
+    """
+    `RobotContext` is an `OfflineContext` that says it is not simulating,
+    so helpers keep the files they only keep on the robot.
+    """
+
+    def is_simulating(self):
+        return False
+
+
+@pytest.fixture
+def robot_ctx():
+    return RobotContext()
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from protocol_helpers.batches import PLATE_COLUMNS, SplitLayout
+from protocol_tools.estimate import REPO_ROOT, simulate
+
+
+@pytest.fixture
+def plates(ctx):
+    return [ctx.load_labware('nest_96_wellplate_100ul_pcr_full_skirt', slot)
+            for slot in (1, 10)]
+
+
+@pytest.mark.parametrize('num_samples', range(49, 89))
+def test_more_than_48_samples_split_onto_a_second_plate(plates,
+                                                        num_samples):
+    mag_plate, split_plate = plates
+    num_cols = -(-num_samples // 8)
+    layout = SplitLayout(num_cols)
+    assert layout.split_plate
+    halves = layout.halves(mag_plate, split_plate)
+    assert halves == list(zip(mag_plate.columns()[:num_cols],
+                              split_plate.columns()[:num_cols]))
+    assert layout.sample_columns(mag_plate, split_plate) == (
+        mag_plate.columns()[:num_cols] + split_plate.columns()[:num_cols])
+    # the split plate takes the mag plate's place for the second run
+    runs = layout.runs(mag_plate)
+    assert [run.number for run in runs] == [1, 2]
+    for run in runs:
+        assert run.samples == [(index, [mag_plate.columns()[index]])
+                               for index in range(num_cols)]
+        assert run.columns == mag_plate.columns()[:num_cols]
+
+
+@pytest.mark.parametrize('num_cols', [1, 3, 6])
+def test_up_to_48_samples_use_the_right_half_of_the_plate(plates,
+                                                          num_cols):
+    mag_plate = plates[0]
+    layout = SplitLayout(num_cols)
+    assert not layout.split_plate
+    right = mag_plate.columns()[PLATE_COLUMNS // 2:]
+    assert layout.halves(mag_plate) == list(zip(
+        mag_plate.columns()[:num_cols], right[:num_cols]))
+    [run] = layout.runs(mag_plate)
+    assert run.columns == (mag_plate.columns()[:num_cols] +
+                           right[:num_cols])
+
+
+def test_split_layouts_need_a_split_plate(plates):
+    with pytest.raises(Exception, match='need a split plate'):
+        SplitLayout(7).halves(plates[0])
+
+
+@pytest.mark.parametrize('num_cols', [0, PLATE_COLUMNS + 1])
+def test_invalid_numbers_of_columns_are_refused(num_cols):
+    with pytest.raises(Exception, match='Invalid number'):
+        SplitLayout(num_cols)
+
+
+@pytest.mark.parametrize('num_samples', [49, 88])
+def test_bead_clean_up_runs_twice_on_the_magnet(num_samples):
+    run = simulate(
+        os.path.join(REPO_ROOT, 'NEBNext-Directional-RNA-PolyA-Part2.py'),
+        {'sample_count': num_samples})
+    [(_, place, labware)] = run.stand_ins
+    assert (place.slot, labware.slot) == (4, 10)
+    assert any('spin the split plate' in pause for pause in run.pauses)
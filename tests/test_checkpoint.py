@@ -0,0 +1,107 @@
+import pytest
+
+from protocol_helpers.checkpoint import Checkpoint
+from protocol_helpers.tips import TipLedger, pick_up_or_refill
+
+
+class Fault(Exception):
+    pass
+
+
+def interrupted_run(checkpoint, columns, stop_after):
+    # runs a one-off step, then a column step that faults part way through
+    done = []
+    for _ in checkpoint.step('mix beads'):
+        done.append('mix beads')
+    for column in checkpoint.columns('bind', columns):
+        done.append(column[0].well_name)
+        if len(done) == stop_after + 1:
+            raise Fault()
+    return done
+
+
+def test_resume_carries_on_in_the_step_it_stopped_in(robot_ctx, tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    plate = robot_ctx.load_labware('nest_96_wellplate_2ml_deep', 1)
+    columns = plate.columns()[:4]
+    with pytest.raises(Fault):
+        interrupted_run(Checkpoint(robot_ctx, path), columns, 2)
+    resumed = Checkpoint(robot_ctx, path, resume=True)
+    assert resumed.resuming
+    assert resumed.replaying
+    # the column the fault came in is done again
+    assert interrupted_run(resumed, columns, 4) == ['A2', 'A3', 'A4']
+    assert not resumed.replaying
+
+
+def test_later_steps_run_in_full_after_resuming(robot_ctx, tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    plate = robot_ctx.load_labware('nest_96_wellplate_2ml_deep', 1)
+    columns = plate.columns()[:3]
+    checkpoint = Checkpoint(robot_ctx, path)
+    list(checkpoint.columns('bind', columns))
+    with pytest.raises(Fault):
+        for _ in checkpoint.columns('wash', range(3)):
+            raise Fault()
+    resumed = Checkpoint(robot_ctx, path, resume=True)
+    assert list(resumed.columns('bind', columns)) == []
+    assert list(resumed.columns('wash', range(3))) == [0, 1, 2]
+    assert list(resumed.columns('elute', range(3))) == [0, 1, 2]
+    resumed.finish()
+    assert not (tmp_path / 'checkpoint.json').exists()
+
+
+def test_pauses_of_finished_steps_are_skipped(robot_ctx, tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = Checkpoint(robot_ctx, path)
+    list(checkpoint.step('bind'))
+    with pytest.raises(Fault):
+        for _ in checkpoint.step('wash'):
+            raise Fault()
+    resumed = Checkpoint(robot_ctx, path, resume=True)
+    pause = resumed.live(robot_ctx.pause)
+    pause('load the beads')
+    list(resumed.step('bind'))
+    pause('load the wash buffer')
+    assert robot_ctx.pauses == ['load the wash buffer']
+
+
+def test_resume_restores_the_tips_and_watched_state(robot_ctx, tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    rack = robot_ctx.load_labware('opentrons_96_tiprack_300ul', 1)
+    pipette = robot_ctx.load_instrument('p300_single_gen2', 'left', [rack])
+    ledger = TipLedger(robot_ctx, persistent=False)
+    checkpoint = Checkpoint(robot_ctx, path, ledger=ledger)
+    waste = {'volume': 0}
+    checkpoint.watch(lambda: dict(waste))
+    with pytest.raises(Fault):
+        for index in checkpoint.columns('bind', range(3)):
+            pick_up_or_refill(robot_ctx, pipette, ledger)
+            pipette.drop_tip()
+            waste['volume'] += 500
+            if index == 1:
+                raise Fault()
+    restored = TipLedger(robot_ctx, persistent=False)
+    resumed = Checkpoint(robot_ctx, path, resume=True, ledger=restored)
+    assert restored.used == {'1': {'A1'}}
+    assert resumed.state == {'volume': 500}
+
+
+def test_resume_refuses_a_different_protocol(robot_ctx, tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = Checkpoint(robot_ctx, path)
+    list(checkpoint.step('bind'))
+    with pytest.raises(Fault):
+        for _ in checkpoint.step('wash'):
+            raise Fault()
+    resumed = Checkpoint(robot_ctx, path, resume=True)
+    with pytest.raises(Exception, match='does not match'):
+        list(resumed.step('lyse'))
+
+
+def test_checkpoints_are_not_kept_when_simulating(ctx, tmp_path):
+    path = tmp_path / 'checkpoint.json'
+    checkpoint = Checkpoint(ctx, str(path), resume=True)
+    assert list(checkpoint.columns('bind', range(2))) == [0, 1]
+    assert not checkpoint.resuming
+    assert not path.exists()
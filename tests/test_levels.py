@@ -0,0 +1,83 @@
+import pytest
+
+from protocol_helpers.levels import DEAD_VOLUME_SUBMERSION, LiquidLevels
+
+
+@pytest.fixture
+def reservoir(ctx):
+    return ctx.load_labware('nest_12_reservoir_15ml', 2)
+
+
+def depth(well):
+    return well.top().point.z - well.bottom().point.z
+
+
+def above_bottom(location, well):
+    return location.point.z - well.bottom().point.z
+
+
+def test_first_fill_adds_the_dead_volume(reservoir):
+    well = reservoir['A1']
+    levels = LiquidLevels(clearance=1)
+    dead = levels.dead_volume(well)
+    assert dead == pytest.approx(
+        well.max_volume * (1 + DEAD_VOLUME_SUBMERSION) / depth(well))
+    levels.fill(well, 4000)
+    levels.fill(well, 2000)
+    assert levels.volume(well) == pytest.approx(dead + 6000)
+
+
+def test_height_follows_the_volume(reservoir):
+    well = reservoir['A1']
+    levels = LiquidLevels()
+    assert levels.height(well, well.max_volume) == pytest.approx(depth(well))
+    assert levels.height(well, well.max_volume / 2) == pytest.approx(
+        depth(well) / 2)
+    assert levels.height(well, -10) == 0
+
+
+def test_draw_aspirates_below_the_surface_it_leaves(ctx, reservoir):
+    rack = ctx.load_labware('opentrons_96_tiprack_300ul', 1)
+    pipette = ctx.load_instrument('p300_multi_gen2', 'left', [rack])
+    well = reservoir['A1']
+    levels = LiquidLevels(submersion=2, clearance=1)
+    levels.fill(well, 8 * 100 * 6)
+    heights = []
+    for _ in range(6):
+        location = levels.draw(pipette, 100, well)
+        heights.append(above_bottom(location, well))
+        # every channel of a multi-channel pipette draws from the one well
+        assert heights[-1] == pytest.approx(max(1, levels.height(well) - 2))
+    assert heights == sorted(heights, reverse=True)
+    # only the dead volume is left, and the last aspiration is still in it
+    assert levels.volume(well) == pytest.approx(levels.dead_volume(well))
+    assert heights[-1] == pytest.approx(1)
+    assert levels.height(well) > heights[-1]
+
+
+def test_draw_counts_the_channels_in_each_well(ctx, reservoir):
+    rack = ctx.load_labware('opentrons_96_tiprack_300ul', 1)
+    plate = ctx.load_labware('nest_96_wellplate_2ml_deep', 3)
+    pipette = ctx.load_instrument('p300_multi_gen2', 'left', [rack])
+    levels = LiquidLevels()
+    for well in (reservoir['A1'], reservoir['A2'], plate['A1']):
+        levels.fill(well, 1000)
+    levels.draw(pipette, 100, reservoir['A1'])
+    levels.draw(pipette, 100, reservoir['A2'], num_tips=3)
+    levels.draw(pipette, 100, plate['A1'])
+    assert levels.volume(reservoir['A1']) == pytest.approx(
+        levels.dead_volume(reservoir['A1']) + 200)
+    assert levels.volume(reservoir['A2']) == pytest.approx(
+        levels.dead_volume(reservoir['A2']) + 700)
+    assert levels.volume(plate['A1']) == pytest.approx(
+        levels.dead_volume(plate['A1']) + 900)
+
+
+def test_untracked_levels_aspirate_at_the_clearance(ctx, reservoir):
+    rack = ctx.load_labware('opentrons_96_tiprack_300ul', 1)
+    pipette = ctx.load_instrument('p300_multi_gen2', 'left', [rack])
+    well = reservoir['A1']
+    levels = LiquidLevels(clearance=1.5, track=False)
+    levels.fill(well, 10000)
+    location = levels.draw(pipette, 100, well)
+    assert above_bottom(location, well) == pytest.approx(1.5)
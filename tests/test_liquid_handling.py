@@ -0,0 +1,69 @@
+import pytest
+
+from protocol_helpers.liquid_handling import gather
+
+
+@pytest.fixture
+def bench(ctx):
+    rack = ctx.load_labware('opentrons_96_tiprack_300ul', 1)
+    plate = ctx.load_labware('nest_96_wellplate_100ul_pcr_full_skirt', 2)
+    pipette = ctx.load_instrument('p300_multi_gen2', 'left', [rack])
+    pipette.pick_up_tip()
+    return pipette, plate
+
+
+def spy(monkeypatch, pipette, calls):
+    # records each aspirate, air gap and dispense with where it happens
+    for name in ('aspirate', 'air_gap', 'dispense'):
+        def record(*args, _name=name, _method=getattr(pipette, name),
+                   **kwargs):
+            calls.append((_name,) + args + tuple(sorted(kwargs.items())))
+            return _method(*args, **kwargs)
+        monkeypatch.setattr(pipette, name, record)
+
+
+def height(location, well):
+    return round(location.point.z - well.bottom().point.z, 3)
+
+
+def test_gather_dispenses_each_volume_before_its_air_gap(monkeypatch,
+                                                         bench):
+    pipette, plate = bench
+    first, second, dest = plate['A1'], plate['A7'], plate['A12']
+    calls = []
+    spy(monkeypatch, pipette, calls)
+    gather(pipette, 20, [(first, first.bottom(2)),
+                         (second, second.bottom(2))],
+           dest, clearance=1, air_gap=10)
+    assert [call[0] for call in calls[:3]] == [
+        'aspirate', 'air_gap', 'aspirate']
+    # drawn 1 mm above the top of the first well, taking no liquid
+    assert calls[1][1:] == (10, ('height', 1))
+    assert pipette._ctx.volume_drawn[first] == 20
+    dispenses = [(volume, location.labware.object, height(location, dest))
+                 for _, volume, location in calls[3:]]
+    # the eluate that went in last comes out first, near the bottom, and
+    # the air gap behind it is expelled at the top
+    assert dispenses == [(20, dest, 1), (10, dest, dest.depth),
+                         (20, dest, 1)]
+    assert pipette.current_volume == 0
+
+
+def test_gather_without_air_gaps_dispenses_once(monkeypatch, bench):
+    pipette, plate = bench
+    calls = []
+    spy(monkeypatch, pipette, calls)
+    gather(pipette, 20, [(plate['A1'], plate['A1'].bottom(2)),
+                         (plate['A7'], plate['A7'].bottom(2))],
+           plate['A12'], clearance=2)
+    assert [call[:2] for call in calls] == [
+        ('aspirate', 20), ('aspirate', 20), ('dispense', 40)]
+    assert height(calls[-1][2], plate['A12']) == 2
+
+
+def test_gather_refuses_more_than_the_tip_holds(bench):
+    pipette, plate = bench
+    with pytest.raises(Exception, match='will not fit'):
+        gather(pipette, 150, [(plate['A1'], plate['A1'].bottom(2)),
+                              (plate['A7'], plate['A7'].bottom(2))],
+               plate['A12'], air_gap=10)
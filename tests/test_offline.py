@@ -0,0 +1,54 @@
+import textwrap
+
+from protocol_tools.estimate import estimate
+
+
+def write_protocol(tmp_path, source):
+    path = tmp_path / 'protocol.py'
+    path.write_text(textwrap.dedent(source))
+    return str(path)
+
+
+def test_commands_are_timed_and_recorded(ctx):
+    rack = ctx.load_labware('opentrons_96_tiprack_300ul', 1)
+    plate = ctx.load_labware('nest_96_wellplate_2ml_deep', 2)
+    pipette = ctx.load_instrument('p300_single_gen2', 'left', [rack])
+    pipette.pick_up_tip()
+    pipette.aspirate(100, plate['A1'].bottom(1))
+    pipette.dispense(100, plate['A2'].bottom(1))
+    pipette.drop_tip()
+    assert [kind for _, kind, _ in ctx.commands if kind != 'move'] == [
+        'pick_up_tip', 'aspirate', 'dispense', 'drop_tip']
+    assert ctx.clock == sum(seconds for _, _, seconds in ctx.commands)
+    assert ctx.pick_ups == ctx.tips_used == 1
+    assert ctx.volume_drawn[plate['A1']] == 100
+    assert plate['A2'] in ctx.filled_wells
+    assert ctx.reagent_volume() == 100
+
+
+def test_phases_are_named_after_steps(tmp_path):
+    path = write_protocol(tmp_path, """
+        def bind(ctx):
+            ctx.delay(seconds=10)
+
+
+        def run(ctx):
+            ctx.comment('setting up')
+            ctx.delay(seconds=5)
+            bind(ctx)
+            bind(ctx)
+    """)
+    result = estimate(path)
+    assert result.phases == [
+        ('setting up', 5.0), ('bind 1', 10.0), ('bind 2', 10.0)]
+    assert result.total_seconds == 25.0
+
+
+def test_report_without_commands(tmp_path):
+    path = write_protocol(tmp_path, """
+        def run(ctx):
+            ctx.comment('nothing to do')
+    """)
+    report = estimate(path).report()
+    assert '0 commands' in report
+    assert 'per step:' in report
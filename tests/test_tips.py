@@ -0,0 +1,229 @@
+import json
+
+import pytest
+
+from protocol_helpers import tips
+from protocol_helpers.tips import TipLedger, TipPlanner, pick_up_or_refill
+
+
+def load(ctx, name='p300_single_gen2', slots=(1,)):
+    racks = [ctx.load_labware('opentrons_96_tiprack_300ul', slot)
+             for slot in slots]
+    return ctx.load_instrument(name, 'left', racks)
+
+
+def entries(path):
+    with open(path) as ledger_file:
+        return [json.loads(line) for line in ledger_file]
+
+
+def test_ledger_carries_on_from_the_next_tip(robot_ctx, tmp_path):
+    path = str(tmp_path / 'tip_ledger.jsonl')
+    pipette = load(robot_ctx)
+    ledger = TipLedger(robot_ctx, path)
+    for _ in range(3):
+        pick_up_or_refill(robot_ctx, pipette, ledger)
+        pipette.drop_tip()
+    assert entries(path) == [{'slot': '1', 'well': well}
+                             for well in ('A1', 'B1', 'C1')]
+    replayed = TipLedger(robot_ctx, path)
+    assert replayed.used == {'1': {'A1', 'B1', 'C1'}}
+    tip, count = replayed.next_tip(pipette)
+    assert (tip.well_name, count) == ('D1', 1)
+
+
+def test_ledger_records_columns_and_refills(robot_ctx, tmp_path):
+    path = str(tmp_path / 'tip_ledger.jsonl')
+    pipette = load(robot_ctx, 'p300_multi_gen2', slots=(1, 2))
+    ledger = TipLedger(robot_ctx, path)
+    for _ in range(2):
+        pick_up_or_refill(robot_ctx, pipette, ledger)
+        pipette.drop_tip()
+    assert entries(path) == [{'slot': '1', 'well': well, 'tips': 8}
+                             for well in ('A1', 'A2')]
+    pipette.reset_tipracks()
+    ledger.reset(pipette.tip_racks[:1])
+    replayed = TipLedger(robot_ctx, path)
+    assert replayed.used == {}
+    assert replayed.refills == {'1': 1}
+    assert replayed.next_tip(pipette)[0].well_name == 'A1'
+
+
+def test_ledger_ignores_an_unfinished_last_line(robot_ctx, tmp_path):
+    path = tmp_path / 'tip_ledger.jsonl'
+    path.write_text('{"slot":"1","well":"A1"}\n{"slot":"1","we')
+    pipette = load(robot_ctx)
+    ledger = TipLedger(robot_ctx, str(path))
+    assert ledger.used == {'1': {'A1'}}
+    # the unfinished line is dropped before anything is appended to it
+    pick_up_or_refill(robot_ctx, pipette, ledger)
+    assert entries(str(path)) == [{'slot': '1', 'well': 'A1'},
+                                  {'slot': '1', 'well': 'B1'}]
+
+
+def test_ledger_is_compacted_once_it_grows(robot_ctx, tmp_path,
+                                           monkeypatch):
+    monkeypatch.setattr(tips, 'TIP_LEDGER_COMPACT_LINES', 5)
+    path = str(tmp_path / 'tip_ledger.jsonl')
+    pipette = load(robot_ctx, slots=(1, 2))
+    ledger = TipLedger(robot_ctx, path)
+    for _ in range(4):
+        pick_up_or_refill(robot_ctx, pipette, ledger)
+        pipette.drop_tip()
+    ledger.reset(pipette.tip_racks[:1])
+    for tip in pipette.tip_racks[1].wells()[:2]:
+        ledger.record(pipette, tip)
+    assert len(entries(path)) == 7
+    replayed = TipLedger(robot_ctx, path)
+    assert replayed.used == {'2': {'A1', 'B1'}}
+    assert entries(path) == [{'slot': '2', 'well': 'A1'},
+                             {'slot': '2', 'well': 'B1'}]
+
+
+def test_ledger_is_kept_in_memory_when_simulating(ctx, tmp_path):
+    path = tmp_path / 'tip_ledger.jsonl'
+    pipette = load(ctx)
+    ledger = TipLedger(ctx, str(path))
+    pick_up_or_refill(ctx, pipette, ledger)
+    assert ledger.used == {'1': {'A1'}}
+    assert not path.exists()
+
+
+@pytest.fixture
+def bench(ctx):
+    # a single-channel pipette, a reagent reservoir and a sample plate
+    pipette = load(ctx)
+    reservoir = ctx.load_labware('nest_12_reservoir_15ml', 2)
+    plate = ctx.load_labware('nest_96_wellplate_2ml_deep', 3)
+    planner = TipPlanner(ctx, TipLedger(ctx, persistent=False))
+    return planner, pipette, reservoir, plate
+
+
+def trashed(ctx):
+    return sum(amount for _, kind, _, amount in ctx.usage
+               if kind == 'trash')
+
+
+def test_planner_reuses_a_tip_in_the_well_it_went_into(bench):
+    planner, pipette, reservoir, plate = bench
+    assert not planner.pick_up(pipette, [reservoir['A1'], plate['A1']])
+    planner.park(pipette)
+    # the tip carries the reagent and the sample into the sample well
+    assert planner.pick_up(pipette, [plate['A1']])
+    planner.drop(pipette)
+    assert planner.reused == 1
+
+
+def test_planner_never_carries_a_sample_on(bench):
+    planner, pipette, reservoir, plate = bench
+    planner.pick_up(pipette, [reservoir['A1'], plate['A1']])
+    planner.park(pipette)
+    assert not planner.pick_up(pipette, [reservoir['A1'], plate['A2']])
+    planner.park(pipette)
+    assert not planner.pick_up(pipette, [reservoir['A1']])
+    planner.drop(pipette)
+    assert planner.reused == 0
+
+
+def test_planner_reuses_a_tip_across_wells_of_one_reagent(bench):
+    planner, pipette, reservoir, plate = bench
+    planner.fill([reservoir['A1'], reservoir['A2']], 'ethanol')
+    planner.pick_up(pipette, [reservoir['A1']])
+    planner.park(pipette)
+    assert planner.pick_up(pipette, [reservoir['A2']])
+    planner.park(pipette)
+    # dispensed from the top, the reagent reaches the samples untouched,
+    # so the reagent's tip can take it off again, but not go back
+    planner.add([plate['A1'], plate['A2']], 'ethanol')
+    assert planner.pick_up(pipette, [plate['A1']])
+    planner.park(pipette)
+    assert not planner.pick_up(pipette, [reservoir['A1']])
+
+
+def test_planner_takes_new_tips_without_reuse(ctx, bench):
+    _, pipette, _, plate = bench
+    planner = TipPlanner(ctx, TipLedger(ctx, persistent=False),
+                         reuse=False)
+    planner.pick_up(pipette, [plate['A1']])
+    planner.park(pipette)
+    assert not planner.pick_up(pipette, [plate['A1']])
+    planner.drop(pipette)
+    assert (ctx.tips_used, trashed(ctx)) == (2, 2)
+
+
+def test_planner_forgets_tips_parked_in_refilled_racks(bench):
+    planner, pipette, _, plate = bench
+    planner.pick_up(pipette, [plate['A1']])
+    planner.park(pipette)
+    pipette.reset_tipracks()
+    planner.ledger.reset(pipette.tip_racks)
+    assert not planner.pick_up(pipette, [plate['A1']])
+
+
+@pytest.fixture
+def spots(ctx):
+    # an empty parking rack, each sample column's tip has a place in it
+    rack = ctx.load_labware('opentrons_96_tiprack_300ul', 4)
+    for well in rack.wells():
+        well.has_tip = well._fresh_tip = False
+    return rack
+
+
+def test_planner_uses_the_tip_parked_at_the_spot_first(bench, spots):
+    planner, pipette, reservoir, plate = bench
+    for well, spot, liquid in ((reservoir['A1'], 'A1', 'wash buffer'),
+                               (reservoir['A2'], 'B1', 'ethanol')):
+        planner.fill([well], liquid)
+        assert not planner.pick_up(pipette, [well])
+        planner.park(pipette, spots[spot])
+        planner.add([plate['A1']], liquid)
+    # either tip can go into the sample
+    assert planner.pick_up(pipette, [plate['A1']], spot=spots['B1'])
+    assert pipette._tip_well is spots['B1']
+
+
+def test_supernatant_tips_are_not_reused_after_the_wash(ctx, bench, spots):
+    planner, pipette, reservoir, plate = bench
+    lysate = plate['A1']
+    planner.pick_up(pipette, [lysate], spot=spots['A1'])
+    planner.park(pipette, spots['A1'])
+    planner.emptied([lysate])
+    planner.add_from(reservoir['A1'], [lysate])
+    # the tip that took the lysate off goes in the trash, not a rack, and
+    # the new tip takes its spot
+    assert not planner.pick_up(pipette, [lysate], spot=spots['A1'])
+    assert trashed(ctx) == 1
+    planner.park(pipette, spots['A1'])
+    assert not planner.pick_up(pipette, [reservoir['A2']])
+    assert trashed(ctx) == 1
+
+
+def test_wash_tips_are_reused_for_the_same_buffer(ctx, bench, spots):
+    planner, pipette, reservoir, plate = bench
+    wash, ethanol = reservoir['A1'], reservoir['A2']
+    sample = plate['A1']
+    planner.fill([wash], 'wash buffer')
+    planner.fill([ethanol], 'ethanol')
+    planner.add_from(wash, [sample])
+    planner.pick_up(pipette, [sample], spot=spots['A1'])
+    planner.park(pipette, spots['A1'])
+    planner.emptied([sample], residue=wash)
+    # a second wash with the same buffer can use the tip again
+    planner.add_from(wash, [sample])
+    assert planner.pick_up(pipette, [sample], spot=spots['A1'])
+    planner.park(pipette, spots['A1'])
+    planner.emptied([sample], residue=wash)
+    # but not after another buffer, where it is dropped for a new tip
+    planner.add_from(ethanol, [sample])
+    assert not planner.pick_up(pipette, [sample], spot=spots['A1'])
+    assert trashed(ctx) == 1
+
+
+def test_a_taken_spot_trashes_the_tip(ctx, bench, spots):
+    planner, pipette, reservoir, plate = bench
+    planner.pick_up(pipette, [plate['A1']], spot=spots['A1'])
+    planner.park(pipette, spots['A1'])
+    planner.pick_up(pipette, [plate['A2']], spot=spots['A2'])
+    planner.park(pipette, spots['A1'])
+    assert trashed(ctx) == 1
+    assert not planner.pick_up(pipette, [plate['A2']])